@@ -0,0 +1,168 @@
+# accounts_aggregate.py - Server-side aggregation for the Accounts Report
+#
+# The Accounts Report used to page every overlapping booking of the month out of
+# both tables and sum them in pandas before anything was shown. The same numbers
+# are now one SQL statement over an `accounts_bookings` view:
+#   - accounts_bookings: both tables stacked with the report's columns
+#     (confirmed/completed bookings, mapped property, amounts with NULL as 0,
+#     pending = total - advance - balance)
+#   - totals: bookings, total, advance, balance and pending per property for the
+#     stays overlapping a month; in Postgres this is the accounts_property_totals
+#     function, called as an RPC
+#   - detail: one ordered page of the view, fetched only when it is shown
+# The SQL is plain enough to run unchanged on SQLite. AccountsStandIn loads the
+# booking_store snapshots into an in-memory SQLite database with that view, so
+# the report also works (and can be checked) where the view is not deployed.
+# postgres_ddl() prints the statements to run in the Supabase SQL editor.
+
+import sqlite3
+import logging
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from booking_frame import VALID_STATUSES
+from booking_store import load_snapshot, snapshot_version
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+ACCOUNTS_VIEW = "accounts_bookings"
+TOTALS_FUNCTION = "accounts_property_totals"
+
+DETAIL_COLUMNS = [
+    "type", "property_name", "guest_name", "booking_id", "check_in", "check_out",
+    "total_amount", "advance", "balance", "pending", "booking_status", "payment_status",
+]
+TOTALS_COLUMNS = ["property_name", "bookings", "total_amount", "advance", "balance", "pending"]
+DETAIL_ORDER = ["check_in", "property_name", "guest_name", "booking_id"]
+
+# Source columns of each table: (table, type, property, status, total, advance, balance, fallback id)
+_SOURCES = [
+    ("reservations", "direct", "property_name", "plan_status", "total_tariff", "advance_amount", "balance_amount", None),
+    ("online_reservations", "online", "property", "booking_status", "booking_amount", "total_payment_made", "balance_due", "id"),
+]
+
+# -------------------------- SQL --------------------------
+def _quote(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+def _amount(column: str) -> str:
+    return f"CAST(COALESCE({column}, 0) AS DOUBLE PRECISION)"
+
+def accounts_view_sql(mapping: Dict[str, str]) -> str:
+    """SELECT behind the accounts_bookings view; property names are mapped with `mapping`."""
+    statuses = ", ".join(_quote(s) for s in VALID_STATUSES)
+    parts = []
+    for table, kind, prop, status, total, advance, balance, fallback_id in _SOURCES:
+        name = f"TRIM({prop})"
+        cases = " ".join(f"WHEN {_quote(alias)} THEN {_quote(canonical)}" for alias, canonical in mapping.items())
+        booking_id = "NULLIF(TRIM(CAST(booking_id AS TEXT)), '')"
+        booking_id = f"COALESCE({booking_id}, CAST({fallback_id} AS TEXT))" if fallback_id else booking_id
+        parts.append(
+            f"SELECT '{kind}' AS type, CASE {name} {cases} ELSE {name} END AS property_name, "
+            f"TRIM(COALESCE(guest_name, '')) AS guest_name, {booking_id} AS booking_id, "
+            f"check_in, check_out, {_amount(total)} AS total_amount, {_amount(advance)} AS advance, "
+            f"{_amount(balance)} AS balance, {_amount(total)} - {_amount(advance)} - {_amount(balance)} AS pending, "
+            f"{status} AS booking_status, TRIM(COALESCE(payment_status, '')) AS payment_status "
+            f"FROM {table} WHERE {status} IN ({statuses}) AND check_in IS NOT NULL AND check_out IS NOT NULL "
+            f"AND NULLIF({name}, '') IS NOT NULL"
+        )
+    return "\nUNION ALL\n".join(parts)
+
+# Stays overlapping [first_day, last_day]: checked in by the last day, checked out after the first
+_OVERLAP = "b.check_in <= {last_day} AND b.check_out > {first_day}"
+
+_TOTALS_SQL = (
+    "SELECT b.property_name, COUNT(*) AS bookings, SUM(b.total_amount) AS total_amount, "
+    "SUM(b.advance) AS advance, SUM(b.balance) AS balance, SUM(b.pending) AS pending "
+    f"FROM {ACCOUNTS_VIEW} b WHERE {_OVERLAP} AND {{in_scope}} GROUP BY b.property_name ORDER BY b.property_name"
+)
+
+def postgres_ddl(mapping: Dict[str, str]) -> str:
+    """The view and the totals function, to run once in the Supabase SQL editor.
+
+    The function's optional `properties` restricts the totals to those property
+    names (property_scope.query_names of a user's scope).
+    """
+    totals = _TOTALS_SQL.format(first_day="first_day", last_day="last_day",
+                                in_scope="(properties IS NULL OR b.property_name = ANY(properties))")
+    return (
+        f"CREATE OR REPLACE VIEW {ACCOUNTS_VIEW} AS\n{accounts_view_sql(mapping)};\n\n"
+        f"CREATE OR REPLACE FUNCTION {TOTALS_FUNCTION}(first_day date, last_day date, properties text[] DEFAULT NULL)\n"
+        "RETURNS TABLE (property_name text, bookings bigint, total_amount double precision, "
+        "advance double precision, balance double precision, pending double precision)\n"
+        f"LANGUAGE sql STABLE AS $$\n{totals}\n$$;\n"
+    )
+
+def _sqlite_in(column: str, values: Optional[List[str]], params: Dict) -> str:
+    """`column IN (...)` with one named parameter per value (always true for None)."""
+    if values is None:
+        return "1 = 1"
+    names = [f"p{i}" for i in range(len(values))]
+    params.update(zip(names, values))
+    return f"{column} IN ({', '.join(':' + n for n in names)})" if names else "0 = 1"
+
+# -------------------------- SQLite stand-in --------------------------
+class AccountsStandIn:
+    """The accounts_bookings view and its queries on an in-memory SQLite copy of both tables.
+
+    Dates are stored as YYYY-MM-DD text so they compare like Postgres dates.
+    """
+
+    def __init__(self, direct: pd.DataFrame, online: pd.DataFrame, mapping: Dict[str, str]):
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        for (table, _, prop, status, total, advance, balance, fallback_id), frame in zip(_SOURCES, (direct, online)):
+            columns = ["booking_id", prop, "guest_name", "check_in", "check_out", total, advance, balance,
+                       status, "payment_status"] + ([fallback_id] if fallback_id else [])
+            self._table(table, frame, columns)
+        self._conn.execute(f"CREATE VIEW {ACCOUNTS_VIEW} AS {accounts_view_sql(mapping)}")
+
+    def _table(self, table: str, frame: pd.DataFrame, columns: List[str]) -> None:
+        out = pd.DataFrame(index=frame.index)
+        for col in columns:
+            values = frame[col] if col in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+            if pd.api.types.is_datetime64_any_dtype(values):
+                values = values.dt.strftime("%Y-%m-%d")
+            values = values.astype(object)
+            out[col] = values.where(values.notna(), None)
+        out.to_sql(table, self._conn, index=False)
+
+    def totals(self, first_day: date, last_day: date, properties: Optional[List[str]] = None) -> pd.DataFrame:
+        """Per-property totals, optionally only for the given property names."""
+        params = {"first_day": str(first_day), "last_day": str(last_day)}
+        sql = _TOTALS_SQL.format(first_day=":first_day", last_day=":last_day",
+                                 in_scope=_sqlite_in("b.property_name", properties, params))
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def detail(self, first_day: date, last_day: date, property_name: Optional[str], offset: int, limit: int,
+               properties: Optional[List[str]] = None) -> pd.DataFrame:
+        """One page of the month's bookings, for one property or the given names (all: None), in DETAIL_ORDER."""
+        params = {"first_day": str(first_day), "last_day": str(last_day), "limit": limit, "offset": offset}
+        where = _OVERLAP.format(first_day=":first_day", last_day=":last_day")
+        where += " AND " + _sqlite_in("b.property_name", properties, params)
+        if property_name is not None:
+            where += " AND b.property_name = :property_name"
+            params["property_name"] = property_name
+        sql = (f"SELECT {', '.join('b.' + c for c in DETAIL_COLUMNS)} FROM {ACCOUNTS_VIEW} b WHERE {where} "
+               f"ORDER BY {', '.join('b.' + c for c in DETAIL_ORDER)} LIMIT :limit OFFSET :offset")
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+_standin: Optional[Tuple[Tuple, AccountsStandIn]] = None
+_standin_lock = threading.Lock()
+
+def local_accounts(mapping: Dict[str, str]) -> AccountsStandIn:
+    """Stand-in over the current booking snapshots, rebuilt whenever a sync has changed one of them."""
+    global _standin
+    with _standin_lock:
+        direct, online = load_snapshot("reservations"), load_snapshot("online_reservations")
+        key = (snapshot_version("reservations"), snapshot_version("online_reservations"),
+               tuple(sorted(mapping.items())))
+        if _standin is None or _standin[0] != key:
+            _standin = (key, AccountsStandIn(direct, online, mapping))
+            logging.info(f"accounts_aggregate: SQLite stand-in built ({len(direct)} direct, {len(online)} online rows)")
+        return _standin[1]
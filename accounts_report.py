@@ -4,8 +4,13 @@ from supabase import create_client, Client
 from datetime import date, datetime
 import calendar
 import pandas as pd
-from typing import List, Dict, Optional
+from typing import Dict, List, Optional
 import logging
+from booking_cache import tagged_cache, BOOKING_TABLES, month_bounds, months_between
+from accounts_aggregate import (
+    ACCOUNTS_VIEW, TOTALS_FUNCTION, DETAIL_COLUMNS, DETAIL_ORDER, TOTALS_COLUMNS, local_accounts,
+)
+from property_scope import Scope, query_names, scope_tags, user_scope
 
 # ────── Logging ──────
 logging.basicConfig(filename="accounts_report.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -45,234 +50,111 @@ def sanitize_string(v, default: str = "") -> str:
     return str(v).strip() if v is not None else default
 
 # ────────────────────────────────────────────────────────────────────────
-# Load bookings with pagination for entire month
+# Server-side totals and detail pages (accounts_aggregate)
 # ────────────────────────────────────────────────────────────────────────
-def load_all_bookings_for_month(year: int, month: int) -> List[Dict]:
-    """Load ALL bookings (both direct and online) for the given month with pagination."""
+DETAIL_PAGE_SIZE = 200
+REPORT_COLUMNS = {
+    "check_in": "Date", "property_name": "Property Name", "guest_name": "Guest Name", "booking_id": "Booking ID",
+    "total_amount": "Total Amount", "advance": "Advance", "balance": "Balance", "pending": "Pending",
+    "booking_status": "Booking Status", "payment_status": "Payment Status", "type": "Type",
+}
+CURRENCY_COLUMNS = ["Total Amount", "Advance", "Balance", "Pending"]
+
+def _month_tags(year: int, month: int, scope: Scope = None) -> Dict:
+    return {"table": BOOKING_TABLES, "month": months_between(*month_bounds(year, month)), **scope_tags(scope)}
+
+def _scope_names(scope: Scope) -> Optional[List[str]]:
+    return query_names(scope) if scope is not None else None
+
+@tagged_cache(ttl=300, tags=_month_tags)
+def load_property_totals(year: int, month: int, scope: Scope = None) -> pd.DataFrame:
+    """Bookings, total, advance, balance and pending per property (of the scope) for stays overlapping the month."""
+    first_day, last_day = month_bounds(year, month)
     try:
-        # Calculate month date range
-        first_day = date(year, month, 1)
-        last_day = date(year, month, calendar.monthrange(year, month)[1])
-        
-        all_bookings = []
-        
-        # ───── Load Direct Reservations with pagination ─────
-        st.info("Loading direct reservations...")
-        page_size = 1000
-        start = 0
-        
-        while True:
-            response = supabase.table("reservations")\
-                .select("*")\
-                .lte("check_in", str(last_day))\
-                .gte("check_out", str(first_day))\
-                .in_("plan_status", ["Confirmed", "Completed"])\
-                .order("check_in", desc=False)\
-                .range(start, start + page_size - 1)\
-                .execute()
-            
-            if not response.data:
-                break
-            
-            for record in response.data:
-                try:
-                    check_in = date.fromisoformat(record["check_in"])
-                    check_out = date.fromisoformat(record["check_out"])
-                    
-                    # Only include bookings that overlap with the selected month
-                    if check_out <= first_day or check_in > last_day:
-                        continue
-                    
-                    booking = {
-                        "type": "direct",
-                        "date": check_in,
-                        "property_name": normalize_property(record.get("property_name", "")),
-                        "guest_name": sanitize_string(record.get("guest_name")),
-                        "booking_id": sanitize_string(record.get("booking_id")),
-                        "total_amount": safe_float(record.get("total_tariff")),
-                        "advance": safe_float(record.get("advance_amount")),
-                        "balance": safe_float(record.get("balance_amount")),
-                        "check_in": str(check_in),
-                        "check_out": str(check_out),
-                        "booking_status": sanitize_string(record.get("plan_status")),
-                        "payment_status": sanitize_string(record.get("payment_status")),
-                    }
-                    
-                    # Calculate pending amount
-                    booking["pending"] = booking["total_amount"] - booking["advance"] - booking["balance"]
-                    
-                    all_bookings.append(booking)
-                except Exception as e:
-                    logging.warning(f"Error processing direct booking: {e}")
-                    continue
-            
-            if len(response.data) < page_size:
-                break
-            
-            start += page_size
-        
-        # ───── Load Online Reservations with pagination ─────
-        st.info("Loading online reservations...")
-        start = 0
-        
-        while True:
-            response = supabase.table("online_reservations")\
-                .select("*")\
-                .lte("check_in", str(last_day))\
-                .gte("check_out", str(first_day))\
-                .in_("booking_status", ["Confirmed", "Completed"])\
-                .order("check_in", desc=False)\
-                .range(start, start + page_size - 1)\
-                .execute()
-            
-            if not response.data:
-                break
-            
-            for record in response.data:
-                try:
-                    check_in = date.fromisoformat(record["check_in"])
-                    check_out = date.fromisoformat(record["check_out"])
-                    
-                    # Only include bookings that overlap with the selected month
-                    if check_out <= first_day or check_in > last_day:
-                        continue
-                    
-                    # For online bookings, calculate amounts
-                    total_amount = safe_float(record.get("booking_amount"))
-                    gst = safe_float(record.get("gst"))
-                    tax = safe_float(record.get("ota_tax"))
-                    commission = safe_float(record.get("ota_commission"))
-                    
-                    # Hotel receivable = Total - GST - Tax - Commission
-                    receivable = total_amount - gst - tax - commission
-                    
-                    booking = {
-                        "type": "online",
-                        "date": check_in,
-                        "property_name": normalize_property(record.get("property", "")),
-                        "guest_name": sanitize_string(record.get("guest_name")),
-                        "booking_id": sanitize_string(record.get("booking_id") or record.get("id")),
-                        "total_amount": total_amount,  # Use hotel receivable for online bookings
-                        "advance": safe_float(record.get("total_payment_made")),
-                        "balance": safe_float(record.get("balance_due")),
-                        "check_in": str(check_in),
-                        "check_out": str(check_out),
-                        "booking_status": sanitize_string(record.get("booking_status")),
-                        "payment_status": sanitize_string(record.get("payment_status")),
-                    }
-                    
-                    # Calculate pending amount
-                    booking["pending"] = booking["total_amount"] - booking["advance"] - booking["balance"]
-                    
-                    all_bookings.append(booking)
-                except Exception as e:
-                    logging.warning(f"Error processing online booking: {e}")
-                    continue
-            
-            if len(response.data) < page_size:
-                break
-            
-            start += page_size
-        
-        logging.info(f"Loaded {len(all_bookings)} total bookings for {year}-{month:02d}")
-        return all_bookings
-        
+        params = {"first_day": str(first_day), "last_day": str(last_day), "properties": _scope_names(scope)}
+        rows = supabase.rpc(TOTALS_FUNCTION, params).execute().data or []
+        totals = pd.DataFrame(rows, columns=TOTALS_COLUMNS)
     except Exception as e:
-        st.error(f"Error loading bookings: {e}")
-        logging.error(f"Error loading bookings: {e}")
-        return []
+        logging.warning(f"{TOTALS_FUNCTION} RPC unavailable, using the local stand-in: {e}")
+        totals = local_accounts(property_mapping).totals(first_day, last_day, _scope_names(scope))
+    totals["bookings"] = totals["bookings"].astype(int)
+    for col in TOTALS_COLUMNS[2:]:
+        totals[col] = totals[col].astype(float)
+    logging.info(f"Loaded totals for {len(totals)} properties for {year}-{month:02d}")
+    return totals
+
+@tagged_cache(ttl=300, tags=lambda year, month, property_name, page, scope=None, page_size=DETAIL_PAGE_SIZE: _month_tags(year, month, scope))
+def load_detail_page(year: int, month: int, property_name: Optional[str], page: int, scope: Scope = None,
+                     page_size: int = DETAIL_PAGE_SIZE) -> pd.DataFrame:
+    """One page (0-based) of the month's bookings (of one property, else of the scope) from the accounts_bookings view."""
+    first_day, last_day = month_bounds(year, month)
+    offset = page * page_size
+    try:
+        query = supabase.table(ACCOUNTS_VIEW).select(",".join(DETAIL_COLUMNS))\
+            .lte("check_in", str(last_day))\
+            .gt("check_out", str(first_day))
+        if property_name is not None:
+            query = query.eq("property_name", property_name)
+        elif scope is not None:
+            query = query.in_("property_name", query_names(scope))
+        for col in DETAIL_ORDER:
+            query = query.order(col)
+        rows = query.range(offset, offset + page_size - 1).execute().data or []
+        return pd.DataFrame(rows, columns=DETAIL_COLUMNS)
+    except Exception as e:
+        logging.warning(f"{ACCOUNTS_VIEW} view unavailable, using the local stand-in: {e}")
+        return local_accounts(property_mapping).detail(first_day, last_day, property_name, offset, page_size, _scope_names(scope))
+
+def load_all_detail(year: int, month: int, property_name: Optional[str], total: int, scope: Scope = None) -> pd.DataFrame:
+    """Every detail row (for exports), page by page."""
+    pages = [load_detail_page(year, month, property_name, page, scope) for page in range(-(-total // DETAIL_PAGE_SIZE))]
+    return pd.concat(pages, ignore_index=True) if pages else pd.DataFrame(columns=DETAIL_COLUMNS)
 
 # ────────────────────────────────────────────────────────────────────────
 # Create Accounts Report Table
 # ────────────────────────────────────────────────────────────────────────
-def create_accounts_report(bookings: List[Dict], property_filter: str = "All") -> pd.DataFrame:
-    """Create accounts report table with all bookings."""
-    
-    # Filter by property if not "All"
-    if property_filter != "All":
-        bookings = [b for b in bookings if b["property_name"] == property_filter]
-    
-    if not bookings:
-        return pd.DataFrame()
-    
-    # Create DataFrame
-    report_data = []
-    for booking in bookings:
-        report_data.append({
-            "Date": booking["date"].strftime("%Y-%m-%d"),
-            "Property Name": booking["property_name"],
-            "Guest Name": booking["guest_name"],
-            "Booking ID": booking["booking_id"],
-            "Check In": booking["check_in"],
-            "Check Out": booking["check_out"],
-            "Total Amount": booking["total_amount"],
-            "Advance": booking["advance"],
-            "Balance": booking["balance"],
-            "Pending": booking["pending"],
-            "Booking Status": booking["booking_status"],
-            "Payment Status": booking["payment_status"],
-            "Type": booking["type"].title()
-        })
-    
-    df = pd.DataFrame(report_data)
-    
-    # Sort by date and property
-    df = df.sort_values(["Date", "Property Name", "Guest Name"])
-    
-    return df
+def create_accounts_report(rows: pd.DataFrame) -> pd.DataFrame:
+    """Report table for detail rows of the accounts_bookings view."""
+    if rows.empty:
+        return pd.DataFrame(columns=list(REPORT_COLUMNS.values()) + ["Check In", "Check Out"])
+    df = rows.rename(columns=REPORT_COLUMNS)
+    df["Date"] = df["Date"].astype(str).str[:10]
+    df["Check In"] = df["Date"]
+    df["Check Out"] = rows["check_out"].astype(str).str[:10]
+    df["Type"] = df["Type"].str.title()
+    for col in CURRENCY_COLUMNS:
+        df[col] = df[col].astype(float)
+    return df[["Date", "Property Name", "Guest Name", "Booking ID", "Check In", "Check Out"] + CURRENCY_COLUMNS
+              + ["Booking Status", "Payment Status", "Type"]]
 
 # ────────────────────────────────────────────────────────────────────────
 # Calculate Summary Statistics
 # ────────────────────────────────────────────────────────────────────────
-def calculate_summary(df: pd.DataFrame) -> Dict:
-    """Calculate summary statistics from the report."""
-    if df.empty:
-        return {
-            "Total Bookings": 0,
-            "Total Amount": 0.0,
-            "Total Advance": 0.0,
-            "Total Balance": 0.0,
-            "Total Pending": 0.0
-        }
-    
+def calculate_summary(totals: pd.DataFrame) -> Dict:
+    """Summary statistics from the per-property totals."""
     return {
-        "Total Bookings": len(df),
-        "Total Amount": df["Total Amount"].sum(),
-        "Total Advance": df["Advance"].sum(),
-        "Total Balance": df["Balance"].sum(),
-        "Total Pending": df["Pending"].sum()
+        "Total Bookings": int(totals["bookings"].sum()),
+        "Total Amount": float(totals["total_amount"].sum()),
+        "Total Advance": float(totals["advance"].sum()),
+        "Total Balance": float(totals["balance"].sum()),
+        "Total Pending": float(totals["pending"].sum()),
     }
 
 # ────────────────────────────────────────────────────────────────────────
 # Property-wise Summary
 # ────────────────────────────────────────────────────────────────────────
-def create_property_summary(df: pd.DataFrame) -> pd.DataFrame:
-    """Create property-wise summary table."""
-    if df.empty:
+def create_property_summary(totals: pd.DataFrame) -> pd.DataFrame:
+    """Property-wise summary table with a totals row."""
+    if totals.empty:
         return pd.DataFrame()
-    
-    summary = df.groupby("Property Name").agg({
-        "Booking ID": "count",
-        "Total Amount": "sum",
-        "Advance": "sum",
-        "Balance": "sum",
-        "Pending": "sum"
-    }).reset_index()
-    
+
+    summary = totals[TOTALS_COLUMNS].copy()
     summary.columns = ["Property Name", "Bookings", "Total Amount", "Advance", "Balance", "Pending"]
-    
+
     # Add totals row
-    totals = {
-        "Property Name": "TOTAL",
-        "Bookings": summary["Bookings"].sum(),
-        "Total Amount": summary["Total Amount"].sum(),
-        "Advance": summary["Advance"].sum(),
-        "Balance": summary["Balance"].sum(),
-        "Pending": summary["Pending"].sum()
-    }
-    
-    summary = pd.concat([summary, pd.DataFrame([totals])], ignore_index=True)
-    
+    totals_row = {"Property Name": "TOTAL", **{col: summary[col].sum() for col in summary.columns[1:]}}
+    summary = pd.concat([summary, pd.DataFrame([totals_row])], ignore_index=True)
+
     return summary
 
 # ────────────────────────────────────────────────────────────────────────
@@ -295,36 +177,35 @@ def show_accounts_report():
     
     with col3:
         if st.button("🔄 Refresh Data", use_container_width=False):
-            st.cache_data.clear()
+            months = months_between(*month_bounds(year, month))
+            load_property_totals.invalidate(month=months)
+            load_detail_page.invalidate(month=months)
             st.rerun()
     
-    # Load all bookings for the month
-    with st.spinner(f"Loading bookings for {calendar.month_name[month]} {year}..."):
-        all_bookings = load_all_bookings_for_month(year, month)
+    # Per-property totals for the month (aggregated server-side), for the user's properties
+    scope = user_scope()
+    with st.spinner(f"Loading totals for {calendar.month_name[month]} {year}..."):
+        totals = load_property_totals(year, month, scope)
     
-    if not all_bookings:
+    if totals.empty:
         st.warning(f"No bookings found for {calendar.month_name[month]} {year}")
         return
     
-    st.success(f"✅ Loaded {len(all_bookings)} bookings")
+    st.success(f"✅ {int(totals['bookings'].sum())} bookings across {len(totals)} properties")
     
     # Get unique properties
-    properties = sorted(list(set(b["property_name"] for b in all_bookings)))
+    properties = totals["property_name"].tolist()
     
     # Property filter
     st.subheader("🏨 Filter by Property")
     property_filter = st.selectbox("Select Property", ["All"] + properties)
     
-    # Create report
-    df = create_accounts_report(all_bookings, property_filter)
-    
-    if df.empty:
-        st.warning("No data available for the selected filters.")
-        return
+    if property_filter != "All":
+        totals = totals[totals["property_name"] == property_filter]
     
     # Display Summary Statistics
     st.subheader("📈 Summary Statistics")
-    summary = calculate_summary(df)
+    summary = calculate_summary(totals)
     
     col1, col2, col3, col4, col5 = st.columns(5)
     with col1:
@@ -342,10 +223,10 @@ def show_accounts_report():
     
     # Property-wise Summary
     st.subheader("🏢 Property-wise Summary")
-    property_summary = create_property_summary(df)
+    property_summary = create_property_summary(totals)
     
     # Format currency columns
-    for col in ["Total Amount", "Advance", "Balance", "Pending"]:
+    for col in CURRENCY_COLUMNS:
         property_summary[col] = property_summary[col].apply(lambda x: f"₹{x:,.2f}")
     
     st.dataframe(
@@ -362,12 +243,19 @@ def show_accounts_report():
         }
     )
     
-    # Detailed Report
+    # Detailed Report (one page at a time)
     st.subheader("📋 Detailed Accounts Report")
     
+    property_name = None if property_filter == "All" else property_filter
+    n_rows = summary["Total Bookings"]
+    n_pages = max(-(-n_rows // DETAIL_PAGE_SIZE), 1)
+    page = st.number_input(f"Page (of {n_pages}, {DETAIL_PAGE_SIZE} bookings each)", min_value=1, max_value=n_pages, value=1) - 1
+    
+    df = create_accounts_report(load_detail_page(year, month, property_name, int(page), scope))
+    
     # Format currency columns for display
     display_df = df.copy()
-    for col in ["Total Amount", "Advance", "Balance", "Pending"]:
+    for col in CURRENCY_COLUMNS:
         display_df[col] = display_df[col].apply(lambda x: f"₹{x:,.2f}")
     
     # Style function for highlighting
@@ -409,15 +297,16 @@ def show_accounts_report():
     col1, col2 = st.columns(2)
     
     with col1:
-        # Export to CSV
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="📄 Download CSV",
-            data=csv,
-            file_name=f"accounts_report_{year}_{month:02d}_{property_filter.replace(' ', '_')}.csv",
-            mime="text/csv",
-            use_container_width=True
-        )
+        # Export to CSV (fetches every detail page)
+        if st.button("📄 Prepare CSV", use_container_width=True):
+            full_df = create_accounts_report(load_all_detail(year, month, property_name, n_rows, scope))
+            st.download_button(
+                label="📄 Download CSV",
+                data=full_df.to_csv(index=False),
+                file_name=f"accounts_report_{year}_{month:02d}_{property_filter.replace(' ', '_')}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
     
     with col2:
         # Export property summary
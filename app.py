@@ -1,12 +1,13 @@
 import streamlit as st
 import os
 from supabase import create_client, Client
-from directreservation import show_new_reservation_form, show_reservations, show_edit_reservations, show_analytics, load_reservations_from_supabase
-from online_reservation import show_online_reservations, load_online_reservations_from_supabase
+from directreservation import show_new_reservation_form, show_reservations, show_edit_reservations, show_analytics
+from online_reservation import show_online_reservations
 from booking_date_report import show_booking_date_report
 from booking_date_report import show_booking_date_report
 from booking_date_report_datewise import show_datewise_booking_report  
 from checkin_date_report_datewise import show_checkin_date_report  
+from pickup_report import show_pickup_report
 try:
     from editOnline import show_edit_online_reservations
     edit_online_available = True
@@ -24,6 +25,11 @@ from log import show_log_report, log_activity
 from users import validate_user, create_user, update_user, delete_user, load_users
 from accounts_report import show_accounts_report
 from nrd_report import show_nrd_report
+from booking_cache import booking_cache
+from booking_store import expire_snapshot
+from revenue_ledger import expire_ledger
+from cache_warmup import start_warmup, warmup_status, prefetch_screen
+from property_scope import user_scope
 
 # Properties that stopped operating from July 1, 2026 onward.
 # Existing user assignments / historical data are untouched - this only
@@ -73,13 +79,20 @@ def get_supabase_client():
         st.stop()
 
 supabase: Client = get_supabase_client()
+
+@st.cache_resource
+def start_cache_warmup():
+    """Kick off the background cache warm-up once per process."""
+    return start_warmup()
+
+start_cache_warmup()
 def check_authentication():
     if 'authenticated' not in st.session_state:
         st.session_state.authenticated = False
         st.session_state.username = None
         st.session_state.role = None
-        st.session_state.reservations = []
-        st.session_state.online_reservations = []
+        st.session_state.reservations = None          # loaded by the pages on first use
+        st.session_state.online_reservations = None
         st.session_state.edit_mode = False
         st.session_state.edit_index = None
         st.session_state.online_edit_mode = False
@@ -130,15 +143,11 @@ def check_authentication():
                 query_booking_id = query_params.get("booking_id", [None])[0]
                 if query_booking_id:
                     st.session_state.selected_booking_id = query_booking_id
-                try:
-                    if st.session_state.role != "Admin" or st.session_state.user_data is not None:
-                        st.session_state.reservations = load_reservations_from_supabase()
-                        st.session_state.online_reservations = load_online_reservations_from_supabase()
-                    st.success(f"{username} login successful!")
-                except Exception as e:
-                    st.session_state.reservations = []
-                    st.session_state.online_reservations = []
-                    st.warning(f"{username} login successful, but failed to fetch data: {e}")
+                # No data is loaded here: pages load what they need through the
+                # shared cache, and the default screen's data is prefetched meanwhile
+                if st.session_state.user_data is not None:
+                    prefetch_screen(st.session_state.current_page, user_scope())
+                st.success(f"{username} login successful!")
                 st.rerun()
         st.stop()
     else:
@@ -224,7 +233,7 @@ def show_user_management():
         all_properties = get_active_properties(all_properties)
         new_properties = st.multiselect("Visible Properties", all_properties, default=all_properties, key="create_properties")
        
-        all_screens = ["Inventory Dashboard", "Night Report Dashboard", "Accounts Report", "Date-wise Booking Report", "Date-wise Check-in Report", "Booking Date Report","Direct Reservations", "View Reservations", "Edit Direct Reservation", "Online Reservations", "Edit Online Reservations", "Daily Status", "Daily Management Status", "Analytics", "Monthly Consolidation", "Summary Report", "Target Achievement", "User Management", "Log Report"]
+        all_screens = ["Inventory Dashboard", "Night Report Dashboard", "Accounts Report", "Date-wise Booking Report", "Date-wise Check-in Report", "Pickup Report", "Booking Date Report","Direct Reservations", "View Reservations", "Edit Direct Reservation", "Online Reservations", "Edit Online Reservations", "Daily Status", "Daily Management Status", "Analytics", "Monthly Consolidation", "Summary Report", "Target Achievement", "User Management", "Log Report"]
        
         # Default screens based on role
         if new_role == "Admin":
@@ -236,7 +245,7 @@ def show_user_management():
         elif new_role == "Accounts Team":
             default_screens = ["Daily Status", "Night Report Dashboard", "Monthly Consolidation", "Accounts Report"]
         else:
-            default_screens = [s for s in all_screens if s not in ["Daily Management Status", "Night Report Dashboard", "Date-wise Booking Report","Date-wise Check-in Report", "Analytics", "Inventory Dashboard", "Summary Report", "Target Achievement", "User Management", "Log Report"]]
+            default_screens = [s for s in all_screens if s not in ["Daily Management Status", "Night Report Dashboard", "Date-wise Booking Report","Date-wise Check-in Report", "Pickup Report", "Analytics", "Inventory Dashboard", "Summary Report", "Target Achievement", "User Management", "Log Report"]]
        
         new_screens = st.multiselect("Visible Screens", all_screens, default=default_screens, key="create_screens")
        
@@ -342,7 +351,7 @@ def show_user_management():
                             default_properties = all_properties
                         mod_properties = st.multiselect("Visible Properties", all_properties, default=default_properties, key="modify_properties")
                        
-                        all_screens = ["Inventory Dashboard", "Booking Date Report", "Date-wise Booking Report", "Date-wise Check-in Report", "Accounts Report", "Direct Reservations", "Night Report Dashboard", "View Reservations", "Edit Direct Reservation", "Online Reservations", "Edit Online Reservations", "Daily Status", "Daily Management Status", "Analytics", "Monthly Consolidation", "Summary Report", "Target Achievement", "User Management", "Log Report"]
+                        all_screens = ["Inventory Dashboard", "Booking Date Report", "Date-wise Booking Report", "Date-wise Check-in Report", "Pickup Report", "Accounts Report", "Direct Reservations", "Night Report Dashboard", "View Reservations", "Edit Direct Reservation", "Online Reservations", "Edit Online Reservations", "Daily Status", "Daily Management Status", "Analytics", "Monthly Consolidation", "Summary Report", "Target Achievement", "User Management", "Log Report"]
                         # Filter out any screens that don't exist in all_screens to avoid the error
                         valid_current_screens = [screen for screen in current_screens if screen in all_screens]
                         mod_screens = st.multiselect("Visible Screens", all_screens, default=valid_current_screens, key="modify_screens")
@@ -422,14 +431,21 @@ def main():
     # === Refresh Button (not for hardcoded Admin) ===
     if not (st.session_state.role == "Admin" and st.session_state.user_data is None):
         if st.sidebar.button("Refresh All Data"):
-            st.cache_data.clear()
-            try:
-                st.session_state.reservations = load_reservations_from_supabase()
-                st.session_state.online_reservations = load_online_reservations_from_supabase()
-                log_activity(supabase, st.session_state.username, "Refreshed all data")
-                st.success("Data refreshed from database!")
-            except Exception as e:
-                st.warning(f"Data refresh partially failed: {e}")
+            # Only drop cached bookings for the properties this user can see
+            scope = user_scope()
+            if scope is not None:
+                booking_cache.invalidate(property=scope)
+            else:
+                booking_cache.invalidate()
+            expire_snapshot("reservations")
+            expire_ledger()
+            start_warmup()
+            # Reloaded by the pages on next use; the current page's data right away
+            st.session_state.reservations = None
+            st.session_state.online_reservations = None
+            prefetch_screen(page, scope)
+            log_activity(supabase, st.session_state.username, "Refreshed all data")
+            st.success("Data refreshed from database!")
             st.rerun()
     # === Page Routing ===
     if page == "User Management":
@@ -492,21 +508,36 @@ def main():
     elif page == "Date-wise Check-in Report":  # ADD THIS BLOCK
         show_checkin_date_report()
         log_activity(supabase, st.session_state.username, "Accessed Date-wise Check-in Report")
+    elif page == "Pickup Report":
+        show_pickup_report()
+        log_activity(supabase, st.session_state.username, "Accessed Pickup Report")
     
     # === Footer: User Info & Logout ===
     if st.session_state.authenticated:
         st.sidebar.write(f"Logged in as: **{st.session_state.username}**")
         st.sidebar.write(f"Role: **{st.session_state.role}**")
+        if st.session_state.role in ("Admin", "Management"):
+            with st.sidebar.expander("Cache Stats"):
+                stats = booking_cache.stats()
+                st.write(f"Entries: **{stats['entries']}**")
+                st.write(f"Hits / Misses: **{stats['hits']} / {stats['misses']}** ({stats['hit_rate']:.0%})")
+                st.write(f"Evictions: **{stats['evictions']}** ({stats['lru_evictions']} over budget)")
+                st.write(f"Footprint: **{stats['bytes'] / 1048576:.1f} / {stats['max_bytes'] / 1048576:.0f} MB**")
+                st.write(f"Coalesced / Stale served: **{stats['coalesced']} / {stats['stale_served']}**")
+                warmup = warmup_status()
+                if warmup["ready"]:
+                    st.write(f"Warm-up: **ready** ({len(warmup['timings'])} slices, {sum(warmup['timings'].values()):.1f}s)")
+                else:
+                    st.write("Warm-up: **running**" if warmup["running"] else "Warm-up: **not started**")
     if st.sidebar.button("Log Out"):
         log_activity(supabase, st.session_state.username, "Logged out")
-        st.cache_data.clear()
-        st.cache_resource.clear()
+        # Cached bookings are shared across sessions, so logging out leaves them alone
         for key in list(st.session_state.keys()):
             del st.session_state[key]
         st.session_state.authenticated = False
         st.session_state.role = None
-        st.session_state.reservations = []
-        st.session_state.online_reservations = []
+        st.session_state.reservations = None
+        st.session_state.online_reservations = None
         st.session_state.current_page = "Direct Reservations"
         st.session_state.selected_booking_id = None
         st.query_params.clear()
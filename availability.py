@@ -0,0 +1,292 @@
+# availability.py - Per-room occupancy bitmaps for instant free-room lookups
+#
+# Each (property, room) gets one Python int used as a bitset over a rolling
+# 18-month horizon: bit i is set when the room is occupied on the night of
+# horizon_start + i. "Is room R free from A to B" is then a single AND against
+# the mask of those nights. The index is built from the booking snapshot
+# (booking_store) and patched in place by the save/update/delete paths.
+
+import calendar
+import logging
+import re
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from booking_frame import combine_bookings_frames, VALID_STATUSES
+from booking_cache import PROPERTY_ALIASES, canonical_property
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+HORIZON_MONTHS = 18
+REBUILD_INTERVAL = 600    # seconds; picks up writes made by other workers
+PSEUDO_ROOM_PREFIXES = ("day use", "no show")
+NON_BOOKABLE_TYPES = {"Day Use", "No Show", "Others"}
+
+# Max guests per unit, matched by keyword against the room-type names in
+# directreservation.load_property_room_map (first match wins). Types that match
+# nothing are never filtered out by the pax check.
+ROOM_TYPE_CAPACITY = [
+    ("4BHA", 8), ("3BHA", 6), ("Villa", 6), ("2BHA", 4), ("Two Bedroom", 4),
+    ("Apartment", 4), ("Appartment", 4), ("Family", 4), ("Triple", 3),
+    ("Double", 2), ("Standard", 2), ("Studio", 2),
+]
+
+_RANGE = re.compile(r"(\d+)\s*to\s*(\d+)", re.IGNORECASE)
+
+BookingKey = Tuple[str, str]          # (table, booking_id)
+RoomKey = Tuple[str, str]             # (canonical property, lower-cased room)
+
+def room_key(property: str, room: str) -> RoomKey:
+    return canonical_property(property), str(room).strip().lower()
+
+def expand_room(room: str) -> List[str]:
+    """Combined units to their rooms: "201to203&301" -> ["201", "202", "203", "301"]."""
+    rooms = []
+    for piece in room.split("&"):
+        piece = piece.strip()
+        m = _RANGE.fullmatch(piece)
+        if m and 0 <= int(m[2]) - int(m[1]) < 20:
+            rooms.extend(str(n) for n in range(int(m[1]), int(m[2]) + 1))
+        elif piece:
+            rooms.append(piece)
+    return rooms
+
+def split_rooms(room_no: Any) -> List[str]:
+    """Comma-separated room_no -> individual room numbers, combined units expanded."""
+    return [r for part in str(room_no or "").split(",") for r in expand_room(part)]
+
+def room_capacity(room_type: str) -> Optional[int]:
+    for keyword, capacity in ROOM_TYPE_CAPACITY:
+        if keyword.lower() in room_type.lower():
+            return capacity
+    return None
+
+def is_pseudo_room(room: str) -> bool:
+    return room.strip().lower().startswith(PSEUDO_ROOM_PREFIXES)
+
+def _add_months(d: date, months: int) -> date:
+    y, m = divmod(d.month - 1 + months, 12)
+    return date(d.year + y, m + 1, min(d.day, calendar.monthrange(d.year + y, m + 1)[1]))
+
+# -------------------------- Index --------------------------
+class AvailabilityIndex:
+    """Occupancy bitmaps keyed by (property, room)."""
+
+    def __init__(self, horizon_start: date, months: int = HORIZON_MONTHS):
+        self.horizon_start = horizon_start
+        self.horizon_end = _add_months(horizon_start, months)
+        self.nights = (self.horizon_end - horizon_start).days
+        self._masks: Dict[RoomKey, Dict[BookingKey, int]] = {}
+        self._bitmaps: Dict[RoomKey, int] = {}
+        self._rooms_by_booking: Dict[BookingKey, List[RoomKey]] = {}
+        self._lock = threading.RLock()
+
+    def night_mask(self, check_in: date, check_out: date) -> int:
+        """Bits for the nights check_in .. check_out-1, clipped to the horizon."""
+        i0 = max(0, (check_in - self.horizon_start).days)
+        i1 = min(self.nights, (check_out - self.horizon_start).days)
+        if i1 <= i0:
+            return 0
+        return ((1 << (i1 - i0)) - 1) << i0
+
+    def _recompute(self, rk: RoomKey) -> None:
+        bitmap = 0
+        for mask in self._masks.get(rk, {}).values():
+            bitmap |= mask
+        if bitmap:
+            self._bitmaps[rk] = bitmap
+        else:
+            self._bitmaps.pop(rk, None)
+            self._masks.pop(rk, None)
+
+    def add(self, key: BookingKey, property: str, room_no: Any, check_in: date, check_out: date) -> None:
+        mask = self.night_mask(check_in, check_out)
+        with self._lock:
+            self.remove(key)
+            if not mask:
+                return
+            rooms = [room_key(property, r) for r in split_rooms(room_no)]
+            for rk in rooms:
+                self._masks.setdefault(rk, {})[key] = mask
+                self._bitmaps[rk] = self._bitmaps.get(rk, 0) | mask
+            self._rooms_by_booking[key] = rooms
+
+    def remove(self, key: BookingKey) -> None:
+        with self._lock:
+            for rk in self._rooms_by_booking.pop(key, []):
+                self._masks.get(rk, {}).pop(key, None)
+                self._recompute(rk)
+
+    def occupancy(self, property: str, room: str) -> int:
+        with self._lock:
+            return self._bitmaps.get(room_key(property, room), 0)
+
+    def is_free(self, property: str, room: str, check_in: date, check_out: date) -> bool:
+        """Free every night of the stay; a combined unit needs all of its rooms free."""
+        mask = self.night_mask(check_in, check_out)
+        with self._lock:
+            return not any(self.occupancy(property, r) & mask for r in expand_room(room))
+
+    def free_rooms(self, property: str, check_in: date, check_out: date, rooms: Optional[Iterable[str]] = None) -> List[str]:
+        """Rooms (default: the property's inventory, minus Day Use/No Show) free every night of the stay."""
+        if rooms is None:
+            rooms = [r for r in property_rooms(property) if not is_pseudo_room(r)]
+        mask = self.night_mask(check_in, check_out)
+        prop = canonical_property(property)
+        with self._lock:
+            bitmaps = self._bitmaps
+            return [r for r in rooms
+                    if not any(bitmaps.get((prop, part.lower()), 0) & mask for part in expand_room(str(r)))]
+
+    def bookings_on(self, property: str, room: str, check_in: date, check_out: date) -> List[BookingKey]:
+        """Bookings holding the room on any night of the stay."""
+        mask = self.night_mask(check_in, check_out)
+        with self._lock:
+            return [k for k, m in self._masks.get(room_key(property, room), {}).items() if m & mask]
+
+    def covers(self, check_in: date, check_out: date) -> bool:
+        return self.horizon_start <= check_in and check_out <= self.horizon_end
+
+# -------------------------- Build --------------------------
+def property_rooms(property: str) -> List[str]:
+    """Inventory room list for a property (inventory.PROPERTY_INVENTORY)."""
+    from inventory import PROPERTY_INVENTORY
+    return list(PROPERTY_INVENTORY.get(canonical_property(property), {"all": []})["all"])
+
+def build_index(horizon_start: Optional[date] = None) -> AvailabilityIndex:
+    """Build the index from the reservations/online_reservations snapshots."""
+    from booking_store import load_snapshot
+    started = time.monotonic()
+    horizon_start = horizon_start or date.today().replace(day=1)
+    index = AvailabilityIndex(horizon_start)
+    frame = combine_bookings_frames(
+        load_snapshot("reservations"), load_snapshot("online_reservations"),
+        mapping=PROPERTY_ALIASES, paid_only=False,
+    )
+    live = frame[(frame["check_out"] > pd.Timestamp(horizon_start)) & (frame["check_in"] < pd.Timestamp(index.horizon_end))]
+    for btype, bid, prop, room_no, ci, co in zip(
+        live["type"], live["booking_id"], live["property"], live["room_no"],
+        live["check_in"].dt.date, live["check_out"].dt.date,
+    ):
+        table = "online_reservations" if btype == "online" else "reservations"
+        index.add((table, bid), prop, room_no, ci, co)
+    logging.info(f"availability: indexed {len(live)} bookings, {len(index._bitmaps)} rooms in {time.monotonic() - started:.2f}s")
+    return index
+
+_index: Optional[AvailabilityIndex] = None
+_built_at = 0.0
+_build_lock = threading.Lock()
+
+def get_index() -> AvailabilityIndex:
+    """Process-wide index, rebuilt when the month rolls over or every REBUILD_INTERVAL seconds."""
+    global _index, _built_at
+    horizon_start = date.today().replace(day=1)
+    if _index is not None and _index.horizon_start == horizon_start and time.monotonic() - _built_at < REBUILD_INTERVAL:
+        return _index
+    with _build_lock:
+        if _index is None or _index.horizon_start != horizon_start or time.monotonic() - _built_at >= REBUILD_INTERVAL:
+            _index = build_index(horizon_start)
+            _built_at = time.monotonic()
+    return _index
+
+# -------------------------- Search --------------------------
+def search_availability(check_in: date, check_out: date, pax: int = 1,
+                        properties: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, List[str]]]:
+    """Free rooms for the stay across properties: {property: {room type: [rooms]}}.
+
+    Defaults to every property open on check_in (closed properties are dropped from
+    PROPERTY_CLOSURE_DATE on). Room types known to hold fewer than `pax` guests
+    are skipped.
+    """
+    from directreservation import load_property_room_map, CLOSED_PROPERTIES, PROPERTY_CLOSURE_DATE
+    index = get_index()
+    room_map = load_property_room_map()
+    if properties is None:
+        properties = [p for p in room_map if not (check_in >= PROPERTY_CLOSURE_DATE and p in CLOSED_PROPERTIES)]
+    results: Dict[str, Dict[str, List[str]]] = {}
+    for prop in properties:
+        by_type: Dict[str, List[str]] = {}
+        for room_type, rooms in room_map.get(prop, {}).items():
+            if room_type in NON_BOOKABLE_TYPES:
+                continue
+            capacity = room_capacity(room_type)
+            if capacity is not None and capacity < pax:
+                continue
+            free = index.free_rooms(prop, check_in, check_out, [r for r in dict.fromkeys(rooms) if r.strip()])
+            if free:
+                by_type[room_type] = free
+        if by_type:
+            results[prop] = by_type
+    return results
+
+# -------------------------- Overbooking guard --------------------------
+def find_conflicts(property: str, room_no: Any, check_in: Any, check_out: Any,
+                   exclude_booking_id: Optional[str] = None) -> Dict[str, List[str]]:
+    """Rooms of room_no already held on any night of the stay: {room: [booking ids]}.
+
+    Day Use / No Show pseudo-rooms never conflict. Stays outside the index horizon
+    are only checked for the nights inside it.
+    """
+    ci, co = _as_date(check_in), _as_date(check_out)
+    if not ci or not co or co <= ci:
+        return {}
+    index = get_index()
+    exclude = str(exclude_booking_id or "").strip()
+    conflicts: Dict[str, List[str]] = {}
+    for room in split_rooms(room_no):
+        if is_pseudo_room(room):
+            continue
+        holders = [bid for _, bid in index.bookings_on(property, room, ci, co) if bid != exclude]
+        if holders:
+            conflicts[room] = holders
+    return conflicts
+
+def describe_conflicts(conflicts: Dict[str, List[str]]) -> str:
+    return "; ".join(f"Room {room} is booked by {', '.join(ids)}" for room, ids in conflicts.items())
+
+def check_room_conflicts(property: str, room_no: Any, check_in: Any, check_out: Any, booking_status: str,
+                         exclude_booking_id: Optional[str] = None) -> Tuple[bool, str]:
+    """The save-time overbooking check: (has_conflict, message) for a booking with this status.
+
+    Only confirmed/completed bookings hold rooms. If the index cannot be read the
+    save is refused: a booking is never written without the check having run.
+    """
+    if str(booking_status or "").strip().title() not in VALID_STATUSES:
+        return False, ""
+    try:
+        conflicts = find_conflicts(property, room_no, check_in, check_out, exclude_booking_id)
+    except Exception:
+        logging.exception(f"availability: overbooking check failed for {property} {room_no} {check_in}..{check_out}")
+        return True, "Room availability could not be checked, please try again"
+    if conflicts:
+        return True, describe_conflicts(conflicts)
+    return False, ""
+
+# -------------------------- Save hooks --------------------------
+def _as_date(value: Any) -> Optional[date]:
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+def record_booking(table: str, booking_id: str, property: str, room_no: Any, check_in: Any, check_out: Any, status: str = "Confirmed") -> None:
+    """Patch the index after a save/update; bookings that no longer hold rooms are dropped."""
+    if _index is None:
+        return
+    key = (table, str(booking_id).strip())
+    ci, co = _as_date(check_in), _as_date(check_out)
+    if ci and co and co > ci and str(status or "").strip().title() in VALID_STATUSES:
+        _index.add(key, property, room_no, ci, co)
+    else:
+        _index.remove(key)
+
+def forget_booking(table: str, booking_id: str) -> None:
+    """Patch the index after a delete."""
+    if _index is not None:
+        _index.remove((table, str(booking_id).strip()))
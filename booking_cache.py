@@ -0,0 +1,377 @@
+# booking_cache.py - Process-wide booking cache with tag-based invalidation
+#
+# st.cache_data.clear() throws away every cached month for every user, so one
+# Refresh click (or a save, or a log-out) makes the whole team reload at once.
+# Entries here are tagged by table, property and month, and invalidation drops
+# only the matching slice. Hit/miss/eviction counters are kept for monitoring.
+#
+# Concurrent misses for the same key are coalesced: one caller (the leader) runs
+# the loader while the others wait for its result. Loaders may also opt into
+# stale-while-revalidate, where an expired value is served for a grace period
+# while a background thread fetches the new one.
+#
+# The cache is bounded by an approximate byte budget (BOOKING_CACHE_MAX_MB,
+# default 256). Each entry's size is estimated when it is stored and the least
+# recently used entries are evicted once the total goes over budget.
+#
+# Cached values are shared between sessions and are not copied on read, so they
+# must be treated as read-only: BookingRecords are immutable, row lists are
+# cached as read_only_rows, and a session that edits a cached DataFrame takes
+# its own .copy() first. Loaders with stale_ttl also run on a background
+# thread, outside any Streamlit script, so they must not call st.*; they raise
+# and the page reports the error.
+
+import calendar
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Set, Tuple
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+MAX_BYTES = int(float(os.environ.get("BOOKING_CACHE_MAX_MB", "256")) * 1024 * 1024)
+SIZE_SAMPLE = 50          # items measured per list when estimating entry size
+
+BOOKING_TABLES = ("reservations", "online_reservations")
+TAG_DIMENSIONS = ("table", "property", "month")
+
+# Union of the synonym tables in inventory.py and target_achievement_report.py,
+# so tags (and month partitions) from every module line up
+PROPERTY_ALIASES = {
+    "La Millionaire Luxury Resort": "La Millionaire Resort",
+    "Le Poshe Beach View": "Le Poshe Beach view",
+    "Le Poshe Beach view": "Le Poshe Beach view",
+    "Le Poshe Beach VIEW": "Le Poshe Beach view",
+    "Le Poshe Beachview": "Le Poshe Beach view",
+    "Millionaire": "La Millionaire Resort",
+    "Le Pondy Beach Side": "Le Pondy Beachside",
+    "Le Teera": "Le Terra",
+    "La Tamara Luxury Resort": "La Tamara Luxury",
+    "La Coromandel Luxury Resort": "La Coromandel Luxury",
+    "Le Poshe Luxury Resort": "Le Poshe Luxury",
+    "Le Poshe Suite Resort": "Le Poshe Suite",
+    "La Paradise Luxury Resort": "La Paradise Luxury",
+    "Villa Shakti Resort": "Villa Shakti",
+}
+
+# -------------------------- Tag helpers --------------------------
+def canonical_property(name: str) -> str:
+    name = (name or "").strip()
+    return PROPERTY_ALIASES.get(name, name)
+
+def month_key(d: date) -> str:
+    return f"{d.year}-{d.month:02d}"
+
+def months_between(start: date, end: date) -> List[str]:
+    """Every "YYYY-MM" month touched by the inclusive range start..end."""
+    months = []
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        months.append(f"{y}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+def month_bounds(year: int, month: int) -> Tuple[date, date]:
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+def _as_set(values: Any) -> Optional[Set[str]]:
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return {values}
+    return set(values)
+
+def _clean_tags(tags: Dict[str, Iterable[str]]) -> Dict[str, Set[str]]:
+    return {dim: _as_set(v) for dim, v in tags.items() if dim in TAG_DIMENSIONS and v is not None}
+
+def _tags_match(tags: Dict[str, Set[str]], wanted: Dict[str, Set[str]]) -> bool:
+    """An entry without tags for a dimension holds data for all of it."""
+    for dim, values in wanted.items():
+        mine = tags.get(dim)
+        if mine is not None and not (mine & values):
+            return False
+    return True
+
+# -------------------------- Size estimation --------------------------
+def _shallow_sizeof(obj: Any) -> int:
+    """Object plus its immediate fields/items (strings, numbers, dates)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in obj.items())
+    elif hasattr(obj, "__slots__"):
+        for name in obj.__slots__:
+            size += sys.getsizeof(getattr(obj, name, None))
+    return size
+
+def estimate_size(value: Any) -> int:
+    """Approximate bytes held by a cached value; lists are sampled."""
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return sys.getsizeof(value)
+        step = max(1, len(value) // SIZE_SAMPLE)
+        sample = value[::step][:SIZE_SAMPLE]
+        per_item = sum(_shallow_sizeof(v) for v in sample) / len(sample)
+        return int(sys.getsizeof(value) + per_item * len(value))
+    return _shallow_sizeof(value)
+
+# -------------------------- Cache --------------------------
+class _Entry:
+    __slots__ = ("value", "expires_at", "tags", "owner", "size")
+
+    def __init__(self, value: Any, expires_at: float, tags: Dict[str, Set[str]], owner: str):
+        self.value = value
+        self.expires_at = expires_at
+        self.tags = tags
+        self.owner = owner
+        self.size = estimate_size(value)
+
+    def matches(self, wanted: Dict[str, Set[str]]) -> bool:
+        return _tags_match(self.tags, wanted)
+
+
+class _Flight:
+    """One in-flight load that other callers for the same key wait on."""
+    __slots__ = ("done", "value", "error", "aborted", "tags", "cancelled")
+
+    def __init__(self, tags: Dict[str, Set[str]]):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[Exception] = None
+        self.aborted = False        # the leader was interrupted (e.g. its session reran); waiters load again
+        self.tags = tags
+        self.cancelled = False
+
+
+class TaggedCache:
+    """TTL + LRU cache whose entries carry table/property/month tags."""
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._lock = threading.RLock()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lru_evictions = 0
+        self.coalesced = 0
+        self.stale_served = 0
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        self.evictions += 1
+
+    def _store(self, key: Hashable, entry: _Entry) -> None:
+        """Insert as most recently used, then evict from the LRU end until under budget."""
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key).size
+        self._entries[key] = entry
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == key:
+                break
+            self._drop(oldest)
+            self.lru_evictions += 1
+
+    def _touch(self, key: Hashable) -> Any:
+        self._entries.move_to_end(key)
+        return self._entries[key].value
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, self._touch(key)
+
+    def set(self, key: Hashable, value: Any, ttl: float, tags: Dict[str, Iterable[str]], owner: str = "") -> None:
+        entry = _Entry(value, time.monotonic() + ttl, _clean_tags(tags), owner)
+        with self._lock:
+            self._store(key, entry)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: float,
+                    tags: Dict[str, Iterable[str]], owner: str = "", stale_ttl: float = 0) -> Any:
+        """Return the cached value, coalescing concurrent misses into one loader call."""
+        clean = _clean_tags(tags)
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self.hits += 1
+                return self._touch(key)
+            if entry is not None and entry.expires_at + stale_ttl > now:
+                # Serve the old value and refresh it once in the background
+                self.hits += 1
+                self.stale_served += 1
+                if key not in self._inflight:
+                    flight = self._inflight[key] = _Flight(clean)
+                    threading.Thread(
+                        target=self._revalidate, args=(key, flight, loader, ttl, owner),
+                        name=f"revalidate {owner}", daemon=True,
+                    ).start()
+                return self._touch(key)
+            if entry is not None:
+                self._drop(key)
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight(clean)
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            return self._run_flight(key, flight, loader, ttl, owner)
+        flight.done.wait()
+        if flight.aborted:
+            return self.get_or_load(key, loader, ttl, tags, owner, stale_ttl)
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _run_flight(self, key: Hashable, flight: _Flight, loader: Callable[[], Any], ttl: float, owner: str) -> Any:
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            logging.error(f"booking_cache: load failed for {owner}: {e}")
+            raise
+        except BaseException:
+            # Streamlit's rerun/stop of the leader's own session: raised only here, never in waiters
+            flight.aborted = True
+            raise
+        finally:
+            # Sized outside the lock; estimating a large list is not free
+            failed = flight.error is not None or flight.aborted
+            entry = _Entry(flight.value, time.monotonic() + ttl, flight.tags, owner) if not failed else None
+            with self._lock:
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                # An invalidation that raced the load means the result may already be out of date
+                if entry is not None and not flight.cancelled:
+                    self._store(key, entry)
+            flight.done.set()
+        return flight.value
+
+    def _revalidate(self, key: Hashable, flight: _Flight, loader: Callable[[], Any], ttl: float, owner: str) -> None:
+        """Background refresh: a failure (already logged) leaves the stale value in place."""
+        try:
+            self._run_flight(key, flight, loader, ttl, owner)
+        except Exception:
+            pass
+
+    def invalidate(self, owner: Optional[str] = None, table: Any = None, property: Any = None, month: Any = None) -> int:
+        """Drop entries overlapping the given slice; returns how many were dropped."""
+        wanted = {}
+        if table is not None:
+            wanted["table"] = _as_set(table)
+        if property is not None:
+            wanted["property"] = {canonical_property(p) for p in _as_set(property)}
+        if month is not None:
+            wanted["month"] = _as_set(month)
+        with self._lock:
+            doomed = [k for k, e in self._entries.items()
+                      if (owner is None or e.owner == owner) and e.matches(wanted)]
+            for k in doomed:
+                self._drop(k)
+            for k, flight in self._inflight.items():
+                if (owner is None or k[0] == owner) and _tags_match(flight.tags, wanted):
+                    flight.cancelled = True
+        if doomed:
+            logging.info(f"booking_cache: invalidated {len(doomed)} entries owner={owner} {wanted}")
+        return len(doomed)
+
+    def forget(self, key: Hashable) -> bool:
+        """Drop one entry and cancel its in-flight load; returns whether a value was cached."""
+        with self._lock:
+            cached = key in self._entries
+            if cached:
+                self._drop(key)
+            flight = self._inflight.get(key)
+            if flight is not None:
+                flight.cancelled = True
+        return cached
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "lru_evictions": self.lru_evictions,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "stale_served": self.stale_served,
+                "in_flight": len(self._inflight),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+booking_cache = TaggedCache()
+
+# -------------------------- Decorator --------------------------
+def read_only_rows(rows: Iterable[Dict[str, Any]]) -> Tuple[Mapping[str, Any], ...]:
+    """Rows (e.g. Supabase JSON records) in a form safe to share through the cache."""
+    return tuple(MappingProxyType(row) for row in rows)
+
+def _freeze(args: tuple, kwargs: dict) -> Hashable:
+    return args + tuple(sorted(kwargs.items()))
+
+def tagged_cache(ttl: float, tags: Callable[..., Dict[str, Iterable[str]]], stale_ttl: float = 0):
+    """Cache a loader in booking_cache; `tags` maps the call arguments to its tags.
+
+    With stale_ttl > 0 an expired value keeps being served for that many seconds
+    while it is reloaded in the background.
+    """
+    def decorator(fn: Callable) -> Callable:
+        owner = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (owner, _freeze(args, kwargs))
+            return booking_cache.get_or_load(
+                key, lambda: fn(*args, **kwargs), ttl, tags(*args, **kwargs), owner=owner, stale_ttl=stale_ttl
+            )
+
+        wrapper.invalidate = functools.partial(booking_cache.invalidate, owner)
+        wrapper.clear = functools.partial(booking_cache.invalidate, owner)
+        # Drops only the value cached for these arguments (e.g. one user's scope)
+        wrapper.forget = lambda *args, **kwargs: booking_cache.forget((owner, _freeze(args, kwargs)))
+        return wrapper
+    return decorator
+
+def range_tags(property: str, start: date, end: date) -> Dict[str, Iterable[str]]:
+    """Tags for a per-property date-range booking load over both tables."""
+    return {"table": BOOKING_TABLES, "property": [canonical_property(property)], "month": months_between(start, end)}
+
+def _as_date(value: Any) -> Optional[date]:
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+def invalidate_booking(table: str, property: Optional[str], check_in: Any = None, check_out: Any = None) -> int:
+    """Invalidate everything a saved booking could appear in (dates may be ISO strings)."""
+    ci, co = _as_date(check_in), _as_date(check_out)
+    months = months_between(ci, co) if ci and co and ci <= co else None
+    return booking_cache.invalidate(table=table, property=property or None, month=months)
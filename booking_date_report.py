@@ -1,254 +1,30 @@
 # booking_date_report.py - Property-wise Booking Made Date Report
+#
+# Bookings come from the shared date index (datewise_report), bucketed by the
+# day each booking was made; the month is grouped by property in one pass and
+# only the selected property's bookings are sent to the browser.
 import streamlit as st
-from supabase import create_client, Client
-from datetime import date, datetime
+from datetime import date
 import pandas as pd
 import calendar
+from collections import defaultdict
 
-# Initialize Supabase client
-try:
-    supabase: Client = create_client(st.secrets["supabase"]["url"], st.secrets["supabase"]["key"])
-except KeyError as e:
-    st.error(f"Missing Supabase secret: {e}. Please check Streamlit Cloud secrets configuration.")
-    st.stop()
+from datewise_report import CLOSED_PROPERTIES, CLOSURE_CUTOFF, booking_property, load_booking_index, render_bookings_page, select_bookings
+from property_scope import user_scope
 
-# Property synonym mapping
-property_mapping = {
-    "La Millionaire Luxury Resort": "La Millionaire Resort",
-    "Le Poshe Beach View": "Le Poshe Beach view",
-    "Le Poshe Beach view": "Le Poshe Beach view",
-    "Le Poshe Beach VIEW": "Le Poshe Beach view",
-    "Le Poshe Beachview": "Le Poshe Beach view",
-    "Millionaire": "La Millionaire Resort",
-    "Le Pondy Beach Side": "Le Pondy Beachside",
-    "Le Teera": "Le Terra"
-}
-
-# Properties permanently closed from July 2026 onward.
-# History (June 2026 and earlier) must still be shown; from July 2026 they are excluded.
-CLOSED_PROPERTIES = {
-    "La Millionaire Resort",
-    "Le Pondy Beachside",
-    "Le Poshe Beach view",
-    "Le Terra",
-    "Happymates Forest Retreat",
-}
-CLOSURE_CUTOFF = date(2026, 7, 1)  # first month from which closed properties are hidden
-
-# Table CSS with frozen columns till Guest Name
-TABLE_CSS = """
-<style>
-.custom-scrollable-table {
-    overflow-x: auto;
-    max-width: 100%;
-    position: relative;
-}
-.custom-scrollable-table table {
-    table-layout: auto;
-    border-collapse: collapse;
-    min-width: 100%;
-}
-.custom-scrollable-table td, .custom-scrollable-table th {
-    white-space: nowrap;
-    text-overflow: ellipsis;
-    overflow: hidden;
-    max-width: 300px;
-    padding: 8px;
-    border: 1px solid #ddd;
-    background-color: white;
-}
-/* Freeze first 4 columns: Source, Booking ID, Booking Date, Guest Name */
-.custom-scrollable-table th:nth-child(1),
-.custom-scrollable-table td:nth-child(1) {
-    position: sticky;
-    left: 0;
-    z-index: 10;
-    background-color: #f8f9fa;
-    box-shadow: 2px 0 5px rgba(0,0,0,0.1);
-}
-.custom-scrollable-table th:nth-child(2),
-.custom-scrollable-table td:nth-child(2) {
-    position: sticky;
-    left: 80px;
-    z-index: 10;
-    background-color: #f8f9fa;
-    box-shadow: 2px 0 5px rgba(0,0,0,0.1);
-}
-.custom-scrollable-table th:nth-child(3),
-.custom-scrollable-table td:nth-child(3) {
-    position: sticky;
-    left: 200px;
-    z-index: 10;
-    background-color: #f8f9fa;
-    box-shadow: 2px 0 5px rgba(0,0,0,0.1);
-}
-.custom-scrollable-table th:nth-child(4),
-.custom-scrollable-table td:nth-child(4) {
-    position: sticky;
-    left: 330px;
-    z-index: 10;
-    background-color: #f8f9fa;
-    box-shadow: 2px 0 5px rgba(0,0,0,0.1);
-}
-.custom-scrollable-table th {
-    background-color: #e9ecef !important;
-    font-weight: bold;
-}
-.custom-scrollable-table a {
-    color: #1E90FF;
-    text-decoration: none;
-}
-.custom-scrollable-table a:hover {
-    text-decoration: underline;
-}
-</style>
-"""
-
-def load_direct_reservations_from_supabase():
-    """Load ALL direct reservations without any limits using pagination"""
-    try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
-        return all_data
-    except Exception as e:
-        st.error(f"Error loading direct reservations: {e}")
-        return []
-
-def load_online_reservations_from_supabase():
-    """Load ALL online reservations without any limits using pagination"""
-    try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("online_reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
-        return all_data
-    except Exception as e:
-        st.error(f"Error loading online reservations: {e}")
-        return []
-
-def safe_date_parse(date_str):
-    """Robust date parsing"""
-    if not date_str:
-        return None
-    s = str(date_str)
-    try:
-        return datetime.fromisoformat(s.replace("Z", "+00:00")).date()
-    except:
-        try:
-            return datetime.strptime(s[:10], "%Y-%m-%d").date()
-        except:
-            return None
-
-def generate_month_dates(year, month):
-    """Generate all dates in a month"""
-    _, num_days = calendar.monthrange(year, month)
-    return [date(year, month, day) for day in range(1, num_days + 1)]
-
-def filter_bookings_by_booking_date(bookings, target_date):
-    """Filter bookings that were made on the target date"""
-    filtered = []
-    for b in bookings:
-        # Try different possible booking date field names
-        booking_date = None
-        
-        # Check for booking_date field
-        if "booking_date" in b:
-            booking_date = safe_date_parse(b.get("booking_date"))
-        # Check for created_at field as fallback
-        elif "created_at" in b:
-            booking_date = safe_date_parse(b.get("created_at"))
-        
-        if booking_date and booking_date == target_date:
-            b["source"] = "direct" if "property_name" in b else "online"
-            b["parsed_booking_date"] = booking_date
-            filtered.append(b)
-    
-    return filtered
-
-def create_bookings_table(bookings):
-    """Create HTML table from bookings"""
-    columns = [
-        "Source", "Booking ID", "Booking Date", "Guest Name", "Mobile No", 
-        "Check-in Date", "Check-out Date", "Room No",
-        "Advance MOP", "Balance MOP", "Total Tariff", "Advance Amount", 
-        "Balance Due", "Booking Status", "Remarks"
-    ]
-    df_data = []
-    
-    for booking in bookings:
-        source = booking.get("source", "online")
-        booking_id = booking.get("booking_id", "") or booking.get("id", "")
-        edit_link = f'<a href="?page=Edit Online Reservations&booking_id={booking_id}" target="_self">{booking_id}</a>' if source == "online" else \
-                    f'<a href="?page=Edit Reservations&booking_id={booking_id}" target="_self">{booking_id}</a>'
-
-        df_data.append({
-            "Source": source.capitalize(),
-            "Booking ID": edit_link,
-            "Booking Date": str(booking.get("parsed_booking_date", "")),
-            "Guest Name": booking.get("guest_name") or booking.get("name", "") or "",
-            "Mobile No": booking.get("guest_phone") or booking.get("mobile_no", "") or "",
-            "Check-in Date": str(safe_date_parse(booking.get("check_in"))) if safe_date_parse(booking.get("check_in")) else "",
-            "Check-out Date": str(safe_date_parse(booking.get("check_out"))) if safe_date_parse(booking.get("check_out")) else "",
-            "Room No": booking.get("room_no", "") or "",
-            "Advance MOP": booking.get("advance_mop", "") or "",
-            "Balance MOP": booking.get("balance_mop", "") or "",
-            "Total Tariff": booking.get("booking_amount") or booking.get("total_tariff") or 0,
-            "Advance Amount": booking.get("total_payment_made") or booking.get("advance_amount") or 0,
-            "Balance Due": booking.get("balance_due") or 0,
-            "Booking Status": booking.get("booking_status") or booking.get("plan_status", "") or "",
-            "Remarks": booking.get("remarks", "") or "",
-        })
-    
-    df = pd.DataFrame(df_data, columns=columns)
-    for col in ['Guest Name', 'Mobile No', 'Room No', 'Remarks']:
-        if col in df.columns:
-            df[col] = df[col].apply(lambda x: f'<span title="{x}">{x}</span>' if pd.notna(x) and str(x).strip() else x)
-    return df
-
-@st.cache_data(ttl=300)
-def cached_load_online_reservations():
-    return load_online_reservations_from_supabase()
-
-@st.cache_data(ttl=300)
-def cached_load_direct_reservations():
-    return load_direct_reservations_from_supabase()
+TABLE_COLUMNS = (
+    "Source", "Booking ID", "Booking Date", "Guest Name", "Mobile No",
+    "Check-in Date", "Check-out Date", "Room No",
+    "Advance MOP", "Balance MOP", "Total Tariff", "Advance Amount",
+    "Balance Due", "Booking Status", "Remarks",
+)
 
 def show_booking_date_report():
     st.title("Property-wise Booking Made Date Report")
     st.markdown("**This report shows all bookings based on when they were created/booked, not check-in dates.**")
 
     if st.button("Refresh Bookings"):
-        st.cache_data.clear()
+        load_booking_index.clear()
         st.success("Cache cleared! Refreshing bookings...")
         st.rerun()
 
@@ -256,73 +32,45 @@ def show_booking_date_report():
     year = st.selectbox("Select Year", list(range(current_year - 5, current_year + 6)), index=5)
     month = st.selectbox("Select Month", list(range(1, 13)), index=date.today().month - 1)
 
-    # Load ALL bookings
-    online_bookings = cached_load_online_reservations()
-    direct_bookings = cached_load_direct_reservations()
-
-    st.info(f"Total records loaded: Online={len(online_bookings)}, Direct={len(direct_bookings)}")
-
-    # Normalize property names
-    for b in online_bookings:
-        if "property" in b:
-            b["property"] = property_mapping.get(b["property"], b["property"])
-    for b in direct_bookings:
-        if "property_name" in b:
-            b["property_name"] = property_mapping.get(b["property_name"], b["property_name"])
+    # Bookings made each day of the month, from the shared index
+    try:
+        index = load_booking_index(user_scope())
+    except Exception as e:
+        st.error(f"Error loading reservations: {e}")
+        return
+    st.info(f"Total records loaded: Online={index.online_count}, Direct={index.direct_count}")
 
-    if not online_bookings and not direct_bookings:
+    if not len(index):
         st.info("No reservations available.")
         return
 
-    # Remove permanently closed properties from July 2026 onward (history is preserved for June 2026 and earlier)
-    if date(year, month, 1) >= CLOSURE_CUTOFF:
-        online_bookings = [b for b in online_bookings if b.get("property") not in CLOSED_PROPERTIES]
-        direct_bookings = [b for b in direct_bookings if b.get("property_name") not in CLOSED_PROPERTIES]
-
-    # Get all properties
-    online_df = pd.DataFrame(online_bookings)
-    direct_df = pd.DataFrame(direct_bookings)
-    online_props = sorted(online_df["property"].dropna().unique().tolist()) if "property" in online_df.columns else []
-    direct_props = sorted(direct_df["property_name"].dropna().unique().tolist()) if "property_name" in direct_df.columns else []
-    all_properties = sorted(list(set(online_props + direct_props)))
+    # Group by property; closed properties are removed from July 2026 onward (history is preserved for June 2026 and earlier)
+    by_property = defaultdict(dict)
+    for day, bookings in index.month("booking_date", year, month).items():
+        for b in select_bookings(bookings, year, month):
+            by_property[booking_property(b)].setdefault(day, []).append(b)
+    hide_closed = date(year, month, 1) >= CLOSURE_CUTOFF
+    all_properties = sorted(p for p in index.properties if not (hide_closed and p in CLOSED_PROPERTIES))
 
     if not all_properties:
         st.info("No properties found in reservations.")
         return
 
     st.subheader(f"Bookings Made in {calendar.month_name[month]} {year}")
-    st.markdown(TABLE_CSS, unsafe_allow_html=True)
-
-    # Generate summary statistics
-    month_dates = generate_month_dates(year, month)
-    total_bookings_month = 0
-
-    for prop in all_properties:
-        with st.expander(f"📍 {prop}", expanded=False):
-            # Filter bookings by property
-            prop_online = [b for b in online_bookings if b.get("property") == prop]
-            prop_direct = [b for b in direct_bookings if b.get("property_name") == prop]
-            prop_all = prop_online + prop_direct
-
-            property_total = 0
 
-            for day in month_dates:
-                daily_bookings = filter_bookings_by_booking_date(prop_all, day)
-                
-                if daily_bookings:
-                    property_total += len(daily_bookings)
-                    total_bookings_month += len(daily_bookings)
-                    
-                    st.subheader(f"📅 {day.strftime('%B %d, %Y')} - {len(daily_bookings)} booking(s)")
-                    
-                    df = create_bookings_table(daily_bookings)
-                    table_html = df.to_html(escape=False, index=False)
-                    st.markdown(f'<div class="custom-scrollable-table">{table_html}</div>', unsafe_allow_html=True)
-            
-            if property_total == 0:
-                st.info(f"No bookings made for {prop} in {calendar.month_name[month]} {year}")
-            else:
-                st.success(f"**Total bookings for {prop} this month: {property_total}**")
+    # One row per property; only the selected property's bookings are rendered, a page at a time
+    counts = {prop: sum(len(b) for b in by_property.get(prop, {}).values()) for prop in all_properties}
+    total_bookings_month = sum(counts.values())
+    st.dataframe(pd.DataFrame({"Property": all_properties, "Bookings": [counts[p] for p in all_properties]}),
+                 use_container_width=True, hide_index=True)
+
+    prop = st.selectbox("📍 Property", all_properties, format_func=lambda p: f"{p} - {counts[p]} booking(s)")
+    if counts[prop] == 0:
+        st.info(f"No bookings made for {prop} in {calendar.month_name[month]} {year}")
+    else:
+        prop_bookings = [b for day, bookings in sorted(by_property[prop].items()) for b in bookings]
+        render_bookings_page(prop_bookings, TABLE_COLUMNS, key=f"booking_date_{year}{month:02d}_{prop}")
+        st.success(f"**Total bookings for {prop} this month: {counts[prop]}**")
 
     # Overall summary
     st.markdown("---")
@@ -0,0 +1,208 @@
+# booking_frame.py - Vectorized booking normalization shared by the reports
+#
+# Every report used to run its own per-row normalize_booking (date.fromisoformat,
+# title-casing, safe_float on each money field, status filtering). This module
+# does the same work as column operations over a whole result set and returns a
+# typed DataFrame; frame_to_records turns it into BookingRecords for the
+# room-assignment code.
+
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from booking_records import BookingRecord
+
+VALID_STATUSES = ["Confirmed", "Completed"]
+VALID_PAYMENTS = ["Fully Paid", "Partially Paid"]
+
+# Output columns, in BookingRecord field order ("property" is BookingRecord.property_name)
+BOOKING_COLUMNS = [
+    "type", "property", "booking_id", "check_in", "check_out", "days", "room_no",
+    "guest_name", "mobile_no", "total_pax", "mob", "plan",
+    "room_charges", "gst", "tax", "total_amount", "commission", "receivable",
+    "advance", "advance_mop", "balance", "balance_mop",
+    "booking_status", "payment_status", "submitted_by", "modified_by", "remarks",
+    "advance_remarks", "balance_remarks", "accounts_status", "ota_booking_id", "db_id",
+]
+
+# Carried on the frame but not on BookingRecord
+FRAME_ONLY_COLUMNS = ["booked_on"]
+
+# Source column for each output field: (online, direct)
+SOURCE_COLUMNS = {
+    "property": ("property", "property_name"),
+    "status": ("booking_status", "plan_status"),
+    "days": ("room_nights", "no_of_days"),
+    "mobile_no": ("guest_phone", "mobile_no"),
+    "mob": ("mode_of_booking", "mob"),
+    "plan": ("rate_plans", "breakfast"),
+    "total_amount": ("booking_amount", "total_tariff"),
+    "advance": ("total_payment_made", "advance_amount"),
+    "balance": ("balance_due", "balance_amount"),
+    "booked_on": ("booking_made_on", "booking_date"),
+}
+
+# -------------------------- Column helpers --------------------------
+def _col(df: pd.DataFrame, name: str) -> pd.Series:
+    """Column as-is; all-None when the source has no such column."""
+    if name in df.columns:
+        return df[name]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+def _text(s: pd.Series) -> pd.Series:
+    """Vector form of sanitize_string: str(v).strip(), "" for None/NaN."""
+    s = s.astype(object)
+    return s.where(s.notna(), "").astype(str).str.strip()
+
+def _number(s: pd.Series) -> pd.Series:
+    """Vector form of safe_float: float(v), 0.0 for None/blank/unparseable."""
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype("float64").fillna(0.0)
+    s = s.astype(object)
+    return pd.to_numeric(s.where(s.notna(), None).astype(str).str.strip(), errors="coerce").fillna(0.0)
+
+def _integer(s: pd.Series) -> pd.Series:
+    """Vector form of safe_int: int(float(v)), 0 for None/blank/unparseable."""
+    f = _number(s)
+    return np.trunc(f.where(np.isfinite(f), 0.0)).astype("int64")
+
+def _dates(s: pd.Series) -> pd.Series:
+    """Parse YYYY-MM-DD strings (or pass through datetime64) to midnight timestamps."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s.dt.normalize()
+    s = s.astype(object)
+    return pd.to_datetime(s.where(s.notna(), None), format="%Y-%m-%d", errors="coerce")
+
+# -------------------------- Normalizer --------------------------
+def normalize_bookings_frame(
+    rows: Union[List[Dict], pd.DataFrame],
+    is_online: bool,
+    mapping: Optional[Dict[str, str]] = None,
+    confirmed_only: bool = True,
+    paid_only: bool = True,
+    positive_stays_only: bool = True,
+) -> pd.DataFrame:
+    """Normalize one table's rows (list of dicts or DataFrame) into the typed booking frame."""
+    raw = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows, dtype=object)
+    if raw.empty:
+        return empty_bookings_frame()
+    mapping = mapping or {}
+    side = 0 if is_online else 1
+    src = {k: v[side] for k, v in SOURCE_COLUMNS.items()}
+
+    status = _text(_col(raw, src["status"])).str.title()
+    pay = _text(_col(raw, "payment_status")).str.title()
+    ci = _dates(_col(raw, "check_in"))
+    co = _dates(_col(raw, "check_out"))
+    prop_raw = _col(raw, src["property"])
+
+    keep = ci.notna() & co.notna() & prop_raw.notna()
+    if confirmed_only:
+        keep &= status.isin(VALID_STATUSES)
+    if paid_only:
+        keep &= pay.isin(VALID_PAYMENTS)
+    if positive_stays_only:
+        keep &= co > ci
+    raw, status, pay, ci, co, prop_raw = raw[keep], status[keep], pay[keep], ci[keep], co[keep], prop_raw[keep]
+    if raw.empty:
+        return empty_bookings_frame()
+
+    out = pd.DataFrame(index=raw.index)
+    out["type"] = "online" if is_online else "direct"
+    prop = prop_raw.astype(str).str.strip()
+    out["property"] = prop.map(mapping).fillna(prop)
+
+    bid = _col(raw, "booking_id")
+    bid_missing = bid.isna() | (bid.astype(object) == "") | (bid.astype(object) == 0)
+    out["booking_id"] = _text(bid.where(~bid_missing, _col(raw, "id")))
+    out["check_in"] = ci
+    out["check_out"] = co
+    nights = (co - ci).dt.days
+    days = _integer(_col(raw, src["days"]))
+    days = days.where(days != 0, nights)
+    out["days"] = days.where(days > 0, 1).astype("int64")
+    out["room_no"] = _text(_col(raw, "room_no")).str.title()
+    out["guest_name"] = _text(_col(raw, "guest_name"))
+    out["mobile_no"] = _text(_col(raw, src["mobile_no"]))
+    out["total_pax"] = _integer(_col(raw, "total_pax"))
+    out["mob"] = _text(_col(raw, src["mob"]))
+    out["plan"] = _text(_col(raw, src["plan"]))
+
+    total = _number(_col(raw, src["total_amount"]))
+    if is_online:
+        gst = _number(_col(raw, "gst"))
+        tax = _number(_col(raw, "ota_tax"))
+        commission = _number(_col(raw, "ota_commission"))
+        room_charges = total - gst - tax
+    else:
+        gst = tax = commission = pd.Series(0.0, index=raw.index)
+        room_charges = total
+    out["room_charges"] = room_charges
+    out["gst"] = gst
+    out["tax"] = tax
+    out["total_amount"] = total
+    out["commission"] = commission
+    out["receivable"] = (total - gst - tax - commission).clip(lower=0.0)
+
+    out["advance"] = _number(_col(raw, src["advance"]))
+    out["advance_mop"] = _text(_col(raw, "advance_mop"))
+    out["balance"] = _number(_col(raw, src["balance"]))
+    out["balance_mop"] = _text(_col(raw, "balance_mop"))
+    out["booking_status"] = status
+    out["payment_status"] = pay
+    out["submitted_by"] = _text(_col(raw, "submitted_by"))
+    out["modified_by"] = _text(_col(raw, "modified_by"))
+    out["remarks"] = _text(_col(raw, "remarks"))
+    out["advance_remarks"] = _text(_col(raw, "advance_remarks"))
+    out["balance_remarks"] = _text(_col(raw, "balance_remarks"))
+    if "accounts_status" in raw.columns:
+        out["accounts_status"] = _text(_col(raw, "accounts_status")).str.title()
+    else:
+        out["accounts_status"] = "Pending"
+    out["ota_booking_id"] = _text(_col(raw, "ota_booking_id")) if is_online else ""
+    identifier = _col(raw, "id" if is_online else "booking_id").astype(object)
+    out["db_id"] = identifier.where(identifier.notna(), "").astype(str)
+    out["booked_on"] = _dates(_text(_col(raw, src["booked_on"])).str[:10])   # may carry a time part
+    return out.reset_index(drop=True)[BOOKING_COLUMNS + FRAME_ONLY_COLUMNS]
+
+def empty_bookings_frame() -> pd.DataFrame:
+    df = pd.DataFrame({c: pd.Series(dtype=object) for c in BOOKING_COLUMNS + FRAME_ONLY_COLUMNS})
+    for col in ("check_in", "check_out", "booked_on"):
+        df[col] = pd.Series(dtype="datetime64[ns]")
+    return df
+
+def combine_bookings_frames(
+    direct_rows: Union[List[Dict], pd.DataFrame],
+    online_rows: Union[List[Dict], pd.DataFrame],
+    **kwargs: Any,
+) -> pd.DataFrame:
+    """Normalize both tables and stack them, direct first (matching the old loaders)."""
+    frames = [
+        normalize_bookings_frame(direct_rows, is_online=False, **kwargs),
+        normalize_bookings_frame(online_rows, is_online=True, **kwargs),
+    ]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return empty_bookings_frame()
+    return pd.concat(frames, ignore_index=True)
+
+def stay_nights(check_in, check_out):
+    """Nights a booking's money is split over: check-in to check-out, at least 1. The one divisor
+    of Daily Status (inventory) and the revenue ledger; takes dates or datetime Series."""
+    if isinstance(check_in, pd.Series):
+        return (check_out - check_in).dt.days.clip(lower=1)
+    return max((check_out - check_in).days, 1)
+
+def frame_to_records(df: pd.DataFrame) -> List[BookingRecord]:
+    """Build BookingRecords from a normalized frame."""
+    if df.empty:
+        return []
+    ci = df["check_in"].dt.date
+    co = df["check_out"].dt.date
+    cols = [c for c in BOOKING_COLUMNS if c not in ("property", "check_in", "check_out")]
+    records = []
+    for prop, cin, cout, values in zip(df["property"], ci, co, df[cols].itertuples(index=False, name=None)):
+        fields = dict(zip(cols, values))
+        records.append(BookingRecord(property_name=prop, check_in=cin, check_out=cout, **fields))
+    return records
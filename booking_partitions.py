@@ -0,0 +1,128 @@
+# booking_partitions.py - Month-partitioned booking cache shared by the reports
+#
+# Reports used to cache bookings per exact (start, end) window, so a month view,
+# the dashboard's 4-day window and a custom range each fetched overlapping rows,
+# and a booking spanning month-end was fetched once per month. Bookings are now
+# cached per (property, stay-month) partition; any date range is assembled from
+# the partitions covering it and de-duplicated by booking key.
+#
+# Partitions hold every booking of the property whose stay overlaps the month,
+# whatever its status or payment; callers choose those filters on assembly.
+
+import os
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import streamlit as st
+from supabase import create_client, Client
+
+from booking_records import BookingRecord
+from booking_frame import combine_bookings_frames, frame_to_records, VALID_STATUSES, VALID_PAYMENTS
+from booking_cache import (
+    tagged_cache, range_tags, month_bounds, months_between, canonical_property, PROPERTY_ALIASES,
+)
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# -------------------------- Supabase --------------------------
+try:
+    supabase: Client = create_client(st.secrets["supabase"]["url"], st.secrets["supabase"]["key"])
+except (KeyError, FileNotFoundError):
+    try:
+        supabase: Client = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+    except KeyError as e:
+        st.error(f"Missing Supabase configuration: {e}")
+        st.stop()
+
+PAGE_SIZE = 1000
+
+reverse_aliases: Dict[str, List[str]] = {}
+for alias, name in PROPERTY_ALIASES.items():
+    reverse_aliases.setdefault(name, []).append(alias)
+
+# -------------------------- Partitions --------------------------
+def _fetch_overlapping(table: str, prop_column: str, names: List[str], start: date, end: date) -> List[Dict]:
+    rows: List[Dict] = []
+    offset = 0
+    while True:
+        page = (supabase.table(table).select("*")
+                .in_(prop_column, names)
+                .lte("check_in", str(end))
+                .gte("check_out", str(start))
+                .range(offset, offset + PAGE_SIZE - 1)
+                .execute().data or [])
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+@tagged_cache(ttl=600, tags=lambda property, year, month: range_tags(property, *month_bounds(year, month)), stale_ttl=300)
+def load_month_partition(property: str, year: int, month: int) -> List[BookingRecord]:
+    """Every booking of `property` whose stay overlaps the month, unfiltered.
+
+    Query errors propagate, so a failed load is never cached as an empty month.
+    """
+    prop = canonical_property(property)
+    names = [prop] + reverse_aliases.get(prop, [])
+    start, end = month_bounds(year, month)
+    try:
+        direct_rows = _fetch_overlapping("reservations", "property_name", names, start, end)
+        online_rows = _fetch_overlapping("online_reservations", "property", names, start, end)
+    except Exception as e:
+        logging.error(f"Partition {prop} {year}-{month:02d} query error: {e}")
+        raise
+    frame = combine_bookings_frames(
+        direct_rows, online_rows, mapping=PROPERTY_ALIASES,
+        confirmed_only=False, paid_only=False, positive_stays_only=False,
+    )
+    return frame_to_records(frame)
+
+def _month_list(start: date, end: date) -> List[Tuple[int, int]]:
+    return [(int(m[:4]), int(m[5:])) for m in months_between(start, end)]
+
+# -------------------------- Range assembly --------------------------
+def load_bookings_range(
+    property: str,
+    start: date,
+    end: date,
+    confirmed_only: bool = True,
+    paid_only: bool = True,
+    positive_stays_only: bool = True,
+) -> List[BookingRecord]:
+    """Bookings of `property` overlapping start..end (inclusive), built from month partitions.
+
+    Overlap matches the old per-range queries: check_in <= end and check_out >= start.
+    Direct bookings come first, as they did when each report queried both tables itself.
+    """
+    seen = set()
+    direct: List[BookingRecord] = []
+    online: List[BookingRecord] = []
+    for year, month in _month_list(start, end):
+        for b in load_month_partition(property, year, month):
+            if b.check_in > end or b.check_out < start:
+                continue
+            key = (b.type, b.db_id or b.booking_id)
+            if key in seen:
+                continue
+            seen.add(key)
+            if confirmed_only and b.booking_status not in VALID_STATUSES:
+                continue
+            if paid_only and b.payment_status not in VALID_PAYMENTS:
+                continue
+            if positive_stays_only and b.check_out <= b.check_in:
+                continue
+            (online if b.type == "online" else direct).append(b)
+    return direct + online
+
+def load_bookings_range_all(properties: Iterable[str], start: date, end: date, **filters) -> List[BookingRecord]:
+    """load_bookings_range across several properties, concatenated."""
+    bookings: List[BookingRecord] = []
+    for prop in properties:
+        bookings.extend(load_bookings_range(prop, start, end, **filters))
+    return bookings
+
+def invalidate_partitions(property: Optional[str] = None, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """Drop cached partitions for a property and/or date range (everything if neither is given)."""
+    months = months_between(start, end) if start and end else None
+    return load_month_partition.invalidate(property=property, month=months)
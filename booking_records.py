@@ -0,0 +1,66 @@
+# booking_records.py - Compact, immutable booking records shared by the reports
+#
+# normalize_booking used to build a ~35-key dict per booking and the per-day
+# helpers copied it again for every day and every room. BookingRecord is a
+# slotted, frozen dataclass with parsed dates and float money fields;
+# RoomAssignment is a thin per-room view that references the booking instead of
+# copying it. Fields are read as attributes, so a misspelt name fails loudly.
+
+from dataclasses import dataclass
+from datetime import date
+from typing import List
+
+# -------------------------- Records --------------------------
+@dataclass(frozen=True, slots=True)
+class BookingRecord:
+    """One normalized booking (direct or online)."""
+    type: str
+    property_name: str
+    booking_id: str
+    check_in: date
+    check_out: date
+    days: int
+    room_no: str
+    guest_name: str = ""
+    mobile_no: str = ""
+    total_pax: int = 0
+    mob: str = ""
+    plan: str = ""
+    room_charges: float = 0.0
+    gst: float = 0.0
+    tax: float = 0.0
+    total_amount: float = 0.0
+    commission: float = 0.0
+    receivable: float = 0.0
+    advance: float = 0.0
+    advance_mop: str = ""
+    balance: float = 0.0
+    balance_mop: str = ""
+    booking_status: str = ""
+    payment_status: str = ""
+    submitted_by: str = ""
+    modified_by: str = ""
+    remarks: str = ""
+    advance_remarks: str = ""
+    balance_remarks: str = ""
+    accounts_status: str = "Pending"
+    ota_booking_id: str = ""
+    db_id: str = ""
+
+    def active_on(self, day: date) -> bool:
+        return self.check_in <= day < self.check_out
+
+
+@dataclass(frozen=True, slots=True)
+class RoomAssignment:
+    """A booking placed in one inventory room for one day; booking fields are read from `booking`."""
+    booking: BookingRecord
+    assigned_room: str
+    total_pax: int
+    per_night: float
+    is_primary: bool
+
+
+def filter_bookings_for_day(bookings: List[BookingRecord], day: date) -> List[BookingRecord]:
+    """Bookings staying the night of `day` (references, not copies)."""
+    return [b for b in bookings if b.check_in <= day < b.check_out]
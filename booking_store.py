@@ -0,0 +1,195 @@
+# booking_store.py - On-disk booking snapshot with watermark-based delta sync
+#
+# A redeploy or worker restart used to start with empty caches, so the first
+# users paid for full-table downloads. The raw reservations/online_reservations
+# frames are persisted to a local SQLite file together with a sync watermark
+# (the newest updated_at seen). On boot the snapshot is read from disk and only
+# rows changed since the watermark are fetched; deletions are picked up from a
+# key-only listing.
+#
+# The delta relies on updated_at being bumped by every insert and update, which
+# the app's save paths do not do themselves: postgres_ddl() prints the column
+# and the trigger that maintains it, to run once in the Supabase SQL editor.
+# Without the column there is no watermark, and a sync falls back to a full
+# reload; those happen at most every FULL_SYNC_INTERVAL (or right after this
+# process writes, via expire_snapshot), and the disk copy is only rewritten
+# when the reloaded table differs.
+
+import os
+import sqlite3
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from bulk_read import load_table_frame, coerce_frame
+from booking_cache import invalidate_booking
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+STORE_PATH = os.environ.get("BOOKING_STORE_PATH", ".booking_store.sqlite")
+WATERMARK_COLUMN = "updated_at"
+SYNC_INTERVAL = 60        # seconds between delta syncs for the in-memory copy
+FULL_SYNC_INTERVAL = 600  # seconds between full reloads for a table without a watermark
+
+# Primary key and property column for each synced table
+SYNC_TABLES: Dict[str, Tuple[str, str]] = {
+    "reservations": ("booking_id", "property_name"),
+    "online_reservations": ("id", "property"),
+}
+
+_snapshots: Dict[str, Tuple[pd.DataFrame, Optional[str], float]] = {}
+_versions: Dict[str, int] = {}     # bumped by every sync that changes a table's frame
+_lock = threading.Lock()
+
+# -------------------------- Postgres --------------------------
+def postgres_ddl() -> str:
+    """The updated_at column, index and trigger for each synced table, to run once in Supabase."""
+    statements = [
+        f"CREATE OR REPLACE FUNCTION touch_{WATERMARK_COLUMN}() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+        f"BEGIN\n  NEW.{WATERMARK_COLUMN} := now();\n  RETURN NEW;\nEND\n$$;"
+    ]
+    for table in SYNC_TABLES:
+        statements += [
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {WATERMARK_COLUMN} timestamptz NOT NULL DEFAULT now();",
+            f"CREATE INDEX IF NOT EXISTS {table}_{WATERMARK_COLUMN}_idx ON {table} ({WATERMARK_COLUMN});",
+            f"DROP TRIGGER IF EXISTS {table}_touch_{WATERMARK_COLUMN} ON {table};",
+            f"CREATE TRIGGER {table}_touch_{WATERMARK_COLUMN} BEFORE INSERT OR UPDATE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION touch_{WATERMARK_COLUMN}();",
+        ]
+    return "\n\n".join(statements) + "\n"
+
+# -------------------------- SQLite persistence --------------------------
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS sync_meta (tbl TEXT PRIMARY KEY, watermark TEXT, synced_at REAL)")
+    return conn
+
+def read_snapshot(table: str) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    """Return the persisted (frame, watermark) for a table, or (None, None)."""
+    if not os.path.exists(STORE_PATH):
+        return None, None
+    try:
+        with _connect() as conn:
+            row = conn.execute("SELECT watermark FROM sync_meta WHERE tbl = ?", (table,)).fetchone()
+            if row is None:
+                return None, None
+            df = pd.read_sql_query(f'SELECT * FROM "snapshot_{table}"', conn, dtype=str)
+        return coerce_frame(df, table), row[0]
+    except Exception as e:
+        logging.warning(f"booking_store: could not read snapshot for {table}: {e}")
+        return None, None
+
+def write_snapshot(table: str, df: pd.DataFrame, watermark: Optional[str]) -> None:
+    """Persist a table frame and its watermark, replacing the previous snapshot."""
+    try:
+        with _connect() as conn:
+            out = df.copy()
+            for col in out.select_dtypes(include="category").columns:
+                out[col] = out[col].astype(object)
+            out.to_sql(f"snapshot_{table}", conn, if_exists="replace", index=False)
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_meta (tbl, watermark, synced_at) VALUES (?, ?, ?)",
+                (table, watermark, time.time()),
+            )
+    except Exception as e:
+        logging.warning(f"booking_store: could not write snapshot for {table}: {e}")
+
+# -------------------------- Sync --------------------------
+def _watermark(df: pd.DataFrame) -> Optional[str]:
+    if WATERMARK_COLUMN not in df.columns or df.empty:
+        return None
+    stamps = pd.to_datetime(df[WATERMARK_COLUMN], format="ISO8601", utc=True, errors="coerce")
+    latest = stamps.max()
+    return None if pd.isna(latest) else latest.isoformat()
+
+def _full_load(table: str) -> Tuple[pd.DataFrame, Optional[str]]:
+    df = load_table_frame(table)
+    return df, _watermark(df)
+
+def _apply_delta(table: str, cached: pd.DataFrame, watermark: str) -> Tuple[pd.DataFrame, Optional[str], int]:
+    """Merge rows changed since the watermark and drop rows deleted upstream."""
+    key, prop_col = SYNC_TABLES[table]
+    delta = load_table_frame(table, filters=[(WATERMARK_COLUMN, "gt", watermark)])
+    live_keys = load_table_frame(table, columns=key)
+    merged = cached
+    if not live_keys.empty:
+        merged = merged[merged[key].astype(str).isin(set(live_keys[key].astype(str)))]
+    removed = len(cached) - len(merged)
+    if not delta.empty:
+        changed = set(delta[key].astype(str))
+        stale = merged[merged[key].astype(str).isin(changed)]
+        for _, row in pd.concat([stale, delta]).iterrows():
+            invalidate_booking(table, str(row.get(prop_col, "")), row.get("check_in"), row.get("check_out"))
+        merged = pd.concat([merged[~merged[key].astype(str).isin(changed)], delta], ignore_index=True)
+        merged = coerce_frame(merged.astype(object), table)
+    if removed:
+        invalidate_booking(table, None)
+    return merged.reset_index(drop=True), _watermark(delta) or watermark, len(delta) + removed
+
+def sync_table(table: str) -> pd.DataFrame:
+    """Bring a table snapshot up to date (disk → delta → disk) and return it."""
+    started = time.monotonic()
+    with _lock:
+        cached = _snapshots.get(table)
+        if cached is not None:
+            df, watermark, _ = cached
+        else:
+            df, watermark = read_snapshot(table)
+
+        if df is None or watermark is None:
+            previous = df
+            df, watermark = _full_load(table)
+            changes = len(df)
+            mode = "full"
+            if watermark is None:
+                logging.warning(f"booking_store: {table} has no {WATERMARK_COLUMN} values, "
+                                "so every sync is a full reload; run booking_store.postgres_ddl() in Supabase")
+                if previous is not None and previous.equals(df):
+                    changes = 0
+                elif previous is not None:
+                    changes = max(changes, 1)   # an emptied table is a change too
+                    invalidate_booking(table, None)
+        else:
+            try:
+                df, watermark, changes = _apply_delta(table, df, watermark)
+                mode = "delta"
+            except Exception as e:
+                logging.warning(f"booking_store: delta sync failed for {table}, reloading: {e}")
+                df, watermark = _full_load(table)
+                changes = len(df)
+                mode = "full"
+
+        if changes or cached is None:
+            write_snapshot(table, df, watermark)
+            _versions[table] = _versions.get(table, 0) + 1
+        _snapshots[table] = (df, watermark, time.monotonic())
+    logging.info(f"booking_store: {mode} sync {table} -> {len(df)} rows ({changes} changed) in {time.monotonic() - started:.2f}s")
+    return df
+
+def load_snapshot(table: str, max_age: float = SYNC_INTERVAL) -> pd.DataFrame:
+    """Typed frame for a whole table, delta-synced at most every `max_age` seconds."""
+    cached = _snapshots.get(table)
+    if cached is not None and cached[1] is None:
+        max_age = max(max_age, FULL_SYNC_INTERVAL)
+    if cached is not None and time.monotonic() - cached[2] < max_age:
+        return cached[0].copy()
+    return sync_table(table).copy()
+
+def expire_snapshot(table: str) -> None:
+    """Force the next load_snapshot to run a delta sync (call after writing to the table)."""
+    with _lock:
+        cached = _snapshots.get(table)
+        if cached is not None:
+            _snapshots[table] = (cached[0], cached[1], float("-inf"))
+
+def snapshot_version(table: str) -> int:
+    """Counter bumped whenever a sync changes the table's snapshot (0 until the first sync)."""
+    return _versions.get(table, 0)
+
+def snapshot_watermark(table: str) -> Optional[str]:
+    """Watermark of the in-memory snapshot (None until the table has been synced)."""
+    cached = _snapshots.get(table)
+    return cached[1] if cached is not None else None
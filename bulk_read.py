@@ -0,0 +1,141 @@
+# bulk_read.py - CSV bulk reads from PostgREST straight into typed DataFrames
+#
+# The supabase-py client returns every row as a JSON dict, which the loaders then
+# coerce field by field (safe_int / safe_float / strptime). For full-table loads
+# it is much cheaper to ask PostgREST for its text/csv representation and let the
+# pandas C parser produce typed columns in one pass.
+
+import io
+import os
+import logging
+from typing import Dict, List, Optional, Tuple, Any
+
+import pandas as pd
+import requests
+import streamlit as st
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+PAGE_SIZE = 1000          # Supabase caps a single response at 1000 rows by default
+REQUEST_TIMEOUT = 60
+
+# -------------------------- Column Schemas --------------------------
+# Columns not listed here are kept as plain strings ("" for NULL).
+TABLE_SCHEMAS: Dict[str, Dict[str, List[str]]] = {
+    "reservations": {
+        "dates": ["check_in", "check_out", "enquiry_date", "booking_date"],
+        "floats": ["tariff", "total_tariff", "advance_amount", "balance_amount"],
+        "ints": ["no_of_adults", "no_of_children", "no_of_infants", "total_pax", "no_of_days"],
+        "categories": ["property_name", "room_type", "mob", "online_source", "advance_mop",
+                       "balance_mop", "breakfast", "plan_status", "payment_status",
+                       "submitted_by", "modified_by", "accounts_status"],
+    },
+    "online_reservations": {
+        "dates": ["check_in", "check_out", "booking_made_on", "booking_confirmed_on"],
+        "floats": ["booking_amount", "total_payment_made", "balance_due", "gst", "ota_tax",
+                   "ota_commission", "ota_gross_amount", "ota_net_amount", "room_revenue",
+                   "total_amount_with_services"],
+        "ints": ["no_of_adults", "no_of_children", "no_of_infant", "total_pax", "room_nights"],
+        "categories": ["property", "room_type", "rate_plans", "booking_source", "segment",
+                       "staflexi_status", "mode_of_booking", "advance_mop", "balance_mop",
+                       "booking_status", "payment_status", "submitted_by", "modified_by",
+                       "accounts_status"],
+    },
+}
+
+# -------------------------- Helpers --------------------------
+def _supabase_credentials() -> Tuple[str, str]:
+    """Return (url, key) from Streamlit secrets, falling back to the environment."""
+    try:
+        return st.secrets["supabase"]["url"], st.secrets["supabase"]["key"]
+    except (KeyError, FileNotFoundError):
+        return os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"]
+
+def _build_params(columns: str, filters: Optional[List[Tuple[str, str, Any]]], order: Optional[str]) -> List[Tuple[str, str]]:
+    """Translate (column, operator, value) filters into PostgREST query params."""
+    params = [("select", columns)]
+    for column, op, value in filters or []:
+        if op == "in":
+            value = "(" + ",".join(f'"{v}"' for v in value) + ")"
+        params.append((column, f"{op}.{value}"))
+    if order:
+        params.append(("order", order))
+    return params
+
+def coerce_frame(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """Apply the table schema: dates, floats, ints, categoricals and "" for NULL text."""
+    schema = TABLE_SCHEMAS.get(table, {})
+    for col in schema.get("dates", []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format="ISO8601", errors="coerce")
+    for col in schema.get("floats", []):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0).astype("float64")
+    for col in schema.get("ints", []):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype("int64")
+    typed = set(schema.get("dates", [])) | set(schema.get("floats", [])) | set(schema.get("ints", []))
+    for col in df.columns:
+        if col not in typed and df[col].dtype == object:
+            df[col] = df[col].fillna("")
+    for col in schema.get("categories", []):
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+# -------------------------- Bulk Read --------------------------
+def load_table_frame(
+    table: str,
+    columns: str = "*",
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+    order: Optional[str] = None,
+    page_size: int = PAGE_SIZE,
+) -> pd.DataFrame:
+    """Page through a table as text/csv and return one typed DataFrame."""
+    url, key = _supabase_credentials()
+    endpoint = f"{url.rstrip('/')}/rest/v1/{table}"
+    headers = {
+        "apikey": key,
+        "Authorization": f"Bearer {key}",
+        "Accept": "text/csv",
+        "Range-Unit": "items",
+    }
+    params = _build_params(columns, filters, order)
+
+    pages = []
+    offset = 0
+    with requests.Session() as session:
+        while True:
+            headers["Range"] = f"{offset}-{offset + page_size - 1}"
+            response = session.get(endpoint, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            text = response.text
+            if not text.strip():
+                break
+            page = pd.read_csv(
+                io.StringIO(text),
+                dtype=str,            # keep room/mobile numbers as text; coerce_frame types the rest
+                keep_default_na=False,
+                na_values=[""],
+                engine="c",
+            )
+            if page.empty:
+                break
+            pages.append(page)
+            if len(page) < page_size:
+                break
+            offset += page_size
+
+    if not pages:
+        return pd.DataFrame()
+    df = pd.concat(pages, ignore_index=True) if len(pages) > 1 else pages[0]
+    logging.info(f"bulk_read: {table} -> {len(df)} rows via text/csv")
+    return coerce_frame(df, table)
+
+def dates_to_objects(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """Turn datetime64 columns into python date objects (None for NaT) for dict consumers."""
+    for col in columns:
+        if col in df.columns:
+            values = df[col].dt.date.astype(object)
+            df[col] = values.where(df[col].notna(), None)
+    return df
@@ -0,0 +1,165 @@
+# cache_warmup.py - Background warm-up of the most-used report slices
+#
+# Daily Status, NRD, Summary and Target Achievement are mostly opened for the
+# current month, and the Inventory Dashboard for today ± 2. Those slices are
+# loaded here into booking_cache in a background thread, at process start and
+# after each sync, so the first user of the morning is served from cache.
+# Each report's own loader is called with the same arguments the page uses,
+# so the cache keys line up exactly. NRD, Summary and Target read their night
+# aggregate stores, which are filled here from the revenue ledger after the
+# night audit has closed any nights that ended since the last pass.
+
+import calendar
+import logging
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_status: Dict = {"ready": False, "running": False, "started_at": None, "finished_at": None, "timings": {}, "errors": 0}
+
+# -------------------------- Status --------------------------
+def is_ready() -> bool:
+    """True once a warm-up pass has finished."""
+    return _status["ready"]
+
+def warmup_status() -> Dict:
+    with _lock:
+        return {**_status, "timings": dict(_status["timings"])}
+
+# -------------------------- Warm-up --------------------------
+def _months_to_warm(today: date) -> List[Tuple[int, int]]:
+    nxt = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return [(today.year, today.month), (nxt.year, nxt.month)]
+
+def _warm_tasks(today: date) -> List[Tuple[str, Callable[[], object]]]:
+    """(label, callable) pairs, one per cached slice."""
+    # Imported here: these modules import streamlit pages and create clients at import time
+    import inventory
+    import nrd_report
+    import revenue_ledger
+    import night_audit
+    import summary_report
+    import dashboard
+    import availability
+    try:
+        import target_achievement_report
+    except Exception:
+        target_achievement_report = None
+
+    tasks = [("revenue ledger", revenue_ledger.load_ledger), ("night audit", night_audit.close_nights)]
+    for year, month in _months_to_warm(today):
+        start = date(year, month, 1)
+        end = date(year, month, calendar.monthrange(year, month)[1])
+        tag = f"{year}-{month:02d}"
+        for prop in inventory.filter_active_properties(inventory.load_properties(), year, month):
+            tasks.append((f"daily_status {prop} {tag}", lambda p=prop, s=start, e=end: inventory.load_combined_bookings(p, s, e)))
+        tasks.append((f"nrd {tag}", lambda s=start, e=end: nrd_report.nrd_store.get(nrd_report.PROPERTY_SHORT_NAMES, s, e)))
+        tasks.append((f"summary {tag}", lambda y=year, m=month, s=start, e=end: summary_report.summary_store.get(summary_report.load_properties(y, m), s, e)))
+        if target_achievement_report is not None:
+            tasks.append((f"target {tag}", lambda y=year, m=month, s=start, e=end: target_achievement_report.target_store.get(target_achievement_report.load_properties(y, m), s, e)))
+    tasks.append(("availability index", availability.get_index))
+    tasks.append(("dashboard today±2", lambda: dashboard.load_bookings_for_date_range(today - timedelta(days=1), today + timedelta(days=2))))
+    return tasks
+
+def _run_warmup() -> None:
+    started = time.monotonic()
+    today = date.today()
+    timings: Dict[str, float] = {}
+    errors = 0
+    try:
+        tasks = _warm_tasks(today)
+    except Exception as e:
+        logging.error(f"cache_warmup: could not build task list: {e}")
+        tasks = []
+        errors += 1
+    for label, task in tasks:
+        t0 = time.monotonic()
+        try:
+            task()
+        except Exception as e:
+            errors += 1
+            logging.warning(f"cache_warmup: {label} failed: {e}")
+        timings[label] = time.monotonic() - t0
+    total = time.monotonic() - started
+    with _lock:
+        _status.update(ready=True, running=False, finished_at=time.time(), timings=timings, errors=errors)
+    slowest = sorted(timings.items(), key=lambda kv: kv[1], reverse=True)[:5]
+    logging.info(
+        f"cache_warmup: {len(tasks)} slices in {total:.2f}s ({errors} failed); slowest: "
+        + ", ".join(f"{label}={secs:.2f}s" for label, secs in slowest)
+    )
+
+def start_warmup() -> bool:
+    """Start a background warm-up pass unless one is already running."""
+    global _thread
+    with _lock:
+        if _status["running"]:
+            return False
+        _status.update(running=True, started_at=time.time())
+        _thread = threading.Thread(target=_run_warmup, name="cache warm-up", daemon=True)
+        _thread.start()
+    return True
+
+# -------------------------- Login prefetch --------------------------
+def _screen_tasks(screen: str, scope, today: date) -> List[Tuple[str, Callable[[], object]]]:
+    """(label, callable) pairs loading what `screen` reads first, for a user's property scope."""
+    start, end = today.replace(day=1), date(today.year, today.month, calendar.monthrange(today.year, today.month)[1])
+    if screen in ("Direct Reservations", "View Reservations", "Edit Direct Reservation", "Analytics"):
+        import directreservation
+        return [("reservations", lambda: directreservation.cached_reservations(scope))]
+    if screen == "Online Reservations":
+        import online_reservation
+        return [("online reservations", lambda: online_reservation.cached_online_reservations(scope))]
+    if screen == "Daily Management Status":
+        import dms
+        return [("dms", lambda: dms.load_dms_bookings(scope))]
+    if screen in ("Date-wise Booking Report", "Date-wise Check-in Report", "Booking Date Report"):
+        import datewise_report
+        return [("date index", lambda: datewise_report.load_booking_index(scope))]
+    if screen == "Accounts Report":
+        import accounts_report
+        return [("accounts totals", lambda: accounts_report.load_property_totals(today.year, today.month, scope)),
+                ("accounts page 1", lambda: accounts_report.load_detail_page(today.year, today.month, None, 0, scope))]
+    if screen == "Pickup Report":
+        import pickup_report
+        return [("pickup", lambda: pickup_report.load_pickup_bookings(scope))]
+    if screen == "Daily Status":
+        import inventory
+        from property_scope import scope_properties
+        props = scope_properties(inventory.filter_active_properties(inventory.load_properties(), today.year, today.month), scope)
+        return [(f"daily_status {prop}", lambda p=prop: inventory.load_combined_bookings(p, start, end)) for prop in props]
+    if screen == "Summary Report":
+        import summary_report
+        from property_scope import scope_properties
+        props = scope_properties(summary_report.load_properties(today.year, today.month), scope)
+        return [("summary", lambda: summary_report.summary_store.get(props, start, end))]
+    if screen == "Target Achievement":
+        import target_achievement_report
+        from property_scope import scope_properties
+        props = scope_properties(target_achievement_report.load_properties(today.year, today.month), scope)
+        return [("target", lambda: target_achievement_report.target_store.get(props, start, end))]
+    # Inventory Dashboard and Night Report Dashboard are covered by the process warm-up
+    return []
+
+def _run_prefetch(screen: str, scope) -> None:
+    started = time.monotonic()
+    try:
+        tasks = _screen_tasks(screen, scope, date.today())
+    except Exception as e:
+        logging.warning(f"cache_warmup: prefetch of {screen} could not start: {e}")
+        return
+    for label, task in tasks:
+        try:
+            task()
+        except Exception as e:
+            logging.warning(f"cache_warmup: prefetch {label} failed: {e}")
+    logging.info(f"cache_warmup: prefetched {screen} ({len(tasks)} slices, scope={scope}) in {time.monotonic() - started:.2f}s")
+
+def prefetch_screen(screen: str, scope=None) -> None:
+    """Load a screen's data into the cache in the background (after login, for the default screen)."""
+    threading.Thread(target=_run_prefetch, args=(screen, scope), name=f"prefetch {screen}", daemon=True).start()
@@ -3,6 +3,9 @@ import pandas as pd
 from datetime import date, timedelta
 from supabase import create_client, Client
 import logging
+from booking_partitions import load_bookings_range_all, invalidate_partitions
+from booking_cache import canonical_property
+from booking_records import filter_bookings_for_day
 
 # === CONFIG ===
 logging.basicConfig(
@@ -68,47 +71,14 @@ def get_total_inventory(property_name):
 def sanitize_string(value, default="Unknown"):
     return str(value).strip() if value is not None else default
 
-def normalize_booking(booking, is_online):
-    booking_id = sanitize_string(booking.get('booking_id'))
-    payment_status = sanitize_string(booking.get('payment_status')).title()
-    if payment_status not in ["Fully Paid", "Partially Paid"]:
-        return None
-    try:
-        check_in = date.fromisoformat(booking.get('check_in')) if booking.get('check_in') else None
-        check_out = date.fromisoformat(booking.get('check_out')) if booking.get('check_out') else None
-        if not check_in or not check_out:
-            return None
-        days = (check_out - check_in).days
-        if days <= 0: days = 1
-        property_name = sanitize_string(booking.get('property', booking.get('property_name', '')))
-        property_name = property_mapping.get(property_name, property_name)
-        room_no = sanitize_string(booking.get('room_no', '')).title()
-        return {
-            "property": property_name,
-            "booking_id": booking_id,
-            "check_in": str(check_in),
-            "check_out": str(check_out),
-            "days": days,
-            "room_no": room_no,
-            "payment_status": payment_status
-        }
-    except Exception as e:
-        logging.warning(f"Error normalizing booking {booking_id}: {e}")
-        return None
-
 def load_bookings_for_date_range(start_date, end_date):
-    all_bookings = []
     try:
-        online_response = supabase.table("online_reservations").select("*") \
-            .gte("check_in", str(start_date)).lte("check_out", str(end_date)).execute()
-        for b in (online_response.data or []):
-            norm = normalize_booking(b, True)
-            if norm: all_bookings.append(norm)
-        direct_response = supabase.table("reservations").select("*") \
-            .gte("check_in", str(start_date)).lte("check_out", str(end_date)).execute()
-        for b in (direct_response.data or []):
-            norm = normalize_booking(b, False)
-            if norm: all_bookings.append(norm)
+        # Any paid booking whose stay overlaps the window, whatever its status,
+        # assembled from the shared (property, month) partitions
+        all_bookings = load_bookings_range_all(
+            PROPERTY_INVENTORY.keys(), start_date, end_date,
+            confirmed_only=False, positive_stays_only=False,
+        )
         logging.info(f"Loaded {len(all_bookings)} bookings for {start_date} to {end_date}")
         return all_bookings
     except Exception as e:
@@ -116,16 +86,15 @@ def load_bookings_for_date_range(start_date, end_date):
         logging.error(f"Error loading bookings: {e}")
         return []
 
-def filter_bookings_for_day(bookings, target_date):
-    return [b for b in bookings if date.fromisoformat(b["check_in"]) <= target_date < date.fromisoformat(b["check_out"])]
-
 def count_rooms_sold(bookings, property_name):
     inventory = PROPERTY_INVENTORY.get(property_name, {"all": []})["all"]
     inventory_lower = [i.lower() for i in inventory]
+    # Records carry canonical names (e.g. "Le Pondy Beachside" for "Le Pondy Beach Side")
+    canonical_name = canonical_property(property_name)
     rooms_sold = 0
     for b in bookings:
-        if b["property"] != property_name: continue
-        rooms = [r.strip().title() for r in b.get('room_no', '').split(',') if r.strip()]
+        if b.property_name != canonical_name: continue
+        rooms = [r.strip().title() for r in b.room_no.split(',') if r.strip()]
         if all(r.lower() in inventory_lower for r in rooms):
             rooms_sold += len(rooms)
     return rooms_sold
@@ -182,7 +151,8 @@ def show_dashboard():
 
     # === REFRESH BUTTON ===
     if st.button("Refresh Dashboard Data"):
-        st.cache_data.clear()
+        today = date.today()
+        invalidate_partitions(start=today - timedelta(days=1), end=today + timedelta(days=2))
         st.rerun()
 
     try:
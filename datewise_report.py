@@ -0,0 +1,476 @@
+# datewise_report.py - Shared engine for the date-wise booking reports
+#
+# The Date-wise Booking, Date-wise Check-in and property-wise Booking Date
+# reports used to filter every booking once per day of the month, re-parsing
+# its dates each time (~31 full scans per month). BookingDateIndex parses the
+# dates of every booking once and buckets the bookings by booking date
+# (booking_date, or created_at when the row has no booking_date), check-in,
+# check-out and enquiry date, so one day is a dict lookup. The index is built
+# once per load and shared by all three reports; each report is a DateView over
+# one of the date keys.
+#
+# Tables used to be sent as one HTML string per day of the month on every
+# rerun (megabytes for a busy month). Now only the selected day is rendered,
+# as structured data in st.dataframe, one page at a time; the page is shrunk
+# so its serialized rows stay under MAX_PAYLOAD_BYTES.
+
+import calendar
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+import pandas as pd
+import streamlit as st
+from supabase import create_client, Client
+
+from booking_cache import BOOKING_TABLES, tagged_cache
+from property_scope import Scope, query_names, scope_tags, user_scope
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Initialize Supabase client
+try:
+    supabase: Client = create_client(st.secrets["supabase"]["url"], st.secrets["supabase"]["key"])
+except KeyError as e:
+    st.error(f"Missing Supabase secret: {e}. Please check Streamlit Cloud secrets configuration.")
+    st.stop()
+
+# Property synonym mapping
+property_mapping = {
+    "La Millionaire Luxury Resort": "La Millionaire Resort",
+    "Le Poshe Beach View": "Le Poshe Beach view",
+    "Le Poshe Beach view": "Le Poshe Beach view",
+    "Le Poshe Beach VIEW": "Le Poshe Beach view",
+    "Le Poshe Beachview": "Le Poshe Beach view",
+    "Millionaire": "La Millionaire Resort",
+    "Le Pondy Beach Side": "Le Pondy Beachside",
+    "Le Teera": "Le Terra"
+}
+
+# Properties permanently closed from July 2026 onward.
+# History (June 2026 and earlier) must still be shown; from July 2026 they are excluded.
+CLOSED_PROPERTIES = {
+    "La Millionaire Resort",
+    "Le Pondy Beachside",
+    "Le Poshe Beach view",
+    "Le Terra",
+    "Happymates Forest Retreat",
+}
+CLOSURE_CUTOFF = date(2026, 7, 1)  # first month from which closed properties are hidden
+
+# Rendering: the table data sent to the browser per rerun is capped
+PAGE_SIZES = [25, 50, 100]
+MAX_PAYLOAD_BYTES = 256 * 1024
+CANCELLED_ROW_STYLE = "background-color: #ffe6e6"
+
+# -------------------------- Loading --------------------------
+def _load_all(table: str, prop_column: str, scope: Scope = None) -> List[Dict]:
+    """Load ALL rows of a table (or the scope's properties) without any limits using pagination"""
+    all_data = []
+    page_size = 1000
+    offset = 0
+    while True:
+        query = supabase.table(table).select("*")
+        if scope is not None:
+            query = query.in_(prop_column, query_names(scope))
+        response = query\
+            .range(offset, offset + page_size - 1)\
+            .execute()
+        if not response.data:
+            break
+        all_data.extend(response.data)
+        if len(response.data) < page_size:
+            break
+        offset += page_size
+    return all_data
+
+def load_direct_reservations_from_supabase(scope: Scope = None):
+    """Load ALL direct reservations (or the scope's properties) without any limits using pagination"""
+    try:
+        return _load_all("reservations", "property_name", scope)
+    except Exception as e:
+        # Also runs on the cache's refresh thread, so no st.* here; the page reports it
+        logging.error(f"Error loading direct reservations: {e}")
+        raise
+
+def load_online_reservations_from_supabase(scope: Scope = None):
+    """Load ALL online reservations (or the scope's properties) without any limits using pagination"""
+    try:
+        return _load_all("online_reservations", "property", scope)
+    except Exception as e:
+        logging.error(f"Error loading online reservations: {e}")
+        raise
+
+# -------------------------- Dates --------------------------
+def safe_date_parse(date_str):
+    """Robust date parsing"""
+    if not date_str:
+        return None
+    s = str(date_str)
+    try:
+        return datetime.fromisoformat(s.replace("Z", "+00:00")).date()
+    except:
+        try:
+            return datetime.strptime(s[:10], "%Y-%m-%d").date()
+        except:
+            return None
+
+def generate_month_dates(year, month):
+    """Generate all dates in a month"""
+    _, num_days = calendar.monthrange(year, month)
+    return [date(year, month, day) for day in range(1, num_days + 1)]
+
+def _booking_made_on(b: Dict) -> Optional[date]:
+    # booking_date when the row has that column, created_at otherwise
+    if "booking_date" in b:
+        return safe_date_parse(b.get("booking_date"))
+    if "created_at" in b:
+        return safe_date_parse(b.get("created_at"))
+    return None
+
+# Date key -> field the parsed date is stored under on each indexed booking
+DATE_KEYS = {
+    "booking_date": "parsed_booking_date",
+    "check_in": "parsed_checkin_date",
+    "check_out": "parsed_checkout_date",
+    "enquiry_date": "parsed_enquiry_date",
+}
+
+def booking_property(b: Dict) -> str:
+    return b.get("property") or b.get("property_name", "") or ""
+
+def booking_status(b: Dict) -> str:
+    return b.get("booking_status") or b.get("plan_status", "") or ""
+
+# -------------------------- Index --------------------------
+class BookingDateIndex:
+    """Bookings bucketed by each date key, built in a single pass.
+
+    Every booking is copied once with its source ("direct"/"online"), its
+    canonical property and the parsed dates (DATE_KEYS); the copies are shared
+    by all buckets and must not be modified by the views.
+    """
+
+    def __init__(self, online_bookings: Iterable[Dict], direct_bookings: Iterable[Dict]):
+        self._buckets: Dict[str, Dict[date, List[Dict]]] = {key: {} for key in DATE_KEYS}
+        self.properties = set()
+        self.online_count = 0
+        self.direct_count = 0
+        for source, rows, prop_field in (("online", online_bookings, "property"), ("direct", direct_bookings, "property_name")):
+            for row in rows:
+                b = dict(row)
+                if prop_field in b:
+                    b[prop_field] = property_mapping.get(b[prop_field], b[prop_field])
+                b["source"] = source
+                if b.get(prop_field):
+                    self.properties.add(b[prop_field])
+                b["parsed_booking_date"] = _booking_made_on(b)
+                b["parsed_checkin_date"] = safe_date_parse(b.get("check_in"))
+                b["parsed_checkout_date"] = safe_date_parse(b.get("check_out"))
+                b["parsed_enquiry_date"] = safe_date_parse(b.get("enquiry_date"))
+                for key, field in DATE_KEYS.items():
+                    if b[field] is not None:
+                        self._buckets[key].setdefault(b[field], []).append(b)
+                if source == "online":
+                    self.online_count += 1
+                else:
+                    self.direct_count += 1
+
+    def on(self, key: str, day: date) -> List[Dict]:
+        """Bookings whose `key` date is `day`."""
+        return self._buckets[key].get(day, [])
+
+    def month(self, key: str, year: int, month: int) -> Dict[date, List[Dict]]:
+        """Bookings of each day of the month with at least one, in date order."""
+        days = {}
+        for day in generate_month_dates(year, month):
+            bookings = self._buckets[key].get(day)
+            if bookings:
+                days[day] = bookings
+        return days
+
+    def __len__(self) -> int:
+        return self.online_count + self.direct_count
+
+@tagged_cache(ttl=300, tags=lambda scope=None: {"table": BOOKING_TABLES, **scope_tags(scope)}, stale_ttl=120)
+def load_booking_index(scope: Scope = None) -> BookingDateIndex:
+    """Index of every booking, or of the bookings of the scope's properties (property_scope)."""
+    return BookingDateIndex(load_online_reservations_from_supabase(scope), load_direct_reservations_from_supabase(scope))
+
+def select_bookings(bookings: Iterable[Dict], year: int, month: int, property_name: Optional[str] = None,
+                    status: Optional[str] = None) -> List[Dict]:
+    """Drop closed properties for months from CLOSURE_CUTOFF on, then apply the property/status filters."""
+    hide_closed = date(year, month, 1) >= CLOSURE_CUTOFF
+    return [
+        b for b in bookings
+        if not (hide_closed and booking_property(b) in CLOSED_PROPERTIES)
+        and (property_name is None or booking_property(b) == property_name)
+        and (status is None or booking_status(b) == status)
+    ]
+
+# -------------------------- Views --------------------------
+@dataclass(frozen=True)
+class DateView:
+    """One date-wise report: the date key it is bucketed by and its labels."""
+    key: str
+    title: str
+    description: str
+    noun: str                        # "booking" / "check-in"
+    plural: str                      # "Bookings" / "Check-ins"
+    heading: str                     # "Bookings Made in" / "Check-ins in"
+    file_prefix: str
+    sheet_name: str
+    table_columns: Tuple[str, ...]
+    download_columns: Tuple[str, ...]
+    empty_text: str                  # "No bookings made in" ...
+
+def _row(b: Dict) -> Dict[str, Any]:
+    """Every column the views can show, for one indexed booking."""
+    return {
+        "Source": b["source"].capitalize(),
+        "Property": booking_property(b),
+        "Booking ID": b.get("booking_id", "") or b.get("id", ""),
+        "Booking Date": str(b["parsed_booking_date"] or ""),
+        "Guest Name": b.get("guest_name") or b.get("name", "") or "",
+        "Mobile No": b.get("guest_phone") or b.get("mobile_no", "") or "",
+        "Check-in Date": str(b["parsed_checkin_date"] or ""),
+        "Check-out Date": str(b["parsed_checkout_date"] or ""),
+        "Room No": b.get("room_no", "") or "",
+        "Advance MOP": b.get("advance_mop", "") or "",
+        "Balance MOP": b.get("balance_mop", "") or "",
+        "Total Tariff": b.get("booking_amount") or b.get("total_tariff") or 0,
+        "Advance Amount": b.get("total_payment_made") or b.get("advance_amount") or 0,
+        "Balance Due": b.get("balance_due") or 0,
+        "Booking Status": booking_status(b),
+        "Remarks": b.get("remarks", "") or "",
+    }
+
+def create_bookings_dataframe(bookings, view: DateView):
+    """Create pandas DataFrame from bookings for download"""
+    if not bookings:
+        return pd.DataFrame()
+    return pd.DataFrame([_row(b) for b in bookings], columns=list(view.download_columns))
+
+EDIT_PAGES = {"online": "Edit Online Reservations", "direct": "Edit Direct Reservation"}
+
+def edit_link(b: Dict) -> str:
+    """Relative link to the booking's edit page (read by app.py from the query string)."""
+    booking_id = b.get("booking_id", "") or b.get("id", "")
+    return f"?page={quote(EDIT_PAGES[b['source']])}&booking_id={quote(str(booking_id))}"
+
+def _style_cancelled(df: pd.DataFrame, cancelled: List[bool]):
+    styles = pd.DataFrame("", index=df.index, columns=df.columns)
+    styles.loc[cancelled] = CANCELLED_ROW_STYLE
+    return df.style.apply(lambda _: styles, axis=None)
+
+def render_bookings_page(bookings: List[Dict], columns: Iterable[str], key: str) -> int:
+    """Show one page of bookings in st.dataframe; returns the bytes of row data sent.
+
+    The page size chosen by the user is reduced when its rows would exceed
+    MAX_PAYLOAD_BYTES.
+    """
+    columns = list(columns)
+    if not bookings:
+        st.info("No bookings found.")
+        return 0
+
+    col1, col2 = st.columns(2)
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_size")
+    # Measure a sample row to keep the page under the payload cap
+    sample = pd.DataFrame([_row(b) for b in bookings[:page_size]], columns=columns)
+    row_bytes = max(len(sample.to_json(orient="values").encode()) / len(sample), 1)
+    capped = max(1, min(page_size, int(MAX_PAYLOAD_BYTES // row_bytes)))
+    if capped < page_size:
+        logging.info(f"datewise_report: page of {page_size} rows capped to {capped} ({row_bytes:.0f} B/row)")
+    pages = (len(bookings) + capped - 1) // capped
+    with col2:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page") if pages > 1 else 1
+
+    rows = bookings[(page - 1) * capped: page * capped]
+    df = pd.DataFrame([_row(b) for b in rows], columns=columns)
+    if "Booking ID" in df.columns:
+        df["Booking ID"] = [edit_link(b) for b in rows]
+    sent = len(df.to_json(orient="values").encode())
+    cancelled = ["cancel" in booking_status(b).lower() for b in rows]
+    st.dataframe(
+        _style_cancelled(df, cancelled) if any(cancelled) else df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={"Booking ID": st.column_config.LinkColumn("Booking ID", display_text=r"booking_id=(.*)$")},
+    )
+    st.caption(f"Rows {(page - 1) * capped + 1}-{(page - 1) * capped + len(rows)} of {len(bookings)} · {sent / 1024:.1f} KB sent")
+    return sent
+
+def convert_df_to_excel(df, sheet_name="Bookings"):
+    """Convert DataFrame to Excel file"""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name=sheet_name)
+    return output.getvalue()
+
+# -------------------------- Report --------------------------
+def show_datewise_report(view: DateView):
+    """Date-wise report for one view: month filters, downloads, a day overview and the selected day's bookings"""
+    st.title(view.title)
+    st.markdown(f"**{view.description}**")
+
+    if st.button("Refresh Bookings"):
+        load_booking_index.forget(user_scope())
+        st.success("Cache cleared! Refreshing bookings...")
+        st.rerun()
+
+    # Filters Row 1
+    col1, col2 = st.columns(2)
+
+    with col1:
+        current_year = date.today().year
+        year = st.selectbox("Select Year", list(range(current_year - 5, current_year + 6)), index=5)
+
+    with col2:
+        month = st.selectbox("Select Month", list(range(1, 13)), index=date.today().month - 1)
+
+    try:
+        index = load_booking_index(user_scope())
+    except Exception as e:
+        st.error(f"Error loading reservations: {e}")
+        return
+    st.info(f"Total records loaded: Online={index.online_count}, Direct={index.direct_count}")
+
+    if not len(index):
+        st.info("No reservations available.")
+        return
+
+    # Bookings of each day of the month, closed properties removed from July 2026 onward
+    month_days = {day: select_bookings(bookings, year, month) for day, bookings in index.month(view.key, year, month).items()}
+    all_month_bookings = [b for bookings in month_days.values() for b in bookings]
+
+    unique_statuses = sorted({booking_status(b) for b in all_month_bookings} - {""})
+    unique_properties = sorted({booking_property(b) for b in all_month_bookings} - {""})
+
+    # Filters Row 2
+    col3, col4 = st.columns(2)
+
+    with col3:
+        property_options = ["All Properties"] + unique_properties
+        selected_property = st.selectbox("Filter by Property", property_options)
+
+    with col4:
+        status_options = ["All Statuses"] + unique_statuses
+        selected_status = st.selectbox("Filter by Status", status_options)
+
+    st.subheader(f"{view.heading} {calendar.month_name[month]} {year}")
+
+    # Apply filters
+    prop_filter = None if selected_property == "All Properties" else selected_property
+    status_filter = None if selected_status == "All Statuses" else selected_status
+    if prop_filter or status_filter:
+        month_days = {day: select_bookings(bookings, year, month, prop_filter, status_filter) for day, bookings in month_days.items()}
+        all_month_bookings = [b for bookings in month_days.values() for b in bookings]
+
+    total_bookings_month = len(all_month_bookings)
+
+    # Download button for entire month
+    if all_month_bookings:
+        st.markdown("### Download Options")
+        col1, col2 = st.columns(2)
+
+        df_month = create_bookings_dataframe(all_month_bookings, view)
+
+        with col1:
+            excel_data = convert_df_to_excel(df_month, view.sheet_name)
+            st.download_button(
+                label="📥 Download Month Report (Excel)",
+                data=excel_data,
+                file_name=f"{view.file_prefix}_{calendar.month_name[month]}_{year}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+
+        with col2:
+            csv_data = df_month.to_csv(index=False).encode('utf-8')
+            st.download_button(
+                label="📥 Download Month Report (CSV)",
+                data=csv_data,
+                file_name=f"{view.file_prefix}_{calendar.month_name[month]}_{year}.csv",
+                mime="text/csv"
+            )
+
+    st.markdown("---")
+
+    # Day overview, then the selected day's bookings a page at a time
+    days = [day for day, daily_bookings in month_days.items() if daily_bookings]
+    if days:
+        overview = []
+        for day in days:
+            cancelled_count = sum(1 for b in month_days[day] if "cancel" in str(b.get("booking_status", "")).lower() or "cancel" in str(b.get("plan_status", "")).lower())
+            overview.append({"Date": day, view.plural: len(month_days[day]), "Active": len(month_days[day]) - cancelled_count, "Cancelled": cancelled_count})
+        st.dataframe(pd.DataFrame(overview), use_container_width=True, hide_index=True,
+                     column_config={"Date": st.column_config.DateColumn("Date", format="DD-MM-YYYY")})
+
+        today = date.today()
+        day = st.selectbox(
+            "Show day",
+            days,
+            index=days.index(today) if today in days else 0,
+            format_func=lambda d: f"📅 {d.strftime('%B %d, %Y')} - {len(month_days[d])} {view.noun}(s)",
+        )
+        daily_bookings = month_days[day]
+        render_bookings_page(daily_bookings, view.table_columns, key=f"{view.file_prefix}_{day.strftime('%Y%m%d')}")
+
+        # Download buttons for this day
+        col1, col2 = st.columns(2)
+        df_day = create_bookings_dataframe(daily_bookings, view)
+
+        with col1:
+            excel_data_day = convert_df_to_excel(df_day, view.sheet_name)
+            st.download_button(
+                label=f"📥 Download {day.strftime('%b %d')} (Excel)",
+                data=excel_data_day,
+                file_name=f"{view.file_prefix}_{day.strftime('%Y_%m_%d')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key=f"excel_{day.strftime('%Y%m%d')}"
+            )
+
+        with col2:
+            csv_data_day = df_day.to_csv(index=False).encode('utf-8')
+            st.download_button(
+                label=f"📥 Download {day.strftime('%b %d')} (CSV)",
+                data=csv_data_day,
+                file_name=f"{view.file_prefix}_{day.strftime('%Y_%m_%d')}.csv",
+                mime="text/csv",
+                key=f"csv_{day.strftime('%Y%m%d')}"
+            )
+
+    if total_bookings_month == 0:
+        # Build helpful message based on active filters
+        filters_active = []
+        if prop_filter:
+            filters_active.append(f"property '{selected_property}'")
+        if status_filter:
+            filters_active.append(f"status '{selected_status}'")
+
+        if filters_active:
+            filter_text = " and ".join(filters_active)
+            st.info(f"No {view.noun}s with {filter_text} found in {calendar.month_name[month]} {year}")
+        else:
+            st.info(f"{view.empty_text} {calendar.month_name[month]} {year}")
+
+    # Overall summary
+    st.markdown("---")
+
+    # Build metric label based on active filters
+    metric_parts = []
+    if prop_filter:
+        metric_parts.append(f"'{selected_property}'")
+    if status_filter:
+        metric_parts.append(f"'{selected_status}'")
+
+    if metric_parts:
+        metric_label = f"Total {' - '.join(metric_parts)} {view.plural} in {calendar.month_name[month]} {year}"
+    else:
+        metric_label = f"Total {view.heading} {calendar.month_name[month]} {year}"
+
+    st.metric(label=metric_label, value=total_bookings_month)
@@ -3,6 +3,12 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime, date, timedelta
 from supabase import create_client, Client
+import logging
+from bulk_read import dates_to_objects
+from booking_store import load_snapshot, expire_snapshot
+import availability
+from booking_cache import invalidate_booking, canonical_property, tagged_cache
+from property_scope import user_scope, query_names, scope_tags
 
 # Initialize Supabase client
 try:
@@ -244,71 +250,184 @@ def safe_float(value, default=0.0):
     except (ValueError, TypeError):
         return default
 
-def load_reservations_from_supabase():
-    """Load ALL reservations from Supabase with pagination, handling potential None values."""
+# Supabase column -> session-state field name used throughout this module
+RESERVATION_FIELD_NAMES = {
+    "booking_id": "Booking ID",
+    "property_name": "Property Name",
+    "room_no": "Room No",
+    "guest_name": "Guest Name",
+    "mobile_no": "Mobile No",
+    "no_of_adults": "No of Adults",
+    "no_of_children": "No of Children",
+    "no_of_infants": "No of Infants",
+    "total_pax": "Total Pax",
+    "check_in": "Check In",
+    "check_out": "Check Out",
+    "no_of_days": "No of Days",
+    "tariff": "Tariff",
+    "total_tariff": "Total Tariff",
+    "advance_amount": "Advance Amount",
+    "balance_amount": "Balance Amount",
+    "advance_mop": "Advance MOP",
+    "balance_mop": "Balance MOP",
+    "mob": "MOB",
+    "online_source": "Online Source",
+    "invoice_no": "Invoice No",
+    "enquiry_date": "Enquiry Date",
+    "booking_date": "Booking Date",
+    "room_type": "Room Type",
+    "breakfast": "Breakfast",
+    "plan_status": "Booking Status",
+    "submitted_by": "Submitted By",
+    "modified_by": "Modified By",
+    "modified_comments": "Modified Comments",
+    "remarks": "Remarks",
+    "payment_status": "Payment Status",
+}
+
+def load_reservations_frame(scope=None):
+    """Bulk-load the reservations table as a typed DataFrame with session-state column names.
+
+    With a property scope (property_scope) only those properties' reservations are kept.
+    """
+    df = load_snapshot("reservations")
+    if scope is not None and not df.empty:
+        df = df[df["property_name"].astype(str).map(canonical_property).isin(scope)]
+    if df.empty:
+        return pd.DataFrame(columns=list(RESERVATION_FIELD_NAMES.values()))
+    for col in RESERVATION_FIELD_NAMES:
+        if col not in df.columns:
+            df[col] = ""
+    df = df.sort_values("booking_id", ascending=False, kind="stable")[list(RESERVATION_FIELD_NAMES)].reset_index(drop=True)
+    # Plain object columns, so edited rows can be written back whatever their values
+    for col in df.select_dtypes(include="category").columns:
+        df[col] = df[col].astype(object)
+    df["payment_status"] = df["payment_status"].astype(str).replace("", "Not Paid")
+    df = dates_to_objects(df, ["check_in", "check_out", "enquiry_date", "booking_date"])
+    return df.rename(columns=RESERVATION_FIELD_NAMES)
+
+def fetch_reservations(scope=None):
+    """Reservations (all, or the scope's properties) as a DataFrame with one row per reservation.
+
+    Raises when neither the snapshot nor the JSON pages can be read. No st.* calls:
+    this also runs on the cache's background refresh thread.
+    """
     try:
-        reservations = []
-        page_size = 1000
-        start = 0
-        
-        while True:
-            response = supabase.table("reservations").select("*").order("booking_id", desc=True).range(start, start + page_size - 1).execute()
-            
-            if not response.data:
-                break
-            
-            for record in response.data:
-                reservation = {
-                    "Booking ID": record["booking_id"],
-                    "Property Name": record["property_name"] or "",
-                    "Room No": record["room_no"] or "",
-                    "Guest Name": record["guest_name"] or "",
-                    "Mobile No": record["mobile_no"] or "",
-                    "No of Adults": safe_int(record["no_of_adults"]),
-                    "No of Children": safe_int(record["no_of_children"]),
-                    "No of Infants": safe_int(record["no_of_infants"]),
-                    "Total Pax": safe_int(record["total_pax"]),
-                    "Check In": datetime.strptime(record["check_in"], "%Y-%m-%d").date() if record["check_in"] else None,
-                    "Check Out": datetime.strptime(record["check_out"], "%Y-%m-%d").date() if record["check_out"] else None,
-                    "No of Days": safe_int(record["no_of_days"]),
-                    "Tariff": safe_float(record["tariff"]),
-                    "Total Tariff": safe_float(record["total_tariff"]),
-                    "Advance Amount": safe_float(record["advance_amount"]),
-                    "Balance Amount": safe_float(record["balance_amount"]),
-                    "Advance MOP": record["advance_mop"] or "",
-                    "Balance MOP": record["balance_mop"] or "",
-                    "MOB": record["mob"] or "",
-                    "Online Source": record["online_source"] or "",
-                    "Invoice No": record["invoice_no"] or "",
-                    "Enquiry Date": datetime.strptime(record["enquiry_date"], "%Y-%m-%d").date() if record["enquiry_date"] else None,
-                    "Booking Date": datetime.strptime(record["booking_date"], "%Y-%m-%d").date() if record["booking_date"] else None,
-                    "Room Type": record["room_type"] or "",
-                    "Breakfast": record["breakfast"] or "",
-                    "Booking Status": record["plan_status"] or "",
-                    "Submitted By": record.get("submitted_by", ""),
-                    "Modified By": record.get("modified_by", ""),
-                    "Modified Comments": record.get("modified_comments", ""),
-                    "Remarks": record.get("remarks", ""),
-                    "Payment Status": record.get("payment_status", "Not Paid")
-                }
-                reservations.append(reservation)
-            
-            # If we got less than page_size records, we've reached the end
-            if len(response.data) < page_size:
-                break
-            
-            # Move to next page
-            start += page_size
-        
-        print(f"✅ Loaded {len(reservations)} reservations from Supabase")
+        reservations = load_reservations_frame(scope)
+        logging.info(f"Loaded {len(reservations)} reservations (snapshot + delta sync)")
         return reservations
+    except Exception:
+        logging.exception("Snapshot/CSV read of reservations failed, falling back to JSON pages")
+    reservations = []
+    page_size = 1000
+    start = 0
+
+    while True:
+        query = supabase.table("reservations").select("*")
+        if scope is not None:
+            query = query.in_("property_name", query_names(scope))
+        response = query.order("booking_id", desc=True).range(start, start + page_size - 1).execute()
+
+        if not response.data:
+            break
+
+        for record in response.data:
+            reservation = {
+                "Booking ID": record["booking_id"],
+                "Property Name": record["property_name"] or "",
+                "Room No": record["room_no"] or "",
+                "Guest Name": record["guest_name"] or "",
+                "Mobile No": record["mobile_no"] or "",
+                "No of Adults": safe_int(record["no_of_adults"]),
+                "No of Children": safe_int(record["no_of_children"]),
+                "No of Infants": safe_int(record["no_of_infants"]),
+                "Total Pax": safe_int(record["total_pax"]),
+                "Check In": datetime.strptime(record["check_in"], "%Y-%m-%d").date() if record["check_in"] else None,
+                "Check Out": datetime.strptime(record["check_out"], "%Y-%m-%d").date() if record["check_out"] else None,
+                "No of Days": safe_int(record["no_of_days"]),
+                "Tariff": safe_float(record["tariff"]),
+                "Total Tariff": safe_float(record["total_tariff"]),
+                "Advance Amount": safe_float(record["advance_amount"]),
+                "Balance Amount": safe_float(record["balance_amount"]),
+                "Advance MOP": record["advance_mop"] or "",
+                "Balance MOP": record["balance_mop"] or "",
+                "MOB": record["mob"] or "",
+                "Online Source": record["online_source"] or "",
+                "Invoice No": record["invoice_no"] or "",
+                "Enquiry Date": datetime.strptime(record["enquiry_date"], "%Y-%m-%d").date() if record["enquiry_date"] else None,
+                "Booking Date": datetime.strptime(record["booking_date"], "%Y-%m-%d").date() if record["booking_date"] else None,
+                "Room Type": record["room_type"] or "",
+                "Breakfast": record["breakfast"] or "",
+                "Booking Status": record["plan_status"] or "",
+                "Submitted By": record.get("submitted_by", ""),
+                "Modified By": record.get("modified_by", ""),
+                "Modified Comments": record.get("modified_comments", ""),
+                "Remarks": record.get("remarks", ""),
+                "Payment Status": record.get("payment_status", "Not Paid")
+            }
+            reservations.append(reservation)
+
+        # If we got less than page_size records, we've reached the end
+        if len(response.data) < page_size:
+            break
+
+        # Move to next page
+        start += page_size
+
+    logging.info(f"Loaded {len(reservations)} reservations from Supabase JSON pages")
+    return pd.DataFrame(reservations, columns=list(RESERVATION_FIELD_NAMES.values()))
+
+def load_reservations_from_supabase(scope=None):
+    """fetch_reservations for a page: errors are shown and an empty frame is returned."""
+    try:
+        return fetch_reservations(scope)
     except Exception as e:
         st.error(f"Error loading reservations: {e}")
-        return []
+        return pd.DataFrame(columns=list(RESERVATION_FIELD_NAMES.values()))
+
+@tagged_cache(ttl=300, tags=lambda scope=None: {"table": "reservations", **scope_tags(scope)}, stale_ttl=120)
+def cached_reservations(scope=None):
+    """fetch_reservations through the shared cache, one entry per property scope.
+
+    The frame is shared by every session with this scope: treat it as read-only.
+    """
+    return fetch_reservations(scope)
+
+def ensure_reservations():
+    """The session's reservations, loaded on first use (login no longer loads them)."""
+    if st.session_state.get("reservations") is None:
+        try:
+            # Sessions add/replace/remove rows in their frame, so each gets its own copy
+            st.session_state.reservations = cached_reservations(user_scope()).copy()
+        except Exception as e:
+            st.error(f"Error loading reservations: {e}")
+            return pd.DataFrame(columns=list(RESERVATION_FIELD_NAMES.values()))
+    return st.session_state.reservations
+
+def reservation_at(index):
+    """One row of the session's reservations as a plain dict (the edit form's input)."""
+    return st.session_state.reservations.loc[[index]].to_dict("records")[0]
+
+def _invalidate_cached_reservation(booking_id):
+    """Drop cached report data for a reservation's current property and stay."""
+    expire_snapshot("reservations")
+    df = st.session_state.get("reservations")
+    if df is not None:
+        match = df[df["Booking ID"] == booking_id]
+        if not match.empty:
+            res = match.iloc[0]
+            invalidate_booking("reservations", res["Property Name"], res["Check In"], res["Check Out"])
+            return
+    invalidate_booking("reservations", None)
 
 def save_reservation_to_supabase(reservation):
     """Save a new reservation to Supabase."""
     try:
+        has_conflict, conflict_msg = availability.check_room_conflicts(reservation["Property Name"], reservation["Room No"], reservation["Check In"],
+                                                                       reservation["Check Out"], reservation["Booking Status"])
+        if has_conflict:
+            st.error(f"❌ Overbooking: {conflict_msg}")
+            return False
         supabase_reservation = {
             "booking_id": reservation["Booking ID"],
             "property_name": reservation["Property Name"],
@@ -344,7 +463,11 @@ def save_reservation_to_supabase(reservation):
         }
         response = supabase.table("reservations").insert(supabase_reservation).execute()
         if response.data:
-            st.session_state.reservations = load_reservations_from_supabase()
+            expire_snapshot("reservations")
+            invalidate_booking("reservations", reservation["Property Name"], reservation["Check In"], reservation["Check Out"])
+            availability.record_booking("reservations", reservation["Booking ID"], reservation["Property Name"], reservation["Room No"],
+                                        reservation["Check In"], reservation["Check Out"], reservation["Booking Status"])
+            st.session_state.reservations = load_reservations_from_supabase(user_scope())
             return True
         return False
     except Exception as e:
@@ -354,6 +477,11 @@ def save_reservation_to_supabase(reservation):
 def update_reservation_in_supabase(booking_id, updated_reservation):
     """Update an existing reservation in Supabase."""
     try:
+        has_conflict, conflict_msg = availability.check_room_conflicts(updated_reservation["Property Name"], updated_reservation["Room No"], updated_reservation["Check In"],
+                                                                       updated_reservation["Check Out"], updated_reservation["Booking Status"], exclude_booking_id=booking_id)
+        if has_conflict:
+            st.error(f"❌ Overbooking: {conflict_msg}")
+            return False
         supabase_reservation = {
             "booking_id": updated_reservation["Booking ID"],
             "property_name": updated_reservation["Property Name"],
@@ -389,6 +517,11 @@ def update_reservation_in_supabase(booking_id, updated_reservation):
         }
         response = supabase.table("reservations").update(supabase_reservation).eq("booking_id", booking_id).execute()
         if response.data:
+            _invalidate_cached_reservation(booking_id)
+            invalidate_booking("reservations", updated_reservation["Property Name"], updated_reservation["Check In"], updated_reservation["Check Out"])
+            availability.forget_booking("reservations", booking_id)
+            availability.record_booking("reservations", updated_reservation["Booking ID"], updated_reservation["Property Name"], updated_reservation["Room No"],
+                                        updated_reservation["Check In"], updated_reservation["Check Out"], updated_reservation["Booking Status"])
             return True
         return False
     except Exception as e:
@@ -400,6 +533,8 @@ def delete_reservation_in_supabase(booking_id):
     try:
         response = supabase.table("reservations").delete().eq("booking_id", booking_id).execute()
         if response.data:
+            _invalidate_cached_reservation(booking_id)
+            availability.forget_booking("reservations", booking_id)
             return True
         return False
     except Exception as e:
@@ -472,10 +607,55 @@ def display_filtered_analysis(df, start_date=None, end_date=None, view_mode=Fals
     
     return filtered_df
 
+def show_room_availability(property_name, rooms, check_in, check_out):
+    """Caption listing which of `rooms` are free for the stay, from the occupancy index."""
+    try:
+        index = availability.get_index()
+    except Exception as e:
+        logging.warning(f"Availability index unavailable: {e}")
+        st.caption(f"💡 **Quick suggestions:** {', '.join(rooms)}")
+        return
+    if not check_in or not check_out or check_out <= check_in or not index.covers(check_in, check_out):
+        st.caption(f"💡 **Quick suggestions:** {', '.join(rooms)}")
+        return
+    free = index.free_rooms(property_name, check_in, check_out, rooms)
+    booked = [r for r in rooms if r not in free]
+    st.caption(f"✅ **Free for these dates:** {', '.join(free) if free else 'none'}")
+    if booked:
+        st.caption(f"⛔ **Booked:** {', '.join(booked)}")
+
+def show_availability_search():
+    """Expander to find free rooms across all open properties for a stay window."""
+    with st.expander("🔎 Check availability across properties"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            search_in = st.date_input("Check In", value=date.today(), key="avail_checkin")
+        with col2:
+            search_out = st.date_input("Check Out", value=date.today() + timedelta(days=1), key="avail_checkout")
+        with col3:
+            search_pax = st.number_input("Guests per room", min_value=1, value=2, key="avail_pax")
+        if search_out <= search_in:
+            st.warning("Check Out must be after Check In.")
+            return
+        try:
+            results = availability.search_availability(search_in, search_out, int(search_pax))
+        except Exception as e:
+            st.error(f"Availability search failed: {e}")
+            return
+        rows = [
+            {"Property": prop, "Room Type": room_type, "Free Rooms": ", ".join(rooms), "Count": len(rooms)}
+            for prop, by_type in results.items() for room_type, rooms in by_type.items()
+        ]
+        if rows:
+            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+        else:
+            st.info("No free rooms for these dates.")
+
 def show_new_reservation_form():
     """Display form for creating a new reservation with dynamic room assignments."""
     try:
         st.header("📝 Direct Reservations")
+        show_availability_search()
         form_key = "new_reservation"
         property_room_map = load_active_property_room_map()
         
@@ -544,7 +724,11 @@ def show_new_reservation_form():
                 room_no = st.text_input("Room No", value="", placeholder="Enter room number", key=f"{form_key}_room_no", help="Enter or edit the room number. You can type any custom value or use suggestions below.")
                 suggestion_list = [r for r in room_numbers if r.strip()]
                 if suggestion_list:
-                    st.caption(f"💡 **Quick suggestions:** {', '.join(suggestion_list)}")
+                    show_room_availability(property_name, suggestion_list, check_in, check_out)
+            if room_no.strip():
+                has_conflict, conflict_msg = availability.check_room_conflicts(property_name, room_no, check_in, check_out, "Confirmed")
+                if has_conflict:
+                    st.warning(f"⚠️ {conflict_msg}")
 
         row5_col1, row5_col2, row5_col3, row5_col4 = st.columns(4)
         with row5_col1:
@@ -665,7 +849,9 @@ def show_new_reservation_form():
                             "Payment Status": payment_status
                         }
                         if save_reservation_to_supabase(new_reservation):
-                            st.session_state.reservations.insert(0, new_reservation)
+                            st.session_state.reservations = pd.concat(
+                                [pd.DataFrame([new_reservation], columns=st.session_state.reservations.columns),
+                                 st.session_state.reservations], ignore_index=True)
                             show_confirmation_dialog(booking_id)
                         else:
                             st.error("❌ Failed to save reservation")
@@ -678,15 +864,14 @@ def show_reservations():
     col_refresh1, col_refresh2 = st.columns([1, 4])
     with col_refresh1:
         if st.button("🔄 Refresh Data", use_container_width=True):
-            st.session_state.reservations = load_reservations_from_supabase()
+            st.session_state.reservations = load_reservations_from_supabase(user_scope())
             st.success(f"✅ Loaded {len(st.session_state.reservations)} reservations")
             st.rerun()
     
-    if not st.session_state.reservations:
+    df = ensure_reservations()
+    if df.empty:
         st.info("No reservations available.")
         return
-
-    df = pd.DataFrame(st.session_state.reservations)
     
     col1, col2, col3, col4, col5, col6 = st.columns(6)
     with col1:
@@ -732,15 +917,14 @@ def show_edit_reservations():
         col_refresh1, col_refresh2 = st.columns([1, 4])
         with col_refresh1:
             if st.button("🔄 Refresh Data", use_container_width=True):
-                st.session_state.reservations = load_reservations_from_supabase()
+                st.session_state.reservations = load_reservations_from_supabase(user_scope())
                 st.success(f"✅ Loaded {len(st.session_state.reservations)} reservations")
                 st.rerun()
         
-        if not st.session_state.reservations:
+        df = ensure_reservations()
+        if df.empty:
             st.info("No reservations available to edit.")
             return
-
-        df = pd.DataFrame(st.session_state.reservations)
                  
         st.subheader("🔍 Search Reservation to Edit")
         col_search1, col_search2 = st.columns([3, 1])
@@ -750,8 +934,7 @@ def show_edit_reservations():
             search_button = st.button("🔍 Search", use_container_width=True)
         
         if search_button and direct_booking_id:
-            st.session_state.reservations = load_reservations_from_supabase()
-            df = pd.DataFrame(st.session_state.reservations)
+            st.session_state.reservations = df = load_reservations_from_supabase(user_scope())
             st.info(f"🔍 Searching for: '{direct_booking_id}' in {len(df)} total reservations")
             matching_reservation = df[df["Booking ID"].str.strip() == direct_booking_id.strip()]
             
@@ -778,8 +961,8 @@ def show_edit_reservations():
 def show_edit_form(edit_index):
     """Display form for editing an existing reservation with dynamic room assignments."""
     try:
-        st.subheader(f"✏️ Editing Reservation: {st.session_state.reservations[edit_index]['Booking ID']}")
-        reservation = st.session_state.reservations[edit_index]
+        reservation = reservation_at(edit_index)
+        st.subheader(f"✏️ Editing Reservation: {reservation['Booking ID']}")
         form_key = f"edit_reservation"
         property_room_map = load_property_room_map()
 
@@ -986,7 +1169,8 @@ def show_edit_form(edit_index):
                             "Payment Status": payment_status
                         }
                         if update_reservation_in_supabase(reservation["Booking ID"], updated_reservation):
-                            st.session_state.reservations[edit_index] = updated_reservation
+                            df = st.session_state.reservations
+                            df.loc[edit_index] = [updated_reservation[col] for col in df.columns]
                             st.session_state.edit_mode = False
                             st.session_state.edit_index = None
                             st.success(f"✅ Reservation {reservation['Booking ID']} updated successfully!")
@@ -997,7 +1181,7 @@ def show_edit_form(edit_index):
             if st.session_state.role == "Management":
                 if st.button("🗑️ Delete Reservation", key=f"{form_key}_delete", use_container_width=True):
                     if delete_reservation_in_supabase(reservation["Booking ID"]):
-                        st.session_state.reservations.pop(edit_index)
+                        st.session_state.reservations = st.session_state.reservations.drop(index=edit_index).reset_index(drop=True)
                         st.session_state.edit_mode = False
                         st.session_state.edit_index = None
                         st.success(f"🗑️ Reservation {reservation['Booking ID']} deleted successfully!")
@@ -1019,11 +1203,10 @@ def show_analytics():
         return
 
     st.header("📊 Analytics Dashboard")
-    if not st.session_state.reservations:
+    df = ensure_reservations()
+    if df.empty:
         st.info("No reservations available for analysis.")
         return
-
-    df = pd.DataFrame(st.session_state.reservations)
     
     st.subheader("Filters")
     col1, col2, col3, col4, col5, col6 = st.columns(6)
@@ -1084,8 +1267,7 @@ if __name__ == "__main__":
     st.set_page_config(page_title="Direct Reservations", layout="wide")
     
     # Initialize session state
-    if 'reservations' not in st.session_state:
-        st.session_state.reservations = load_reservations_from_supabase()
+    ensure_reservations()
     
     # User Authentication Section - MUST BE AT TOP
     st.title("🏨 Direct Reservations System")
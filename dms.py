@@ -2,8 +2,13 @@
 import streamlit as st
 from supabase import create_client, Client
 from datetime import date, timedelta, datetime
+import numpy as np
 import pandas as pd
 import calendar
+import html
+import logging
+from booking_cache import BOOKING_TABLES, tagged_cache
+from property_scope import user_scope, query_names, scope_tags
 
 # Initialize Supabase client
 try:
@@ -73,16 +78,18 @@ TABLE_CSS = """
 </style>
 """
 
-def load_direct_reservations_from_supabase():
-    """Load ALL direct reservations without any limits using pagination"""
+def load_direct_reservations_from_supabase(scope=None):
+    """Load ALL direct reservations (or the scope's properties) without any limits using pagination"""
     try:
         all_data = []
         page_size = 1000
         offset = 0
         
         while True:
-            response = supabase.table("reservations")\
-                .select("*")\
+            query = supabase.table("reservations").select("*")
+            if scope is not None:
+                query = query.in_("property_name", query_names(scope))
+            response = query\
                 .range(offset, offset + page_size - 1)\
                 .execute()
             
@@ -96,19 +103,22 @@ def load_direct_reservations_from_supabase():
         
         return all_data
     except Exception as e:
-        st.error(f"Error loading direct reservations: {e}")
-        return []
+        # Also runs on the cache's refresh thread, so no st.* here; the page reports it
+        logging.error(f"Error loading direct reservations: {e}")
+        raise
 
-def load_online_reservations_from_supabase():
-    """Load ALL online reservations without any limits using pagination"""
+def load_online_reservations_from_supabase(scope=None):
+    """Load ALL online reservations (or the scope's properties) without any limits using pagination"""
     try:
         all_data = []
         page_size = 1000
         offset = 0
         
         while True:
-            response = supabase.table("online_reservations")\
-                .select("*")\
+            query = supabase.table("online_reservations").select("*")
+            if scope is not None:
+                query = query.in_("property", query_names(scope))
+            response = query\
                 .range(offset, offset + page_size - 1)\
                 .execute()
             
@@ -122,8 +132,8 @@ def load_online_reservations_from_supabase():
         
         return all_data
     except Exception as e:
-        st.error(f"Error loading online reservations: {e}")
-        return []
+        logging.error(f"Error loading online reservations: {e}")
+        raise
 
 # ROBUST DATE PARSING – THIS FIXES LA ANTILIA & ALL DATES
 def safe_date_parse(date_str):
@@ -155,67 +165,149 @@ def should_show_in_dms(booking):
         return payment == "Not Paid"
     return False
 
-def filter_bookings_for_day(bookings, target_date):
-    """Filter bookings that are active on the target date"""
-    filtered = []
-    for b in bookings:
-        if not should_show_in_dms(b):
-            continue
-        ci = safe_date_parse(b.get("check_in"))
-        co = safe_date_parse(b.get("check_out"))
-        if ci and co and ci <= target_date < co:
-            b["source"] = "direct" if "property_name" in b else "online"
-            filtered.append(b)
-    return filtered
-
-def create_bookings_table(bookings):
-    columns = [
-        "Source", "Booking ID", "Guest Name", "Mobile No", "Check-in Date", "Check-out Date", "Room No",
-        "Advance MOP", "Balance MOP", "Total Tariff", "Advance Amount", "Balance Due",
-        "Booking Status", "Remarks"
-    ]
-    df_data = []
-    for booking in bookings:
-        source = booking.get("source", "online")
-        booking_id = booking.get("booking_id", "") or booking.get("id", "")
-        edit_link = f'<a href="?page=Edit Online Reservations&booking_id={booking_id}" target="_self">{booking_id}</a>' if source == "online" else \
-                    f'<a href="?page=Edit Reservations&booking_id={booking_id}" target="_self">{booking_id}</a>'
-
-        df_data.append({
-            "Source": source.capitalize(),
-            "Booking ID": edit_link,
-            "Guest Name": booking.get("guest_name") or booking.get("name", "") or "",
-            "Mobile No": booking.get("guest_phone") or booking.get("mobile_no", "") or "",
-            "Check-in Date": str(safe_date_parse(booking.get("check_in"))) if safe_date_parse(booking.get("check_in")) else "",
-            "Check-out Date": str(safe_date_parse(booking.get("check_out"))) if safe_date_parse(booking.get("check_out")) else "",
-            "Room No": booking.get("room_no", "") or "",
-            "Advance MOP": booking.get("advance_mop", "") or "",
-            "Balance MOP": booking.get("balance_mop", "") or "",
-            "Total Tariff": booking.get("booking_amount") or booking.get("total_tariff") or 0,
-            "Advance Amount": booking.get("total_payment_made") or booking.get("advance_amount") or 0,
-            "Balance Due": booking.get("balance_due") or 0,
-            "Booking Status": booking.get("booking_status", "") or "",
-            "Remarks": booking.get("remarks", "") or "",
-        })
-    df = pd.DataFrame(df_data, columns=columns)
-    for col in ['Guest Name', 'Mobile No', 'Room No', 'Remarks']:
-        if col in df.columns:
-            df[col] = df[col].apply(lambda x: f'<span title="{x}">{x}</span>' if pd.notna(x) and str(x).strip() else x)
+TABLE_COLUMNS = [
+    "Source", "Booking ID", "Guest Name", "Mobile No", "Check-in Date", "Check-out Date", "Room No",
+    "Advance MOP", "Balance MOP", "Total Tariff", "Advance Amount", "Balance Due",
+    "Booking Status", "Remarks"
+]
+TITLED_COLUMNS = ["Guest Name", "Mobile No", "Room No", "Remarks"]
+AMOUNT_COLUMNS = ["Total Tariff", "Advance Amount", "Balance Due"]
+EDIT_PAGES = {"online": "Edit Online Reservations", "direct": "Edit Reservations"}
+
+def _field(raw, *names, default=""):
+    """Vectorized `b.get(a) or b.get(b) or default` over the raw booking columns."""
+    result = pd.Series(default, index=raw.index, dtype=object)
+    for name in reversed(names):
+        if name in raw.columns:
+            col = raw[name]
+            truthy = col.notna() & col.ne("") & col.ne(0)       # NaN: key missing from the row
+            result = col.where(truthy, result)
+    return result
+
+def _parse_dates(col):
+    """safe_date_parse over a column, parsing each distinct value once."""
+    parsed = {v: safe_date_parse(v) for v in col.dropna().unique()}
+    return col.map(parsed)
+
+def _text_cells(col):
+    """Plain text cells, HTML-escaped; missing values are blank."""
+    return col.astype(str).map(html.escape).where(col.notna(), "")
+
+def _amount_cells(col):
+    """Amounts to 2 decimals; a value that is not a number is shown as text."""
+    numbers = pd.to_numeric(col, errors="coerce")
+    return pd.Series([f"{n:.2f}" if n == n else html.escape(str(v)) for v, n in zip(col, numbers)],
+                     index=col.index, dtype=object)
+
+def bookings_table_frame(online_bookings, direct_bookings):
+    """DMS table cells (TABLE_COLUMNS, HTML ready strings) for a list of bookings, built column-wise.
+
+    Also carries the parsed stay dates as check_in / check_out (datetime64) so a
+    month frame can be sliced per day.
+    """
+    raw = pd.DataFrame(list(online_bookings) + list(direct_bookings), dtype=object)
+    if raw.empty:
+        return pd.DataFrame(columns=TABLE_COLUMNS + ["check_in", "check_out"])
+    source = pd.Series(["online"] * len(online_bookings) + ["direct"] * len(direct_bookings), index=raw.index)
+    booking_id = _text_cells(_field(raw, "booking_id", "id"))
+    check_in = _parse_dates(_field(raw, "check_in", default=None))
+    check_out = _parse_dates(_field(raw, "check_out", default=None))
+
+    df = pd.DataFrame({
+        "Source": source.str.capitalize(),
+        "Booking ID": '<a href="?page=' + source.map(EDIT_PAGES) + "&booking_id=" + booking_id + '" target="_self">' + booking_id + "</a>",
+        "Guest Name": _text_cells(_field(raw, "guest_name", "name")),
+        "Mobile No": _text_cells(_field(raw, "guest_phone", "mobile_no")),
+        "Check-in Date": check_in.map(lambda d: str(d) if d else ""),
+        "Check-out Date": check_out.map(lambda d: str(d) if d else ""),
+        "Room No": _text_cells(_field(raw, "room_no")),
+        "Advance MOP": _text_cells(_field(raw, "advance_mop")),
+        "Balance MOP": _text_cells(_field(raw, "balance_mop")),
+        "Total Tariff": _amount_cells(_field(raw, "booking_amount", "total_tariff", default=0)),
+        "Advance Amount": _amount_cells(_field(raw, "total_payment_made", "advance_amount", default=0)),
+        "Balance Due": _amount_cells(_field(raw, "balance_due", default=0)),
+        "Booking Status": _text_cells(_field(raw, "booking_status")),
+        "Remarks": _text_cells(_field(raw, "remarks")),
+    })
+    for col in TITLED_COLUMNS:
+        text = df[col]
+        df[col] = text.where(text.str.strip() == "", '<span title="' + text + '">' + text + "</span>")
+    df["check_in"] = pd.to_datetime(check_in)
+    df["check_out"] = pd.to_datetime(check_out)
     return df
 
-@st.cache_data(ttl=300)
-def cached_load_online_reservations():
-    return load_online_reservations_from_supabase()
+_HTML_HEAD = (
+    '<table border="1" class="dataframe">\n  <thead>\n    <tr style="text-align: right;">\n'
+    + "".join(f"      <th>{col}</th>\n" for col in TABLE_COLUMNS)
+    + "    </tr>\n  </thead>\n  <tbody>\n"
+)
+_HTML_TAIL = "  </tbody>\n</table>"
 
-@st.cache_data(ttl=300)
-def cached_load_direct_reservations():
-    return load_direct_reservations_from_supabase()
+def day_table_html(frame, rows):
+    """HTML table of the rows selected by mask `rows` (cells are already formatted)."""
+    body = np.full(int(rows.sum()), "    <tr>\n", dtype=object)
+    for col in TABLE_COLUMNS:
+        body = body + "      <td>" + frame[col].to_numpy(dtype=object)[rows] + "</td>\n"
+    return _HTML_HEAD + "".join(body + "    </tr>\n") + _HTML_TAIL
+
+def create_bookings_table(bookings):
+    online = [b for b in bookings if b.get("source", "online") == "online"]
+    direct = [b for b in bookings if b.get("source", "online") != "online"]
+    return bookings_table_frame(online, direct)[TABLE_COLUMNS]
+
+class DmsBookings:
+    """The bookings DMS shows (should_show_in_dms), as one table frame built per load.
+
+    The loaded rows are never modified: a direct booking's plan_status is read
+    as its booking status on a copy, and property names are mapped into the
+    frame's `property` column. `frame` holds the TABLE_COLUMNS cells plus
+    property, source and the parsed check_in / check_out; it is shared and must
+    not be modified.
+    """
+
+    def __init__(self, online_bookings, direct_bookings):
+        self.online_count = len(online_bookings)
+        self.direct_count = len(direct_bookings)
+        self.properties = set()
+        shown = {"online": [], "direct": []}
+        props = []
+        for source, rows, prop_field in (("online", online_bookings, "property"), ("direct", direct_bookings, "property_name")):
+            for row in rows:
+                prop = row.get(prop_field)
+                if prop is not None:
+                    prop = property_mapping.get(prop, prop)
+                    self.properties.add(prop)
+                b = dict(row, booking_status=row["plan_status"]) if source == "direct" and "plan_status" in row else row
+                if should_show_in_dms(b):
+                    shown[source].append(b)
+                    props.append(prop)
+        self.frame = bookings_table_frame(shown["online"], shown["direct"])
+        self.frame["property"] = props
+        self.frame["source"] = ["online"] * len(shown["online"]) + ["direct"] * len(shown["direct"])
+        self._check_in = self.frame["check_in"].to_numpy()
+        self._check_out = self.frame["check_out"].to_numpy()
+
+    def property_rows(self, prop):
+        """Mask of the property's bookings."""
+        return (self.frame["property"] == prop).to_numpy()
+
+    def staying_on(self, day):
+        """Mask of the bookings with `day` inside [check_in, check_out)."""
+        night = np.datetime64(day)
+        return (self._check_in <= night) & (night < self._check_out)
+
+    def __len__(self):
+        return self.online_count + self.direct_count
+
+@tagged_cache(ttl=300, tags=lambda scope=None: {"table": BOOKING_TABLES, **scope_tags(scope)}, stale_ttl=120)
+def load_dms_bookings(scope=None):
+    return DmsBookings(load_online_reservations_from_supabase(scope), load_direct_reservations_from_supabase(scope))
 
 def show_dms():
     st.title("Daily Management Status")
 
     if st.button("Refresh Bookings"):
-        st.cache_data.clear()
+        load_dms_bookings.forget(user_scope())
         st.success("Cache cleared! Refreshing bookings...")
         st.rerun()
 
@@ -224,35 +316,21 @@ def show_dms():
     month = st.selectbox("Select Month", list(range(1, 13)), index=date.today().month - 1)
 
     # Load ALL bookings without date restrictions
-    online_bookings = cached_load_online_reservations()
-    direct_bookings = cached_load_direct_reservations()
+    try:
+        bookings = load_dms_bookings(user_scope())
+    except Exception as e:
+        st.error(f"Error loading reservations: {e}")
+        return
 
     # Debug info to see what's being loaded
-    st.info(f"Total records loaded: Online={len(online_bookings)}, Direct={len(direct_bookings)}")
-
-    # Map plan_status → booking_status
-    for b in direct_bookings:
-        if "plan_status" in b:
-            b["booking_status"] = b["plan_status"]
-
-    # Normalize property names
-    for b in online_bookings:
-        if "property" in b:
-            b["property"] = property_mapping.get(b["property"], b["property"])
-    for b in direct_bookings:
-        if "property_name" in b:
-            b["property_name"] = property_mapping.get(b["property_name"], b["property_name"])
-
-    if not online_bookings and not direct_bookings:
+    st.info(f"Total records loaded: Online={bookings.online_count}, Direct={bookings.direct_count}")
+
+    if not len(bookings):
         st.info("No reservations available.")
         return
 
     # Get all properties
-    online_df = pd.DataFrame(online_bookings)
-    direct_df = pd.DataFrame(direct_bookings)
-    online_props = sorted(online_df["property"].dropna().unique().tolist()) if "property" in online_df.columns else []
-    direct_props = sorted(direct_df["property_name"].dropna().unique().tolist()) if "property_name" in direct_df.columns else []
-    all_properties = sorted(list(set(online_props + direct_props)))
+    all_properties = sorted(bookings.properties)
     all_properties = filter_active_properties(all_properties, year, month)
 
     if not all_properties:
@@ -262,24 +340,24 @@ def show_dms():
     st.subheader("Pending, Follow-up, ON_HOLD & Confirmed (Not Paid) Bookings")
     st.markdown(TABLE_CSS, unsafe_allow_html=True)
 
+    month_dates = generate_month_dates(year, month)
+    staying = {day: bookings.staying_on(day) for day in month_dates}
+    online = (bookings.frame["source"] == "online").to_numpy()
+
     for prop in all_properties:
         with st.expander(f"{prop}", expanded=False):
-            month_dates = generate_month_dates(year, month)
-
-            # Filter only relevant bookings using the correct logic
-            relevant_online = [b for b in online_bookings if b.get("property") == prop and should_show_in_dms(b)]
-            relevant_direct = [b for b in direct_bookings if b.get("property_name") == prop and should_show_in_dms(b)]
-            relevant_all = relevant_online + relevant_direct
+            in_prop = bookings.property_rows(prop)
+            n_online = int((in_prop & online).sum())
+            n_direct = int(in_prop.sum()) - n_online
 
-            st.info(f"Total bookings requiring follow-up: **{len(relevant_all)}** (Online: {len(relevant_online)}, Direct: {len(relevant_direct)})")
+            st.info(f"Total bookings requiring follow-up: **{n_online + n_direct}** (Online: {n_online}, Direct: {n_direct})")
 
             for day in month_dates:
-                daily_bookings = filter_bookings_for_day(relevant_all, day)
+                rows = in_prop & staying[day]
                 st.subheader(f"{prop} - {day.strftime('%B %d, %Y')}")
 
-                if daily_bookings:
-                    df = create_bookings_table(daily_bookings)
-                    table_html = df.to_html(escape=False, index=False)
+                if rows.any():
+                    table_html = day_table_html(bookings.frame, rows)
                     st.markdown(f'<div class="custom-scrollable-table">{table_html}</div>', unsafe_allow_html=True)
                 else:
                     st.info("No bookings requiring follow-up on this day.")
@@ -3,6 +3,9 @@ import pandas as pd
 from datetime import date
 from supabase import create_client, Client
 from utils import safe_int, safe_float
+from booking_cache import invalidate_booking
+import availability
+from property_scope import user_scope, query_names, scope_properties
 
 # Initialize Supabase client
 try:
@@ -16,6 +19,14 @@ def update_online_reservation_in_supabase(booking_id, updated_reservation):
     try:
         # Trim booking_id before update
         booking_id = booking_id.strip()
+
+        # Refuse to put a confirmed booking into a room that is already taken
+        has_conflict, conflict_msg = availability.check_room_conflicts(
+            updated_reservation.get("property"), updated_reservation.get("room_no"), updated_reservation.get("check_in"),
+            updated_reservation.get("check_out"), updated_reservation.get("booking_status"), exclude_booking_id=booking_id)
+        if has_conflict:
+            st.error(f"❌ Overbooking: {conflict_msg}")
+            return False
         
         # Truncate and trim string fields to prevent database errors
         truncated_reservation = updated_reservation.copy()
@@ -80,14 +91,20 @@ def load_online_reservations_from_supabase():
         st.error(f"Error loading online reservations: {e}")
         return []
 
-def search_booking_by_id(booking_id):
-    """Search for a specific booking by ID directly from database with fuzzy matching."""
+def search_booking_by_id(booking_id, scope=None):
+    """Search for a specific booking by ID directly from database with fuzzy matching.
+
+    With a property scope (property_scope) only bookings of those properties are found.
+    """
+    def bookings():
+        query = supabase.table("online_reservations").select("*")
+        return query.in_("property", query_names(scope)) if scope is not None else query
+
     try:
         # First, try exact match with trimmed input
         booking_id_clean = booking_id.strip()
         
-        response = supabase.table("online_reservations")\
-            .select("*")\
+        response = bookings()\
             .eq("booking_id", booking_id_clean)\
             .execute()
         
@@ -95,8 +112,7 @@ def search_booking_by_id(booking_id):
             return response.data[0]
         
         # If exact match fails, try case-insensitive LIKE search
-        response = supabase.table("online_reservations")\
-            .select("*")\
+        response = bookings()\
             .ilike("booking_id", f"%{booking_id_clean}%")\
             .execute()
         
@@ -198,7 +214,7 @@ def show_edit_online_reservations(selected_booking_id=None):
     # Handle search
     if search_button and search_booking_id:
         with st.spinner(f"Searching for booking {search_booking_id}..."):
-            found_booking = search_booking_by_id(search_booking_id)
+            found_booking = search_booking_by_id(search_booking_id, user_scope())
             if found_booking:
                 # Store the found booking in session state for editing
                 st.session_state.current_edit_reservation = found_booking
@@ -227,7 +243,7 @@ def show_edit_online_reservations(selected_booking_id=None):
         booking_made_on = st.date_input("Booking Made On", value=date.fromisoformat(reservation.get("booking_made_on")) if reservation.get("booking_made_on") else None)
 
     # Add Transfer to Property dropdown (optional)
-    properties = load_properties()
+    properties = scope_properties(load_properties(), user_scope())
     if _date.today() >= PROPERTY_CLOSURE_DATE:
         properties = [p for p in properties if p not in CLOSED_PROPERTIES]
     transfer_property = st.selectbox("Transfer to Property (Optional)", ["None"] + properties)
@@ -400,6 +416,11 @@ def show_edit_online_reservations(selected_booking_id=None):
                 "room_revenue": room_revenue
             }
             if update_online_reservation_in_supabase(reservation["booking_id"], updated_reservation):
+                # Both the old and the new stay may be cached
+                invalidate_booking("online_reservations", reservation.get("property"), reservation.get("check_in"), reservation.get("check_out"))
+                invalidate_booking("online_reservations", updated_reservation.get("property"), updated_reservation.get("check_in"), updated_reservation.get("check_out"))
+                availability.record_booking("online_reservations", reservation["booking_id"], updated_reservation.get("property"), updated_reservation.get("room_no"),
+                                            updated_reservation.get("check_in"), updated_reservation.get("check_out"), updated_reservation.get("booking_status"))
                 # Update the in-session copy
                 st.session_state.current_edit_reservation = {**reservation, **updated_reservation}
                 st.success(f"✅ Reservation {reservation['booking_id']} updated successfully!")
@@ -408,6 +429,8 @@ def show_edit_online_reservations(selected_booking_id=None):
         if st.session_state.get('role') == "Management":
             if st.button("🗑️ Delete Reservation", use_container_width=True):
                 if delete_online_reservation_in_supabase(reservation["booking_id"]):
+                    invalidate_booking("online_reservations", reservation.get("property"), reservation.get("check_in"), reservation.get("check_out"))
+                    availability.forget_booking("online_reservations", reservation["booking_id"])
                     st.success(f"🗑️ Reservation {reservation['booking_id']} deleted successfully!")
                     # Clear the current edit reservation
                     if 'current_edit_reservation' in st.session_state:
@@ -4,12 +4,17 @@ from supabase import create_client, Client
 from datetime import date
 import calendar
 import pandas as pd
-from typing import Any, List, Dict, Optional
+from typing import Any, List, Dict
 import logging
 import io
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
+from booking_records import BookingRecord, RoomAssignment, filter_bookings_for_day
+from booking_frame import stay_nights
+from booking_cache import invalidate_booking, month_bounds
+from booking_partitions import load_bookings_range, invalidate_partitions
+from property_scope import scope_properties, user_scope
 
 # ────── Logging ──────
 logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -160,135 +165,24 @@ def load_properties() -> List[str]:
         logging.error(f"load_properties: {e}")
         return []
 
-@st.cache_data(ttl=600)
-def load_combined_bookings(property: str, start_date: date, end_date: date) -> List[Dict]:
-    prop = normalize_property(property)
-    query_props = [prop] + reverse_mapping.get(prop, [])
-    combined: List[Dict] = []
-
-    try:
-        q = supabase.table("reservations")\
-            .select("*")\
-            .in_("property_name", query_props)\
-            .lte("check_in", str(end_date))\
-            .gte("check_out", str(start_date))\
-            .in_("plan_status", ["Confirmed", "Completed"])\
-            .in_("payment_status", ["Partially Paid", "Fully Paid"])\
-            .execute()
-        for r in q.data or []:
-            norm = normalize_booking(r, is_online=False)
-            if norm: combined.append(norm)
-    except Exception as e:
-        logging.error(f"Direct query error: {e}")
-
-    try:
-        q = supabase.table("online_reservations")\
-            .select("*")\
-            .in_("property", query_props)\
-            .lte("check_in", str(end_date))\
-            .gte("check_out", str(start_date))\
-            .in_("booking_status", ["Confirmed", "Completed"])\
-            .in_("payment_status", ["Partially Paid", "Fully Paid"])\
-            .execute()
-        for r in q.data or []:
-            norm = normalize_booking(r, is_online=True)
-            if norm: combined.append(norm)
-    except Exception as e:
-        logging.error(f"Online query error: {e}")
-
-    return combined
-
-# ═══════════════════════════════════════════════════════════════════════════
-# Normalize booking
-# ═══════════════════════════════════════════════════════════════════════════
-def normalize_booking(row: Dict, is_online: bool) -> Optional[Dict]:
-    try:
-        bid = sanitize_string(row.get("booking_id") or row.get("id"))
-        status_field = "booking_status" if is_online else "plan_status"
-        status = sanitize_string(row.get(status_field, "")).title()
-        if status not in ["Confirmed", "Completed"]: return None
-        pay = sanitize_string(row.get("payment_status")).title()
-        if pay not in ["Fully Paid", "Partially Paid"]: return None
-        ci = date.fromisoformat(row["check_in"])
-        co = date.fromisoformat(row["check_out"])
-        if co <= ci: return None
-        days_field = "room_nights" if is_online else "no_of_days"
-        days = safe_int(row.get(days_field)) or (co - ci).days
-        if days <= 0: days = 1
-        p = normalize_property(row.get("property_name") if not is_online else row.get("property"))
-
-        if is_online:
-            total_amount = safe_float(row.get("booking_amount")) or 0.0
-            gst = safe_float(row.get("gst")) or 0.0
-            tax = safe_float(row.get("ota_tax")) or 0.0
-            commission = safe_float(row.get("ota_commission")) or 0.0
-            room_charges = total_amount - gst - tax
-        else:
-            total_amount = safe_float(row.get("total_tariff")) or 0.0
-            gst = tax = commission = 0.0
-            room_charges = total_amount
-
-        receivable = total_amount - gst - tax - commission
-        if receivable < 0: receivable = 0.0
-
-        identifier = row.get("id") if is_online else row.get("booking_id")
-        identifier_str = str(identifier) if identifier is not None else ""
-
-        return {
-            "type": "online" if is_online else "direct",
-            "property": p,
-            "booking_id": bid,
-            "guest_name": sanitize_string(row.get("guest_name")),
-            "mobile_no": sanitize_string(row.get("guest_phone") if is_online else row.get("mobile_no")),
-            "total_pax": safe_int(row.get("total_pax")),
-            "check_in": str(ci),
-            "check_out": str(co),
-            "days": days,
-            "room_no": sanitize_string(row.get("room_no")).title(),
-            "mob": sanitize_string(row.get("mode_of_booking") if is_online else row.get("mob")),
-            "plan": sanitize_string(row.get("rate_plans") if is_online else row.get("breakfast")),
-            "room_charges": room_charges,
-            "gst": gst,
-            "tax": tax,
-            "total_amount": total_amount,
-            "commission": commission,
-            "receivable": receivable,
-            "advance": safe_float(row.get("total_payment_made") if is_online else row.get("advance_amount")),
-            "advance_mop": sanitize_string(row.get("advance_mop")),
-            "balance": safe_float(row.get("balance_due") if is_online else row.get("balance_amount")),
-            "balance_mop": sanitize_string(row.get("balance_mop")),
-            "booking_status": status,
-            "payment_status": pay,
-            "submitted_by": sanitize_string(row.get("submitted_by")),
-            "modified_by": sanitize_string(row.get("modified_by")),
-            "remarks": sanitize_string(row.get("remarks")),
-            "advance_remarks": sanitize_string(row.get("advance_remarks", "")),
-            "balance_remarks": sanitize_string(row.get("balance_remarks", "")),
-            "accounts_status": sanitize_string(row.get("accounts_status", "Pending")).title(),
-            "ota_booking_id": sanitize_string(row.get("ota_booking_id", "")) if is_online else "",
-            "db_id": identifier_str,
-        }
-    except Exception as e:
-        logging.warning(f"normalize failed: {e}")
-        return None
+def load_combined_bookings(property: str, start_date: date, end_date: date) -> List[BookingRecord]:
+    # Served from the shared (property, month) partitions; Confirmed/Completed + paid only
+    return load_bookings_range(normalize_property(property), start_date, end_date)
 
 # ═══════════════════════════════════════════════════════════════════════════
 # Filter & Assign
 # ═══════════════════════════════════════════════════════════════════════════
-def filter_bookings_for_day(bookings: List[Dict], day: date) -> List[Dict]:
-    return [b.copy() for b in bookings if date.fromisoformat(b["check_in"]) <= day < date.fromisoformat(b["check_out"])]
-
-def assign_inventory_numbers(daily_bookings: List[Dict], property: str):
+def assign_inventory_numbers(daily_bookings: List[BookingRecord], property: str):
     assigned, over = [], []
     inv = PROPERTY_INVENTORY.get(property, {"all": []})["all"]
     inv_lookup = {i.strip().lower(): i for i in inv}
 
     room_bookings = {}
-    sorted_bookings = sorted(daily_bookings, key=lambda x: (x.get("check_in", ""), x.get("booking_id", "")))
+    sorted_bookings = sorted(daily_bookings, key=lambda x: (x.check_in, x.booking_id))
 
     for b in sorted_bookings:
-        raw_room = str(b.get("room_no", "") or "").strip()
-        booking_id = b.get("booking_id", "Unknown")
+        raw_room = str(b.room_no or "").strip()
+        booking_id = b.booking_id
 
         if not raw_room:
             over.append(b)
@@ -316,29 +210,28 @@ def assign_inventory_numbers(daily_bookings: List[Dict], property: str):
         for room in assigned_rooms:
             room_bookings[room] = booking_id
 
-        days = max(b.get("days", 1), 1)
-        receivable = b.get("receivable", 0.0)
+        receivable = b.receivable
         num_rooms = len(assigned_rooms)
-        total_nights = days * num_rooms
+        total_nights = stay_nights(b.check_in, b.check_out) * num_rooms
         per_night = receivable / total_nights if total_nights > 0 else 0.0
-        base_pax = b["total_pax"] // num_rooms if num_rooms else 0
-        rem = b["total_pax"] % num_rooms if num_rooms else 0
+        base_pax = b.total_pax // num_rooms if num_rooms else 0
+        rem = b.total_pax % num_rooms if num_rooms else 0
 
         for idx, room in enumerate(assigned_rooms):
-            nb = b.copy()
-            nb["assigned_room"] = room
-            nb["room_no"] = room
-            nb["total_pax"] = base_pax + (1 if idx < rem else 0)
-            nb["per_night"] = per_night
-            nb["is_primary"] = (idx == 0)
-            assigned.append(nb)
+            assigned.append(RoomAssignment(
+                booking=b,
+                assigned_room=room,
+                total_pax=base_pax + (1 if idx < rem else 0),
+                per_night=per_night,
+                is_primary=(idx == 0),
+            ))
 
     return assigned, over
 
 # ═══════════════════════════════════════════════════════════════════════════
 # Build Table
 # ═══════════════════════════════════════════════════════════════════════════
-def create_inventory_table(assigned: List[Dict], over: List[Dict], prop: str, target_date: date):
+def create_inventory_table(assigned: List[RoomAssignment], over: List[BookingRecord], prop: str, target_date: date):
     visible_cols = ["Inventory No","Room No","Booking ID","OTA Booking ID","Guest Name","Mobile No","Total Pax",
                     "Check In","Check Out","Days","MOB","Room Charges","GST","TAX","Total","Commission",
                     "Hotel Receivable","Per Night","Advance","Advance Mop","Balance","Balance Mop",
@@ -353,55 +246,54 @@ def create_inventory_table(assigned: List[Dict], over: List[Dict], prop: str, ta
         row = {c: "" for c in visible_cols + hidden_cols}
         row["Inventory No"] = inventory_no
 
-        match = next((a for a in assigned if str(a.get("assigned_room", "")).strip() == inventory_no.strip()), None)
+        match = next((a for a in assigned if str(a.assigned_room).strip() == inventory_no.strip()), None)
 
         if match:
-            check_in_date = date.fromisoformat(match["check_in"])
-            is_check_in_day = (target_date == check_in_date)
-            is_primary = match.get("is_primary", False)
-
-            row["type"] = match["type"]
-            row["db_id"] = str(match["db_id"]) if match["db_id"] else ""
-            row["Room No"] = match["room_no"]
-            row["Booking ID"] = match["booking_id"]
-            row["OTA Booking ID"] = match.get("ota_booking_id", "")
-            row["Guest Name"] = match["guest_name"]
-            row["Mobile No"] = match["mobile_no"]
-            row["Total Pax"] = match["total_pax"]
-            row["Check In"] = match["check_in"]
-            row["Check Out"] = match["check_out"]
-            row["Days"] = match["days"]
-            row["MOB"] = match["mob"]
-            row["Per Night"] = f"{match.get('per_night', 0):.2f}"
-
-            if is_check_in_day and is_primary:
-                row["Room Charges"] = f"{match.get('room_charges', 0):.2f}"
-                row["GST"] = f"{match.get('gst', 0):.2f}"
-                row["TAX"] = f"{match.get('tax', 0):.2f}"
-                row["Total"] = f"{match.get('total_amount', 0):.2f}"
-                row["Commission"] = f"{match.get('commission', 0):.2f}"
-                row["Hotel Receivable"] = f"{match.get('receivable', 0):.2f}"
-                row["Advance"] = f"{match.get('advance', 0):.2f}"
-                row["Advance Mop"] = match.get("advance_mop", "")
-                row["Balance"] = f"{match.get('balance', 0):.2f}"
-                row["Balance Mop"] = match.get("balance_mop", "")
-                row["Plan"] = match["plan"]
-                row["Booking Status"] = match["booking_status"]
-                row["Payment Status"] = match["payment_status"]
-                row["Submitted by"] = match["submitted_by"]
-                row["Modified by"] = match["modified_by"]
-                row["Remarks"] = match.get("remarks", "")
-
-            row["Advance Remarks"] = match.get("advance_remarks", "")
-            row["Balance Remarks"] = match.get("balance_remarks", "")
-            row["Accounts Status"] = match.get("accounts_status", "Pending")
+            b = match.booking
+            is_check_in_day = (target_date == b.check_in)
+
+            row["type"] = b.type
+            row["db_id"] = str(b.db_id) if b.db_id else ""
+            row["Room No"] = match.assigned_room
+            row["Booking ID"] = b.booking_id
+            row["OTA Booking ID"] = b.ota_booking_id
+            row["Guest Name"] = b.guest_name
+            row["Mobile No"] = b.mobile_no
+            row["Total Pax"] = match.total_pax
+            row["Check In"] = str(b.check_in)
+            row["Check Out"] = str(b.check_out)
+            row["Days"] = b.days
+            row["MOB"] = b.mob
+            row["Per Night"] = f"{match.per_night:.2f}"
+
+            if is_check_in_day and match.is_primary:
+                row["Room Charges"] = f"{b.room_charges:.2f}"
+                row["GST"] = f"{b.gst:.2f}"
+                row["TAX"] = f"{b.tax:.2f}"
+                row["Total"] = f"{b.total_amount:.2f}"
+                row["Commission"] = f"{b.commission:.2f}"
+                row["Hotel Receivable"] = f"{b.receivable:.2f}"
+                row["Advance"] = f"{b.advance:.2f}"
+                row["Advance Mop"] = b.advance_mop
+                row["Balance"] = f"{b.balance:.2f}"
+                row["Balance Mop"] = b.balance_mop
+                row["Plan"] = b.plan
+                row["Booking Status"] = b.booking_status
+                row["Payment Status"] = b.payment_status
+                row["Submitted by"] = b.submitted_by
+                row["Modified by"] = b.modified_by
+                row["Remarks"] = b.remarks
+
+            row["Advance Remarks"] = b.advance_remarks
+            row["Balance Remarks"] = b.balance_remarks
+            row["Accounts Status"] = b.accounts_status
 
         rows.append(row)
 
     if over:
         over_row = {c: "" for c in visible_cols + hidden_cols}
         over_row["Inventory No"] = "Overbookings"
-        over_row["Room No"] = ", ".join(f"{b.get('room_no','')} ({b.get('booking_id','')})" for b in over)
+        over_row["Room No"] = ", ".join(f"{b.room_no} ({b.booking_id})" for b in over)
         rows.append(over_row)
 
     df = pd.DataFrame(rows, columns=visible_cols + hidden_cols)
@@ -486,7 +378,7 @@ def extract_stats_from_table(df: pd.DataFrame, mob_types: List[str]) -> Dict:
 # ═══════════════════════════════════════════════════════════════════════════
 # Monthly Report Excel Generator — ONE single sheet
 # ═══════════════════════════════════════════════════════════════════════════
-def generate_monthly_report(props_list: List[str], year: int, month: int, bookings_by_prop: Dict[str, List[Dict]]) -> bytes:
+def generate_monthly_report(props_list: List[str], year: int, month: int, bookings_by_prop: Dict[str, List[BookingRecord]]) -> bytes:
     """
     All properties × all dates in a single sheet.
     Columns: Property, Date, + all 30 booking columns.
@@ -612,11 +504,18 @@ def show_daily_status():
     st.title("Daily Status Dashboard")
 
     if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
+        # Only drop the property/month currently on screen
+        view_prop = st.session_state.get("view_prop")
+        if view_prop and view_prop != "— Select Property —":
+            start, end = month_bounds(st.session_state.get("view_year", date.today().year),
+                                      st.session_state.get("view_month", date.today().month))
+            invalidate_partitions(view_prop, start, end)
+        else:
+            invalidate_partitions()
         st.rerun()
 
     today = date.today()
-    props = load_properties()
+    props = scope_properties(load_properties(), user_scope())
     if not props:
         st.info("No properties found.")
         return
@@ -820,7 +719,11 @@ def show_daily_status():
     prop = selected_prop
     month_dates = [date(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1)]
     start, end = month_dates[0], month_dates[-1]
-    bookings = load_combined_bookings(prop, start, end)
+    try:
+        bookings = load_combined_bookings(prop, start, end)
+    except Exception as e:
+        st.error(f"Error loading bookings for {prop}: {e}")
+        return
 
     # MTD aggregation
     mtd = {m: {"rooms": 0, "value": 0.0, "comm": 0.0} for m in mob_types}
@@ -955,7 +858,15 @@ def show_daily_status():
 
                         if success:
                             st.success(f"✅ Saved {success} booking(s)!")
-                            st.cache_data.clear()
+                            # Drop only the months these bookings occupy for this property
+                            stays = {b.booking_id: b for b in bookings}
+                            for bid in processed_bookings:
+                                b = stays.get(bid)
+                                table = "online_reservations" if b is not None and b.type == "online" else "reservations"
+                                if b is not None:
+                                    invalidate_booking(table, prop, b.check_in, b.check_out)
+                                else:
+                                    invalidate_booking(table, prop, start, end)
                             st.rerun()
                         if error:
                             st.error(f"⚠️ {error} failed")
@@ -0,0 +1,220 @@
+# night_aggregates.py - Per-(property, night) report aggregates with dirty-cell tracking
+#
+# Editing one booking used to make every report recompute whole months. The
+# aggregate stores here keep one row of metrics per (property, night) cell,
+# computed from the revenue ledger. After each ledger sync the ledger reports
+# the cells whose rows changed (the old and new nights of every edited, added or
+# deleted booking); only those cells are marked dirty and recomputed on the
+# next read. Cells never computed before are filled in on first read.
+#
+# Nights closed by the night audit (night_audit) are frozen: their cells are
+# read from the audit snapshot and never recomputed, so only open nights are
+# computed live.
+
+import json
+import sqlite3
+import logging
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import pandas as pd
+
+from booking_cache import canonical_property
+from booking_store import STORE_PATH
+from revenue_ledger import Cell, booking_amount, current_ledger, ledger_slice, load_ledger, on_change
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+FROZEN_TABLE = "night_audit_cells"
+
+# -------------------------- Frozen cells --------------------------
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{FROZEN_TABLE}" '
+        "(store TEXT, property TEXT, night TEXT, metrics TEXT, closed_at REAL, PRIMARY KEY (store, property, night))"
+    )
+    return conn
+
+def _read_frozen(store: str, cells: Set[Cell]) -> Dict[Cell, dict]:
+    nights = [n for _, n in cells]
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                f'SELECT property, night, metrics FROM "{FROZEN_TABLE}" WHERE store = ? AND night BETWEEN ? AND ?',
+                (store, min(nights).strftime("%Y-%m-%d"), max(nights).strftime("%Y-%m-%d")),
+            ).fetchall()
+    except Exception as e:
+        logging.warning(f"night_aggregates: could not read frozen cells for {store}: {e}")
+        return {}
+    frozen = {}
+    for prop, night, metrics in rows:
+        cell = (prop, pd.Timestamp(night))
+        if cell in cells:
+            frozen[cell] = json.loads(metrics)
+    return frozen
+
+def _write_frozen(store: str, values: Dict[Cell, dict]) -> int:
+    """Insert frozen cells; cells already frozen are left untouched."""
+    now = time.time()
+    try:
+        with _connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                f'INSERT OR IGNORE INTO "{FROZEN_TABLE}" (store, property, night, metrics, closed_at) VALUES (?, ?, ?, ?, ?)',
+                [(store, p, n.strftime("%Y-%m-%d"), json.dumps(m), now) for (p, n), m in values.items()],
+            )
+            return conn.total_changes - before
+    except Exception as e:
+        logging.warning(f"night_aggregates: could not freeze cells for {store}: {e}")
+        return 0
+
+def _delete_frozen(cells: Set[Cell]) -> None:
+    with _connect() as conn:
+        conn.executemany(f'DELETE FROM "{FROZEN_TABLE}" WHERE property = ? AND night = ?',
+                         [(p, n.strftime("%Y-%m-%d")) for p, n in cells])
+
+# -------------------------- Store --------------------------
+class AggregateStore:
+    """Metrics per (property, night), recomputed only for cells marked dirty."""
+
+    def __init__(self, name: str, compute: Callable[[pd.DataFrame], pd.DataFrame], columns: List[str]):
+        self.name = name
+        self.compute = compute          # ledger rows of some cells -> metrics indexed (property, night)
+        self.columns = columns
+        self.recomputed = 0             # cells recomputed by the last get()
+        self._values: Dict[Cell, tuple] = {}
+        self._computed: Set[Cell] = set()
+        self._frozen: Set[Cell] = set()
+        self._dirty: Set[Cell] = set()
+        self._lock = threading.Lock()
+
+    def mark_dirty(self, cells: Optional[Iterable[Cell]]) -> None:
+        """Mark cells for recomputation; None drops everything. Frozen cells are never recomputed."""
+        with self._lock:
+            if cells is None:
+                self._values.clear()
+                self._computed.clear()
+                self._frozen.clear()
+                self._dirty.clear()
+            else:
+                self._dirty.update(c for c in cells if c in self._computed and c not in self._frozen)
+
+    def _load_frozen(self, cells: Set[Cell]) -> None:
+        for cell, metrics in _read_frozen(self.name, cells).items():
+            if not all(c in metrics for c in self.columns):
+                continue    # frozen under an older column set; computed live instead
+            values = tuple(metrics[c] for c in self.columns)
+            if any(values):
+                self._values[cell] = values
+            self._computed.add(cell)
+            self._frozen.add(cell)
+
+    def _refresh(self, needed: Set[Cell], ledger: pd.DataFrame) -> None:
+        props = {p for p, _ in needed}
+        nights = [n for _, n in needed]
+        rows = ledger_slice(props, min(nights).date(), max(nights).date(), ledger=ledger)
+        rows = rows[pd.MultiIndex.from_arrays([rows["property"], rows["night"]]).isin(needed)]
+        metrics = self.compute(rows) if not rows.empty else pd.DataFrame(columns=self.columns)
+        values = dict(zip(metrics.index, metrics[self.columns].itertuples(index=False, name=None)))
+        for cell in needed:
+            if cell in values:
+                self._values[cell] = values[cell]
+            else:
+                self._values.pop(cell, None)
+        self._computed |= needed
+        self._dirty -= needed
+
+    def get(self, properties: Iterable[str], start: date, end: date) -> pd.DataFrame:
+        """Metrics for every property and night start..end, indexed (property, night); empty cells are 0."""
+        load_ledger()   # syncs the ledger, which marks changed cells dirty
+        props = [canonical_property(p) for p in properties]
+        cells = [(p, n) for p in props for n in pd.date_range(start, end)]
+        today = pd.Timestamp(date.today())
+        with self._lock:
+            # The latest published ledger, never synced here: a sync notifies mark_dirty, which
+            # takes this lock. Cells changed by a later sync are marked dirty once it is released.
+            ledger = current_ledger()
+            closed = {c for c in cells if c[1] < today and c not in self._computed}
+            if closed:
+                self._load_frozen(closed)
+            needed = {c for c in cells if c not in self._computed or c in self._dirty}
+            self.recomputed = len(needed)
+            if needed:
+                self._refresh(needed, ledger)
+            zero = (0.0,) * len(self.columns)
+            data = [self._values.get(c, zero) for c in cells]
+        if needed:
+            logging.info(f"night_aggregates: {self.name} recomputed {len(needed)} of {len(cells)} cells")
+        return pd.DataFrame(data, columns=self.columns,
+                            index=pd.MultiIndex.from_tuples(cells, names=["property", "night"]))
+
+    def freeze(self, properties: Iterable[str], start: date, end: date, skip: Iterable[Cell] = ()) -> int:
+        """Write the cells of closed nights start..end, except `skip`, to the audit snapshot; returns cells written."""
+        metrics = self.get(properties, start, end)
+        skip = set(skip)
+        values = {cell: dict(zip(self.columns, map(float, row)))
+                  for cell, row in zip(metrics.index, metrics.itertuples(index=False, name=None)) if cell not in skip}
+        written = _write_frozen(self.name, values)
+        with self._lock:
+            self._frozen.update(values)
+            self._dirty.difference_update(values)
+        return written
+
+    def thaw(self, cells: Set[Cell]) -> None:
+        """Forget cells so the next read recomputes or re-reads them."""
+        with self._lock:
+            self._computed -= cells
+            self._frozen -= cells
+            self._dirty -= cells
+            for cell in cells:
+                self._values.pop(cell, None)
+
+_stores: List[AggregateStore] = []
+
+def register_store(store: AggregateStore) -> AggregateStore:
+    _stores.append(store)
+    return store
+
+def registered_stores() -> List[AggregateStore]:
+    return list(_stores)
+
+def mark_dirty(cells: Optional[Iterable[Cell]]) -> None:
+    """Mark cells dirty in every registered store (None: everything)."""
+    cells = None if cells is None else set(cells)
+    for store in _stores:
+        store.mark_dirty(cells)
+
+on_change(mark_dirty)
+
+def unfreeze(cells: Iterable[Cell]) -> None:
+    """Drop (property, night) cells from the audit snapshot and from every store."""
+    cells = set(cells)
+    _delete_frozen(cells)
+    for store in _stores:
+        store.thaw(cells)
+
+# -------------------------- Shared metrics --------------------------
+def assigned_rows(rows: pd.DataFrame) -> pd.DataFrame:
+    """Rows of bookings whose rooms are all in the inventory (the rest were never assigned a room).
+
+    A booking holds the same rooms every night, so this is exact within a single night.
+    """
+    return rows[rows.groupby(["tbl", "source_key"])["in_inventory"].transform("all").astype(bool)]
+
+def check_in_primaries(rows: pd.DataFrame) -> pd.DataFrame:
+    return rows[rows["is_primary"] & (rows["night"] == rows["check_in"])]
+
+def nightly_revenue_metrics(rows: pd.DataFrame) -> pd.DataFrame:
+    """Rooms sold and receivable per night; GST/commission counted on the check-in night (NRD rules).
+
+    Rooms sold counts distinct rooms, so a double-booked room is sold once (as in Summary and Target).
+    """
+    assigned = assigned_rows(rows)
+    metrics = assigned.groupby(["property", "night"]).agg(rooms_sold=("room", "nunique"), receivable=("receivable", "sum"))
+    first = check_in_primaries(assigned)
+    full = pd.DataFrame({"gst": booking_amount(first, "gst"), "commission": booking_amount(first, "commission")})
+    metrics = metrics.join(full.groupby([first["property"], first["night"]]).sum(), how="outer")
+    return metrics.fillna(0.0)
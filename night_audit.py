@@ -0,0 +1,236 @@
+# night_audit.py - Night audit close: immutable daily snapshots of past nights
+#
+# Past months used to be recomputed from raw bookings whenever NRD or Summary
+# was opened for them. The audit runs after each day closes (from the cache
+# warm-up) and, for every night not yet closed up to yesterday:
+#   - writes one night_audit row per active property: rooms available/sold,
+#     occupancy, ARR, receivable, GST, commission and the MOP split of payments
+#     taken on check-in
+#   - freezes the cells of every report aggregate store (night_aggregates), so
+#     historical NRD/Summary views read the snapshot and only open nights are
+#     computed live.
+# Rows are written with INSERT OR IGNORE and never updated: a booking edited
+# after its night was closed does not change the audited figures.
+#
+# A (property, night) selling more rooms than it has available is not closed:
+# it is logged, recorded in night_audit_pending and stays computed live; each
+# close_nights() run tries the pending cells again. Cells audited as oversold
+# (rows written before NRD counted distinct rooms) are re-closed the same way.
+# reclose_nights() deletes the audited cells of a night range and closes them
+# again from the current bookings.
+
+import json
+import sqlite3
+import logging
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from booking_cache import month_bounds, months_between
+from booking_store import STORE_PATH
+from revenue_ledger import booking_amount, ledger_slice, load_ledger
+from night_aggregates import assigned_rows, check_in_primaries, nightly_revenue_metrics, registered_stores, unfreeze
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+AUDIT_TABLE = "night_audit"
+PENDING_TABLE = "night_audit_pending"    # cells left open because they sold more rooms than available
+
+Cell = Tuple[str, pd.Timestamp]          # (property, night)
+
+_lock = threading.Lock()
+
+# -------------------------- SQLite persistence --------------------------
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{AUDIT_TABLE}" (property TEXT, night TEXT, rooms_available INTEGER, '
+        "rooms_sold INTEGER, occupancy REAL, arr REAL, receivable REAL, gst REAL, commission REAL, "
+        "mop_split TEXT, closed_at REAL, PRIMARY KEY (property, night))"
+    )
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{PENDING_TABLE}" (property TEXT, night TEXT, PRIMARY KEY (property, night))')
+    return conn
+
+def last_closed_night() -> Optional[date]:
+    try:
+        with _connect() as conn:
+            row = conn.execute(f'SELECT MAX(night) FROM "{AUDIT_TABLE}"').fetchone()
+    except Exception as e:
+        logging.warning(f"night_audit: could not read audit state: {e}")
+        return None
+    return date.fromisoformat(row[0]) if row and row[0] else None
+
+def load_closed_days(properties: Optional[Iterable[str]] = None, start: Optional[date] = None,
+                     end: Optional[date] = None) -> pd.DataFrame:
+    """Audited rows (mop_split decoded to a dict), optionally filtered by property and night range."""
+    with _connect() as conn:
+        df = pd.read_sql_query(f'SELECT * FROM "{AUDIT_TABLE}" ORDER BY night, property', conn)
+    df["night"] = pd.to_datetime(df["night"], format="%Y-%m-%d")
+    df["mop_split"] = df["mop_split"].map(json.loads)
+    if properties is not None:
+        df = df[df["property"].isin(set(properties))]
+    if start is not None:
+        df = df[df["night"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["night"] <= pd.Timestamp(end)]
+    return df.reset_index(drop=True)
+
+def _cells(rows) -> Set[Cell]:
+    return {(prop, pd.Timestamp(night)) for prop, night in rows}
+
+def _retry_cells() -> Set[Cell]:
+    """Cells to close again: pending ones and audited ones that sold more rooms than available."""
+    try:
+        with _connect() as conn:
+            return _cells(conn.execute(
+                f'SELECT property, night FROM "{AUDIT_TABLE}" WHERE rooms_sold > rooms_available '
+                f'UNION SELECT property, night FROM "{PENDING_TABLE}"'
+            ).fetchall())
+    except Exception as e:
+        logging.warning(f"night_audit: could not read cells to re-close: {e}")
+        return set()
+
+def _audited_cells(start: date, end: date) -> Set[Cell]:
+    with _connect() as conn:
+        return _cells(conn.execute(
+            f'SELECT property, night FROM "{AUDIT_TABLE}" WHERE night BETWEEN ? AND ? '
+            f'UNION SELECT property, night FROM "{PENDING_TABLE}" WHERE night BETWEEN ? AND ?',
+            (str(start), str(end)) * 2,
+        ).fetchall())
+
+def _delete_closed(cells: Set[Cell]) -> None:
+    with _connect() as conn:
+        conn.executemany(f'DELETE FROM "{AUDIT_TABLE}" WHERE property = ? AND night = ?',
+                         [(p, n.strftime("%Y-%m-%d")) for p, n in cells])
+
+# -------------------------- Day close --------------------------
+def _rooms_available() -> Dict[str, int]:
+    from inventory import PROPERTY_INVENTORY
+    return {p: len([r for r in inv["all"] if not r.startswith(("Day Use", "No Show"))])
+            for p, inv in PROPERTY_INVENTORY.items()}
+
+def _mop_split(rows: pd.DataFrame) -> Dict[tuple, Dict[str, float]]:
+    """Advance/balance taken by check-in-night primaries, by standard MOP (Daily Status rules)."""
+    from inventory import mop_mapping
+    standard = {v: std for std, variants in mop_mapping.items() for v in variants}
+    first = check_in_primaries(assigned_rows(rows))
+    payments = pd.concat([
+        pd.DataFrame({"property": first["property"], "night": first["night"],
+                      "mop": first[f"{kind}_mop"].map(standard).where(first[f"{kind}_mop"] != ""),
+                      "amount": booking_amount(first, kind)})
+        for kind in ("advance", "balance")
+    ])
+    payments = payments[payments["mop"].notna() & (payments["amount"] != 0)]
+    split: Dict[tuple, Dict[str, float]] = {}
+    for (prop, night, mop), amount in payments.groupby(["property", "night", "mop"])["amount"].sum().items():
+        split.setdefault((prop, night), {})[mop] = float(amount)
+    return split
+
+def _close_range(properties: List[str], start: date, end: date) -> int:
+    rows = ledger_slice(properties, start, end)
+    metrics = nightly_revenue_metrics(rows) if not rows.empty else pd.DataFrame()
+    values = metrics.to_dict("index") if not metrics.empty else {}
+    mops = _mop_split(rows) if not rows.empty else {}
+    available = _rooms_available()
+    now = time.time()
+    records = []
+    oversold = set()
+    for night in pd.date_range(start, end):
+        for prop in properties:
+            m = values.get((prop, night), {})
+            sold = int(m.get("rooms_sold", 0))
+            rooms = available.get(prop, 0)
+            if sold > rooms:
+                oversold.add((prop, night))
+                continue
+            receivable = float(m.get("receivable", 0.0))
+            records.append((
+                prop, night.strftime("%Y-%m-%d"), rooms, sold,
+                sold / rooms * 100 if rooms else 0.0,
+                receivable / sold if sold else 0.0,
+                receivable, float(m.get("gst", 0.0)), float(m.get("commission", 0.0)),
+                json.dumps(mops.get((prop, night), {})), now,
+            ))
+    with _connect() as conn:
+        before = conn.total_changes
+        conn.executemany(f'INSERT OR IGNORE INTO "{AUDIT_TABLE}" VALUES ({",".join("?" * 11)})', records)
+        written = conn.total_changes - before
+        conn.executemany(f'DELETE FROM "{PENDING_TABLE}" WHERE property = ? AND night = ?', [r[:2] for r in records])
+        conn.executemany(f'INSERT OR IGNORE INTO "{PENDING_TABLE}" VALUES (?, ?)',
+                         [(p, n.strftime("%Y-%m-%d")) for p, n in oversold])
+    for store in registered_stores():
+        store.freeze(properties, start, end, skip=oversold)
+    if oversold:
+        logging.warning(f"night_audit: not closed, more rooms sold than available: "
+                        f"{', '.join(f'{p} {n:%Y-%m-%d}' for p, n in sorted(oversold))}")
+    return written
+
+def _close_months(start: date, through: date) -> int:
+    import inventory
+    written = 0
+    for month in months_between(start, through):
+        year, mon = int(month[:4]), int(month[5:])
+        first, last_day = month_bounds(year, mon)
+        props = inventory.filter_active_properties(sorted(inventory.PROPERTY_INVENTORY), year, mon)
+        written += _close_range(props, max(first, start), min(last_day, through))
+    return written
+
+def _reclose(cells: Set[Cell]) -> int:
+    """Delete the audit rows and frozen cells of `cells` and close them again, night by night."""
+    _delete_closed(cells)
+    unfreeze(cells)
+    written = 0
+    for night in sorted({n for _, n in cells}):
+        props = sorted(p for p, n in cells if n == night)
+        written += _close_range(props, night.date(), night.date())
+    return written
+
+def _register_stores() -> None:
+    # Imported so their aggregate stores are registered and frozen too
+    import inventory
+    import nrd_report
+    import summary_report
+    try:
+        import target_achievement_report
+    except Exception as e:
+        logging.warning(f"night_audit: target store not registered: {e}")
+
+def reclose_nights(start: date, end: date) -> int:
+    """Delete the audited (and pending) cells of nights start..end and close them again from the
+    current bookings. Returns audit rows written."""
+    _register_stores()
+    with _lock:
+        written = _reclose(_audited_cells(start, end))
+    logging.info(f"night_audit: re-closed {start} .. {end} ({written} rows)")
+    return written
+
+def close_nights(through: Optional[date] = None) -> int:
+    """Close every night after the last audited one up to `through` (default: yesterday).
+
+    The first run starts at the earliest night in the ledger. Returns audit rows written.
+    Pending cells and audited cells that sold more rooms than available are re-closed first.
+    """
+    _register_stores()
+    through = through or date.today() - timedelta(days=1)
+    with _lock:
+        retry = _retry_cells()
+        if retry:
+            written = _reclose(retry)
+            logging.info(f"night_audit: re-closed {len(retry)} pending/oversold cells ({written} rows)")
+        last = last_closed_night()
+        if last is not None:
+            start = last + timedelta(days=1)
+        else:
+            ledger = load_ledger()
+            if ledger.empty:
+                return 0
+            start = ledger["night"].min().date()
+        if start > through:
+            return 0
+        started = time.monotonic()
+        written = _close_months(start, through)
+    logging.info(f"night_audit: closed {start} .. {through} ({written} rows) in {time.monotonic() - started:.2f}s")
+    return written
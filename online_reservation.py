@@ -4,6 +4,10 @@ from datetime import datetime
 import re
 from supabase import create_client, Client
 from utils import safe_int, safe_float, get_property_name
+from booking_cache import invalidate_booking, read_only_rows, tagged_cache
+from property_scope import user_scope, query_names, scope_tags
+import availability
+from cache_warmup import start_warmup
 
 # Initialize Supabase client
 try:
@@ -89,15 +93,42 @@ def insert_online_reservation(reservation):
         st.error(f"Error inserting online reservation: {e}")
         return False
 
-def load_online_reservations_from_supabase():
-    """Load online reservations from Supabase."""
+def fetch_online_reservations(scope=None):
+    """Online reservations (all, or the scope's properties) from Supabase; raises on failure (no st.* calls)."""
+    query = supabase.table("online_reservations").select("*")
+    if scope is not None:
+        query = query.in_("property", query_names(scope))
+    response = query.order("check_in", desc=True).execute()
+    return response.data if response.data else []
+
+def load_online_reservations_from_supabase(scope=None):
+    """Load online reservations (all, or the scope's properties) from Supabase."""
     try:
-        response = supabase.table("online_reservations").select("*").order("check_in", desc=True).execute()
-        return response.data if response.data else []
+        return fetch_online_reservations(scope)
     except Exception as e:
         st.error(f"Error loading online reservations: {e}")
         return []
 
+@tagged_cache(ttl=300, tags=lambda scope=None: {"table": "online_reservations", **scope_tags(scope)}, stale_ttl=120)
+def cached_online_reservations(scope=None):
+    """fetch_online_reservations through the shared cache, one entry per property scope, as read-only rows."""
+    return read_only_rows(fetch_online_reservations(scope))
+
+def ensure_online_reservations():
+    """The session's online reservations, loaded on first use (login no longer loads them).
+
+    After a load error this returns an empty list and leaves the session unloaded,
+    so the next run retries: callers use the return value, not the session state.
+    """
+    if st.session_state.get("online_reservations") is None:
+        try:
+            # Sessions append to their list, so each gets its own list of the shared rows
+            st.session_state.online_reservations = list(cached_online_reservations(user_scope()))
+        except Exception as e:
+            st.error(f"Error loading online reservations: {e}")
+            return []
+    return st.session_state.online_reservations
+
 def process_and_sync_excel(uploaded_file):
     """Process the uploaded Excel file and sync to DB."""
     try:
@@ -108,6 +139,7 @@ def process_and_sync_excel(uploaded_file):
         # Get existing booking_ids
         existing_reservations = load_online_reservations_from_supabase()
         existing_ids = {r["booking_id"] for r in existing_reservations}
+        session_reservations = ensure_online_reservations()
         inserted = 0
         skipped = 0
         for _, row in df.iterrows():
@@ -200,7 +232,10 @@ def process_and_sync_excel(uploaded_file):
             }
             if insert_online_reservation(reservation):
                 inserted += 1
-                st.session_state.online_reservations.append(reservation)
+                invalidate_booking("online_reservations", reservation.get("property"), reservation.get("check_in"), reservation.get("check_out"))
+                availability.record_booking("online_reservations", reservation.get("booking_id"), reservation.get("property"), reservation.get("room_no"),
+                                            reservation.get("check_in"), reservation.get("check_out"), reservation.get("booking_status"))
+                session_reservations.append(reservation)
         return inserted, skipped
     except Exception as e:
         st.error(f"Error processing Excel file: {e}")
@@ -209,8 +244,7 @@ def process_and_sync_excel(uploaded_file):
 def show_online_reservations():
     """Display online reservations page with upload and view."""
     st.title("🔥 Online Reservations")
-    if 'online_reservations' not in st.session_state:
-        st.session_state.online_reservations = load_online_reservations_from_supabase()
+    reservations = ensure_online_reservations()
 
     # Upload and Sync section
     st.subheader("Upload and Sync Excel File")
@@ -221,15 +255,17 @@ def show_online_reservations():
                 inserted, skipped = process_and_sync_excel(uploaded_file)
                 st.success(f"✅ Synced successfully! Inserted: {inserted}, Skipped (duplicates): {skipped}")
                 # Reload to reflect changes
-                st.session_state.online_reservations = load_online_reservations_from_supabase()
+                reservations = st.session_state.online_reservations = load_online_reservations_from_supabase(user_scope())
+                if inserted:
+                    start_warmup()
 
      # View section
     st.subheader("View Online Reservations")
-    if not st.session_state.online_reservations:
+    if not reservations:
         st.info("No online reservations available.")
         return
 
-    df = pd.DataFrame(st.session_state.online_reservations)
+    df = pd.DataFrame(reservations)
     
     # ✅ OPTIMIZED: Add pagination controls
     col_page1, col_page2, col_page3 = st.columns([1, 2, 1])
@@ -0,0 +1,122 @@
+# pace_forecast.py - Pace-based month-end revenue forecast for Target Achievement
+#
+# Target Achievement compares revenue on the books with MONTHLY_TARGETS. The
+# forecast projects where each property will finish the month from how fast
+# revenue was picked up in past months:
+#   - pickup history: every confirmed, paid booking of the last HISTORY_MONTHS
+#     complete months, with its check-in month, total amount and the day it was
+#     booked (booking_date / booking_made_on) as an offset from the month start
+#   - for the forecast month, "today" is the same kind of offset; in each
+#     history month the share of final revenue that was already booked at that
+#     offset is the pace
+#   - on the books / pace over the history months gives one candidate month-end
+#     figure per month: the median is the forecast, the 10th-90th percentiles
+#     the range
+# Properties with fewer than MIN_HISTORY_MONTHS usable months use the pace of
+# all properties together. History is built once from the booking snapshots
+# and cached; the forecast itself is a few grouped operations on it.
+
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from booking_cache import BOOKING_TABLES, PROPERTY_ALIASES, tagged_cache
+from booking_frame import combine_bookings_frames
+from booking_store import load_snapshot
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+HISTORY_MONTHS = 12
+MIN_HISTORY_MONTHS = 3
+RANGE_PERCENTILES = (10, 90)
+
+FORECAST_COLUMNS = ["property", "on_the_books", "forecast", "low", "high", "months_used"]
+
+# -------------------------- Pickup history --------------------------
+@tagged_cache(ttl=1800, tags=lambda current_month: {"table": BOOKING_TABLES})
+def load_pickup_history(current_month: str) -> pd.DataFrame:
+    """Bookings checking in during the HISTORY_MONTHS months before `current_month` ("YYYY-MM").
+
+    Columns: property, month (first day of the check-in month), offset (days from
+    the month start to the booking day, negative when booked before the month)
+    and value (total amount).
+    """
+    frame = combine_bookings_frames(load_snapshot("reservations"), load_snapshot("online_reservations"),
+                                    mapping=PROPERTY_ALIASES)
+    frame = frame[frame["booked_on"].notna() & frame["check_in"].notna()]
+    month = frame["check_in"].dt.to_period("M")
+    current = pd.Period(current_month, "M")
+    frame = frame[(month < current) & (month >= current - HISTORY_MONTHS)]
+    month_start = frame["check_in"].dt.to_period("M").dt.start_time
+    history = pd.DataFrame({
+        "property": frame["property"].to_numpy(),
+        "month": month_start.to_numpy(),
+        "offset": (frame["booked_on"] - month_start).dt.days.to_numpy(),
+        "value": frame["total_amount"].astype(float).to_numpy(),
+    })
+    logging.info(f"pace_forecast: pickup history for {current_month}: {len(history)} bookings")
+    return history
+
+def pace_ratios(history: pd.DataFrame, offset: int) -> pd.DataFrame:
+    """Share of each (property, month)'s final revenue already booked `offset` days from its start."""
+    keys = ["property", "month"]
+    final = history.groupby(keys)["value"].sum()
+    booked = history[history["offset"] <= offset].groupby(keys)["value"].sum().reindex(final.index, fill_value=0.0)
+    ratios = (booked / final).rename("pace").reset_index()
+    return ratios[(final.to_numpy() > 0) & (ratios["pace"] > 0)]
+
+def _pooled_ratios(history: pd.DataFrame, offset: int) -> np.ndarray:
+    pooled = history.assign(property="")
+    return pace_ratios(pooled, offset)["pace"].to_numpy()
+
+# -------------------------- Forecast --------------------------
+def forecast_month_end(props: List[str], year: int, month: int, on_the_books: Dict[str, float],
+                       today: Optional[date] = None) -> pd.DataFrame:
+    """Month-end revenue forecast per property, with a low/high range.
+
+    `on_the_books` is the revenue of the month already booked (Target's "Achieved").
+    Once the month is over the forecast is the achieved figure. Without any
+    history the forecast is the on-the-books figure and the range is empty.
+    """
+    today = today or date.today()
+    start = pd.Timestamp(year, month, 1)
+    otb = pd.Series({p: float(on_the_books.get(p, 0.0)) for p in props}, dtype=float)
+    result = pd.DataFrame({"property": props, "on_the_books": otb.to_numpy()})
+    if pd.Timestamp(today) > start + pd.offsets.MonthEnd(0):
+        return result.assign(forecast=result["on_the_books"], low=result["on_the_books"],
+                             high=result["on_the_books"], months_used=0)[FORECAST_COLUMNS]
+
+    offset = (pd.Timestamp(today) - start).days
+    history = load_pickup_history(f"{year}-{month:02d}")
+    # For a future month the window reaches past today; those months have no final figure yet
+    history = history[history["month"] < pd.Timestamp(today.year, today.month, 1)]
+    ratios = pace_ratios(history[history["property"].isin(props)], offset)
+    counts = ratios.groupby("property").size().reindex(props, fill_value=0)
+
+    own = ratios[ratios["property"].map(counts).to_numpy() >= MIN_HISTORY_MONTHS]
+    pooled = _pooled_ratios(history, offset)
+    short = [p for p in props if counts[p] < MIN_HISTORY_MONTHS]
+    if len(pooled) and short:
+        own = pd.concat([own, pd.DataFrame({
+            "property": np.repeat(short, len(pooled)),
+            "pace": np.tile(pooled, len(short)),
+        })], ignore_index=True)
+
+    candidates = own.assign(candidate=otb.reindex(own["property"]).to_numpy() / own["pace"].to_numpy())
+    grouped = candidates.groupby("property")["candidate"]
+    low_q, high_q = (q / 100 for q in RANGE_PERCENTILES)
+    stats = pd.DataFrame({
+        "forecast": grouped.median(),
+        "low": grouped.quantile(low_q),
+        "high": grouped.quantile(high_q),
+        "months_used": grouped.size(),
+    }).reindex(props)
+
+    result["forecast"] = np.maximum(stats["forecast"].fillna(otb).to_numpy(), otb.to_numpy())
+    result["low"] = np.maximum(stats["low"].to_numpy(), otb.to_numpy())
+    result["high"] = np.maximum(stats["high"].to_numpy(), otb.to_numpy())
+    result["months_used"] = stats["months_used"].fillna(0).astype(int).to_numpy()
+    return result[FORECAST_COLUMNS]
@@ -0,0 +1,201 @@
+# pickup_report.py - Pickup / booking-pace matrix (booking date × stay date)
+#
+# The date-wise reports look at one date axis at a time: when bookings were
+# made, or when guests check in. The pickup report crosses the two: room-nights
+# and revenue per property by booking date × stay date, plus, for every future
+# stay date, what is on the books and what was picked up in the last N days.
+#
+# Bookings are read once from the booking snapshots (booking_store) into a
+# compact cached frame. Each grid is then a single np.bincount over the stay
+# nights of the bookings that fall in the window, so a 90 × 90 window for all
+# properties is a few array operations.
+
+import calendar
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from booking_cache import BOOKING_TABLES, PROPERTY_ALIASES, tagged_cache
+from booking_frame import combine_bookings_frames
+from booking_store import expire_snapshot, load_snapshot
+from property_scope import Scope, scope_tags, user_scope
+
+WINDOW_DAYS = 90
+PICKUP_DAYS_OPTIONS = [1, 3, 7, 14, 30]
+GRID_METRICS = {"Room Nights": "room_nights", "Revenue": "revenue"}
+
+# -------------------------- Bookings --------------------------
+@tagged_cache(ttl=300, tags=lambda scope=None: {"table": BOOKING_TABLES, **scope_tags(scope)}, stale_ttl=120)
+def load_pickup_bookings(scope: Scope = None) -> pd.DataFrame:
+    """Confirmed, paid bookings with a booking date: property, booked_on, check_in, nights, rooms, revenue.
+
+    With a property scope (property_scope) only those properties' bookings are kept.
+    """
+    frame = combine_bookings_frames(load_snapshot("reservations"), load_snapshot("online_reservations"),
+                                    mapping=PROPERTY_ALIASES)
+    frame = frame[frame["booked_on"].notna() & frame["check_in"].notna()]
+    if scope is not None:
+        frame = frame[frame["property"].isin(scope)]
+    rooms = frame["room_no"].astype(str).str.split(",").map(lambda parts: max(sum(1 for r in parts if r.strip()), 1))
+    return pd.DataFrame({
+        "property": frame["property"].to_numpy(),
+        "booked_on": frame["booked_on"].to_numpy(),
+        "check_in": frame["check_in"].to_numpy(),
+        "nights": (frame["check_out"] - frame["check_in"]).dt.days.to_numpy(),
+        "rooms": rooms.to_numpy(),
+        "revenue": frame["total_amount"].astype(float).to_numpy(),
+    })
+
+# -------------------------- Grids --------------------------
+def _stay_grid(bookings: pd.DataFrame, properties: List[str], rows: np.ndarray, n_rows: int,
+               stay_start: date, stay_end: date) -> Dict[str, np.ndarray]:
+    """Room-nights and revenue per (property, row, stay date) for stay_start..stay_end.
+
+    `rows` gives each booking's row in the grid (-1: leave the booking out).
+    """
+    n_stay = (stay_end - stay_start).days + 1
+    shape = (len(properties), n_rows, n_stay)
+    prop_index = {p: i for i, p in enumerate(properties)}
+    prop = bookings["property"].map(prop_index).fillna(-1).to_numpy(dtype="int64")
+    ci = (bookings["check_in"] - pd.Timestamp(stay_start)).dt.days.to_numpy()
+    nights = bookings["nights"].to_numpy(dtype="int64")
+    first = np.maximum(ci, 0)
+    last = np.minimum(ci + nights, n_stay)     # exclusive
+    keep = (prop >= 0) & (rows >= 0) & (last > first)
+    prop, row, first, count = prop[keep], rows[keep], first[keep], (last - first)[keep]
+    rooms = bookings["rooms"].to_numpy(dtype="float64")[keep]
+    nightly = bookings["revenue"].to_numpy(dtype="float64")[keep] / nights[keep]
+
+    rep = np.repeat(np.arange(len(prop)), count)
+    offset = np.arange(len(rep)) - np.repeat(np.cumsum(count) - count, count)
+    flat = (prop[rep] * n_rows + row[rep]) * n_stay + first[rep] + offset
+    size = int(np.prod(shape))
+    return {
+        "room_nights": np.bincount(flat, weights=rooms[rep], minlength=size).reshape(shape),
+        "revenue": np.bincount(flat, weights=nightly[rep], minlength=size).reshape(shape),
+    }
+
+def _booked_day(bookings: pd.DataFrame, start: date) -> np.ndarray:
+    return (bookings["booked_on"] - pd.Timestamp(start)).dt.days.to_numpy()
+
+def pickup_matrix(bookings: pd.DataFrame, properties: List[str], book_start: date, book_end: date,
+                  stay_start: date, stay_end: date) -> Dict[str, np.ndarray]:
+    """Grids of shape (property, booking date, stay date) over the two windows."""
+    day = _booked_day(bookings, book_start)
+    n_book = (book_end - book_start).days + 1
+    rows = np.where((day >= 0) & (day < n_book), day, -1)
+    return _stay_grid(bookings, properties, rows, n_book, stay_start, stay_end)
+
+def pickup_by_stay_date(bookings: pd.DataFrame, properties: List[str], stay_start: date, stay_end: date,
+                        as_of: date, days: int) -> Dict[str, np.ndarray]:
+    """Per (property, stay date): on the books as of `as_of` and picked up in its last `days` days.
+
+    Keys: room_nights, revenue (on the books) and pickup_room_nights, pickup_revenue.
+    """
+    day = _booked_day(bookings, as_of)       # 0 = booked on as_of, negative = earlier
+    booked = day <= 0
+    rows = np.where(booked, np.where(day > -days, 1, 0), -1)
+    grid = _stay_grid(bookings, properties, rows, 2, stay_start, stay_end)
+    result = {metric: values.sum(axis=1) for metric, values in grid.items()}
+    result.update({f"pickup_{metric}": values[:, 1, :] for metric, values in grid.items()})
+    return result
+
+# -------------------------- Frames --------------------------
+def pickup_table(pickup: Dict[str, np.ndarray], prop_rows: List[int], stay_dates: List[date], days: int) -> pd.DataFrame:
+    """One row per stay date, summed over the selected property rows."""
+    df = pd.DataFrame({
+        "Stay Date": stay_dates,
+        "Day": [d.strftime("%a") for d in stay_dates],
+        "On The Books (RN)": pickup["room_nights"][prop_rows].sum(axis=0).astype(int),
+        "On The Books (₹)": pickup["revenue"][prop_rows].sum(axis=0).round(0).astype(int),
+        f"Pickup {days}d (RN)": pickup["pickup_room_nights"][prop_rows].sum(axis=0).astype(int),
+        f"Pickup {days}d (₹)": pickup["pickup_revenue"][prop_rows].sum(axis=0).round(0).astype(int),
+    })
+    return df
+
+def matrix_frame(grid: np.ndarray, prop_rows: List[int], book_dates: List[date], stay_dates: List[date]) -> pd.DataFrame:
+    """Booking dates as rows, stay dates as columns; empty booking dates are dropped."""
+    values = grid[prop_rows].sum(axis=0)
+    df = pd.DataFrame(values.round(0).astype(int), index=[d.strftime("%d %b") for d in book_dates],
+                      columns=[d.strftime("%d %b") for d in stay_dates])
+    df.index.name = "Booked On"
+    return df[values.any(axis=1)]
+
+# -------------------------- UI --------------------------
+def show_pickup_report():
+    """Pickup report: on the books and recent pickup per stay date, and the booking × stay matrix"""
+    st.title("📈 Pickup Report")
+    st.markdown("**Room nights and revenue by booking date × stay date (confirmed, paid bookings).**")
+
+    if st.button("Refresh Bookings"):
+        load_pickup_bookings.forget(user_scope())
+        expire_snapshot("reservations")
+        expire_snapshot("online_reservations")
+        st.success("Cache cleared! Refreshing bookings...")
+        st.rerun()
+
+    today = date.today()
+    bookings = load_pickup_bookings(user_scope())
+    all_properties = sorted(bookings["property"].unique())
+    if not all_properties:
+        st.info("No bookings with a booking date available.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        selected_property = st.selectbox("Filter by Property", ["All Properties"] + all_properties)
+    with col2:
+        stay_start = st.date_input("Stay dates from", value=today)
+        stay_days = st.slider("Stay window (days)", 7, WINDOW_DAYS, WINDOW_DAYS)
+    with col3:
+        as_of = st.date_input("As of", value=today)
+        days = st.selectbox("Pickup in the last", PICKUP_DAYS_OPTIONS, index=2, format_func=lambda d: f"{d} day(s)")
+
+    stay_end = stay_start + timedelta(days=stay_days - 1)
+    stay_dates = [stay_start + timedelta(days=i) for i in range(stay_days)]
+    prop_rows = list(range(len(all_properties))) if selected_property == "All Properties" else [all_properties.index(selected_property)]
+
+    # Pickup per stay date
+    st.subheader(f"Pickup for stays {stay_start.strftime('%d %b %Y')} - {stay_end.strftime('%d %b %Y')}")
+    pickup = pickup_by_stay_date(bookings, all_properties, stay_start, stay_end, as_of, days)
+    df_pickup = pickup_table(pickup, prop_rows, stay_dates, days)
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1: st.metric("On The Books (RN)", f"{df_pickup['On The Books (RN)'].sum():,}")
+    with c2: st.metric("On The Books", f"₹{df_pickup['On The Books (₹)'].sum():,}")
+    with c3: st.metric(f"Pickup {days}d (RN)", f"{df_pickup[f'Pickup {days}d (RN)'].sum():,}")
+    with c4: st.metric(f"Pickup {days}d", f"₹{df_pickup[f'Pickup {days}d (₹)'].sum():,}")
+
+    st.dataframe(df_pickup, use_container_width=True, hide_index=True)
+    st.download_button(
+        "📥 Download Pickup (CSV)",
+        df_pickup.to_csv(index=False).encode("utf-8"),
+        f"pickup_{stay_start.strftime('%Y_%m_%d')}_{days}d.csv",
+        "text/csv",
+    )
+
+    # Booking date × stay date matrix
+    st.markdown("---")
+    book_start = as_of - timedelta(days=WINDOW_DAYS - 1)
+    st.subheader(f"Booking Pace Matrix (booked {book_start.strftime('%d %b')} - {as_of.strftime('%d %b %Y')})")
+    metric = st.radio("Show", list(GRID_METRICS), horizontal=True)
+    matrix = pickup_matrix(bookings, all_properties, book_start, as_of, stay_start, stay_end)
+    book_dates = [book_start + timedelta(days=i) for i in range(WINDOW_DAYS)]
+    df_matrix = matrix_frame(matrix[GRID_METRICS[metric]], prop_rows, book_dates, stay_dates)
+
+    if df_matrix.empty:
+        st.info("No bookings made in this window for these stay dates.")
+    else:
+        st.dataframe(df_matrix, use_container_width=True)
+        st.download_button(
+            "📥 Download Matrix (CSV)",
+            df_matrix.to_csv().encode("utf-8"),
+            f"pickup_matrix_{calendar.month_abbr[stay_start.month]}_{stay_start.year}.csv",
+            "text/csv",
+        )
+
+if __name__ == "__main__":
+    show_pickup_report()
@@ -0,0 +1,60 @@
+# property_scope.py - Each user's assigned properties as a data-layer scope
+#
+# users.properties lists the properties a user works on, but every session used
+# to load every property's bookings, at login and in the reports. A scope is that
+# list as a sorted tuple of canonical property names (None: every property, for
+# the bootstrap Admin and users without a list). Loaders take the scope as an
+# argument, so it is
+#   - pushed into their queries: .in_() on the property column with every
+#     stored spelling of the names (PROPERTY_ALIASES), or a filter on the
+#     snapshot frame for snapshot-backed loaders
+#   - part of their cache key and property tags: users with the same properties
+#     share entries, and refreshing one property only drops the scopes holding it.
+# The scope is read from the session by the pages and passed down explicitly;
+# background threads (cache warm-up) have no session and load unscoped.
+
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import streamlit as st
+
+from booking_cache import PROPERTY_ALIASES, canonical_property
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+Scope = Optional[Tuple[str, ...]]
+
+# -------------------------- Scope --------------------------
+def scope_of(user_data: Optional[Dict[str, Any]]) -> Scope:
+    """Scope for a users row (its `properties` may be a list or a JSON string)."""
+    props = (user_data or {}).get("properties") or []
+    if isinstance(props, str):
+        try:
+            props = json.loads(props)
+        except json.JSONDecodeError:
+            logging.warning(f"property_scope: unreadable properties for {(user_data or {}).get('username')}")
+            props = []
+    if not isinstance(props, list) or not props:
+        return None
+    return tuple(sorted({canonical_property(p) for p in props if p}))
+
+def user_scope() -> Scope:
+    """Scope of the logged-in user."""
+    return scope_of(st.session_state.get("user_data"))
+
+# -------------------------- Filters --------------------------
+def query_names(scope: Scope) -> List[str]:
+    """Property names as they may be stored (canonical names and their aliases), for .in_() filters."""
+    return sorted(set(scope) | {alias for alias, name in PROPERTY_ALIASES.items() if name in scope})
+
+def in_scope(prop: str, scope: Scope) -> bool:
+    return scope is None or canonical_property(prop) in scope
+
+def scope_properties(properties: Iterable[str], scope: Scope) -> List[str]:
+    """The properties (in their order) the scope covers."""
+    return [p for p in properties if in_scope(p, scope)]
+
+def scope_tags(scope: Scope) -> Dict[str, List[str]]:
+    """Cache tags for a scoped load: the scope's properties, or none (all properties)."""
+    return {"property": list(scope)} if scope is not None else {}
@@ -0,0 +1,310 @@
+# revenue_ledger.py - Night-level revenue ledger shared by the reports
+#
+# Per-night receivable used to be worked out separately in each report
+# (inventory's per_night, summary's receivable_per_night, target's check-in day
+# attribution), each with a slightly different formula. Here every confirmed,
+# paid booking is exploded once into one row per (property, room, night)
+# carrying its share of the money columns, plus pax, MOB and the payment modes.
+# Reports group by property/night over the ledger instead of re-deriving the
+# figures.
+#
+# Shares are split evenly over the actual nights of the stay and the rooms of
+# the booking (booking_frame.stay_nights, as in Daily Status), so summing a
+# booking's rows gives back its totals. The ledger is
+# persisted next to the booking snapshots (booking_store) and kept current from
+# their watermarks: only bookings changed or deleted since the last sync are
+# re-exploded. A table without a watermark (updated_at not deployed yet) is
+# rebuilt once per process; after that its changed bookings are found by
+# comparing row hashes whenever the booking_store snapshot version moves.
+
+import sqlite3
+import logging
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from booking_frame import normalize_bookings_frame, stay_nights
+from booking_cache import PROPERTY_ALIASES, canonical_property
+from booking_store import (
+    STORE_PATH, SYNC_INTERVAL, SYNC_TABLES, WATERMARK_COLUMN, load_snapshot, snapshot_version, snapshot_watermark,
+)
+
+logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+LEDGER_TABLE = "ledger_nights"
+MONEY_COLUMNS = ["room_charges", "gst", "tax", "total_amount", "commission", "receivable", "advance", "balance"]
+LEDGER_COLUMNS = [
+    "tbl", "source_key", "booking_id", "type", "property", "room", "in_inventory", "is_primary",
+    "night", "check_in", "nights", "rooms", "pax", "mob", "advance_mop", "balance_mop",
+] + MONEY_COLUMNS
+
+_ledger: Optional[pd.DataFrame] = None
+_watermarks: Dict[str, Optional[str]] = {}
+_versions: Dict[str, int] = {}          # booking_store snapshot version last synced, per table
+_hashes: Dict[str, Dict[str, int]] = {}  # row hash by booking key, for tables without a watermark
+_synced_at = float("-inf")
+_lock = threading.Lock()
+
+Cell = Tuple[str, pd.Timestamp]      # (property, night)
+_listeners: List[Callable[[Optional[Set[Cell]]], None]] = []
+
+# -------------------------- Explode --------------------------
+def empty_ledger() -> pd.DataFrame:
+    df = pd.DataFrame({c: pd.Series(dtype=object) for c in LEDGER_COLUMNS})
+    df["night"] = pd.Series(dtype="datetime64[ns]")
+    df["check_in"] = pd.Series(dtype="datetime64[ns]")
+    return df
+
+def _room_list(room_no: str) -> List[str]:
+    rooms = [r.strip() for r in str(room_no or "").split(",") if r.strip()]
+    return rooms or [""]
+
+def _inventory_lookup(properties: Iterable[str]) -> Dict[tuple, str]:
+    from availability import property_rooms
+    return {(p, r.strip().lower()): r for p in properties for r in property_rooms(p)}
+
+def explode_bookings(frame: pd.DataFrame, table: str) -> pd.DataFrame:
+    """Normalized booking frame (booking_frame) -> one ledger row per (room, night)."""
+    if frame.empty:
+        return empty_ledger()
+    b = frame.reset_index(drop=True)
+    room_lists = b["room_no"].map(_room_list)
+    per_room = b.assign(
+        room=room_lists,
+        rooms=room_lists.str.len(),
+        nights=stay_nights(b["check_in"], b["check_out"]),
+    ).explode("room")
+    idx = per_room.groupby(level=0).cumcount().to_numpy()
+    per_room = per_room.reset_index(drop=True)
+
+    # Rooms are matched to the inventory spelling; pax is split over rooms as in inventory.py
+    lookup = _inventory_lookup(per_room["property"].unique())
+    matched = [lookup.get((p, r.lower())) for p, r in zip(per_room["property"], per_room["room"])]
+    per_room["in_inventory"] = [m is not None for m in matched]
+    per_room["room"] = [m if m is not None else r for m, r in zip(matched, per_room["room"])]
+    per_room["is_primary"] = idx == 0
+    pax, rooms = per_room["total_pax"].to_numpy(), per_room["rooms"].to_numpy()
+    per_room["pax"] = pax // rooms + (idx < pax % rooms)
+    per_room["tbl"] = table
+    per_room["source_key"] = per_room["db_id"]
+
+    nights = per_room["nights"].to_numpy()
+    rep = np.repeat(np.arange(len(per_room)), nights)
+    offset = np.arange(len(rep)) - np.repeat(np.cumsum(nights) - nights, nights)
+    out = per_room.iloc[rep].reset_index(drop=True)
+    out["night"] = out["check_in"] + pd.to_timedelta(offset, unit="D")
+    share = (out["nights"] * out["rooms"]).astype("float64")
+    for col in MONEY_COLUMNS:
+        out[col] = out[col] / share
+    return out[LEDGER_COLUMNS]
+
+def _concat(*frames: pd.DataFrame) -> pd.DataFrame:
+    frames = [f for f in frames if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else empty_ledger()
+
+def _explode_rows(table: str, rows: pd.DataFrame) -> pd.DataFrame:
+    frame = normalize_bookings_frame(rows, is_online=(table == "online_reservations"), mapping=PROPERTY_ALIASES)
+    return explode_bookings(frame, table)
+
+# -------------------------- SQLite persistence --------------------------
+_SQL_TYPES = {"in_inventory": "INTEGER", "is_primary": "INTEGER", "nights": "INTEGER", "rooms": "INTEGER", "pax": "INTEGER",
+              **{c: "REAL" for c in MONEY_COLUMNS}}
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS ledger_meta (tbl TEXT PRIMARY KEY, watermark TEXT, synced_at REAL)")
+    existing = [row[1] for row in conn.execute(f'PRAGMA table_info("{LEDGER_TABLE}")')]
+    if existing and existing != LEDGER_COLUMNS:
+        # Written by an older layout: drop it so the next sync rebuilds
+        conn.execute(f'DROP TABLE "{LEDGER_TABLE}"')
+        conn.execute("DELETE FROM ledger_meta")
+        conn.commit()
+    columns = ", ".join(f"{c} {_SQL_TYPES.get(c, 'TEXT')}" for c in LEDGER_COLUMNS)
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{LEDGER_TABLE}" ({columns})')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS ledger_key_idx ON "{LEDGER_TABLE}" (tbl, source_key)')
+    return conn
+
+def _read_persisted() -> tuple:
+    try:
+        with _connect() as conn:
+            meta = dict(conn.execute("SELECT tbl, watermark FROM ledger_meta").fetchall())
+            if not meta:
+                return empty_ledger(), {}
+            df = pd.read_sql_query(f'SELECT * FROM "{LEDGER_TABLE}"', conn)
+    except Exception as e:
+        logging.warning(f"revenue_ledger: could not read persisted ledger: {e}")
+        return empty_ledger(), {}
+    for col in ("night", "check_in"):
+        df[col] = pd.to_datetime(df[col], format="%Y-%m-%d")
+    for col in ("in_inventory", "is_primary"):
+        df[col] = df[col].astype(bool)
+    return df[LEDGER_COLUMNS], meta
+
+def _persist(table: str, keys: Optional[set], rows: pd.DataFrame, watermark: Optional[str]) -> None:
+    """Replace the rows of `keys` (all of the table's rows when keys is None) and store the watermark."""
+    try:
+        with _connect() as conn:
+            if keys is None:
+                conn.execute(f'DELETE FROM "{LEDGER_TABLE}" WHERE tbl = ?', (table,))
+            else:
+                key_list = list(keys)
+                for i in range(0, len(key_list), 500):
+                    chunk = key_list[i:i + 500]
+                    conn.execute(
+                        f'DELETE FROM "{LEDGER_TABLE}" WHERE tbl = ? AND source_key IN ({",".join("?" * len(chunk))})',
+                        [table, *chunk],
+                    )
+            out = rows.copy()
+            for col in ("night", "check_in"):
+                out[col] = out[col].dt.strftime("%Y-%m-%d")
+            out.to_sql(LEDGER_TABLE, conn, if_exists="append", index=False)
+            conn.execute(
+                "INSERT OR REPLACE INTO ledger_meta (tbl, watermark, synced_at) VALUES (?, ?, ?)",
+                (table, watermark, time.time()),
+            )
+    except Exception as e:
+        logging.warning(f"revenue_ledger: could not persist ledger rows for {table}: {e}")
+
+# -------------------------- Sync --------------------------
+def on_change(listener: Callable[[Optional[Set[Cell]]], None]) -> None:
+    """Register listener(cells), called after a sync with the (property, night) cells whose
+    rows changed: the old and new nights of every re-exploded booking. cells is None after
+    a full rebuild. Listeners run once the synced ledger is published, outside the ledger lock."""
+    _listeners.append(listener)
+
+def _notify(cells: Optional[Set[Cell]]) -> None:
+    for listener in _listeners:
+        try:
+            listener(cells)
+        except Exception as e:
+            logging.warning(f"revenue_ledger: change listener failed: {e}")
+
+def _cells(rows: pd.DataFrame) -> Set[Cell]:
+    return set(zip(rows["property"], rows["night"]))
+
+def _row_hashes(snap: pd.DataFrame, key: str) -> Dict[str, int]:
+    return dict(zip(snap[key].astype(str), pd.util.hash_pandas_object(snap, index=False)))
+
+def _changed_keys(table: str, snap: pd.DataFrame, key: str) -> Optional[Set[str]]:
+    """Keys of the rows added, edited or deleted since the last sync, for a table without a
+    watermark (found by hashing every row). None on the first sync of the process."""
+    version = snapshot_version(table)
+    if _versions.get(table) == version and table in _hashes:
+        return set()
+    hashes = _row_hashes(snap, key)
+    previous = _hashes.get(table)
+    _versions[table], _hashes[table] = version, hashes
+    if previous is None:
+        return None
+    return {k for k in hashes.keys() | previous.keys() if hashes.get(k) != previous.get(k)}
+
+def _sync_table(ledger: pd.DataFrame, table: str) -> Tuple[pd.DataFrame, Optional[Set[Cell]]]:
+    """Apply a table's changes to the ledger; returns it with the changed cells (None: all)."""
+    snap = load_snapshot(table)
+    watermark = snapshot_watermark(table)
+    key = SYNC_TABLES[table][0]
+    previous = _watermarks.get(table)
+    mine = ledger["tbl"] == table
+    if watermark is None:
+        keys = _changed_keys(table, snap, key)
+    elif previous is None:
+        keys = None
+    else:
+        keys = set(ledger.loc[mine, "source_key"]) - set(snap[key].astype(str))
+        if watermark != previous and WATERMARK_COLUMN in snap.columns:
+            stamps = pd.to_datetime(snap[WATERMARK_COLUMN], format="ISO8601", utc=True, errors="coerce")
+            keys |= set(snap.loc[stamps > pd.Timestamp(previous), key].astype(str))
+
+    if keys is None:
+        rows = _explode_rows(table, snap)
+        _persist(table, None, rows, watermark)
+        _watermarks[table] = watermark
+        logging.info(f"revenue_ledger: rebuilt {table} -> {len(rows)} nights")
+        return _concat(ledger[~mine], rows), None
+
+    cells: Set[Cell] = set()
+    if keys:
+        rows = _explode_rows(table, snap[snap[key].astype(str).isin(keys)])
+        _persist(table, keys, rows, watermark)
+        replaced = mine & ledger["source_key"].isin(keys)
+        cells = _cells(ledger[replaced]) | _cells(rows)
+        ledger = _concat(ledger[~replaced], rows)
+        logging.info(f"revenue_ledger: {table} {len(keys)} bookings re-exploded -> {len(rows)} nights")
+    elif watermark != previous:
+        _persist(table, set(), empty_ledger(), watermark)
+    _watermarks[table] = watermark
+    return ledger, cells
+
+def sync_ledger() -> pd.DataFrame:
+    """Bring the ledger up to date with the booking snapshots and return it."""
+    global _ledger, _synced_at
+    changes = []
+    with _lock:
+        ledger = _ledger
+        if ledger is None:
+            ledger, meta = _read_persisted()
+            _watermarks.update(meta)
+        for table in SYNC_TABLES:
+            ledger, cells = _sync_table(ledger, table)
+            changes.append(cells)
+        _ledger, _synced_at = ledger, time.monotonic()
+    # Listeners run after the new ledger is published and outside the lock: they take their own locks
+    if any(cells is None for cells in changes):
+        _notify(None)
+    elif any(changes):
+        _notify(set().union(*changes))
+    return ledger
+
+def load_ledger(max_age: float = SYNC_INTERVAL) -> pd.DataFrame:
+    """Whole ledger, synced at most every `max_age` seconds. Shared: do not modify it in place."""
+    if _ledger is not None and time.monotonic() - _synced_at < max_age:
+        return _ledger
+    return sync_ledger()
+
+def current_ledger() -> pd.DataFrame:
+    """The last synced ledger, without syncing it again (syncs only before the first sync)."""
+    ledger = _ledger
+    return ledger if ledger is not None else sync_ledger()
+
+def expire_ledger() -> None:
+    """Force the next load_ledger to sync (call after writing bookings)."""
+    global _synced_at
+    _synced_at = float("-inf")
+
+# -------------------------- Queries --------------------------
+def ledger_slice(properties: Optional[Iterable[str]] = None, start: Optional[date] = None, end: Optional[date] = None,
+                 ledger: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Ledger rows for the given properties and nights start..end (inclusive), of `ledger` (default: load_ledger())."""
+    if ledger is None:
+        ledger = load_ledger()
+    keep = pd.Series(True, index=ledger.index)
+    if properties is not None:
+        keep &= ledger["property"].isin({canonical_property(p) for p in properties})
+    if start is not None:
+        keep &= ledger["night"] >= pd.Timestamp(start)
+    if end is not None:
+        keep &= ledger["night"] <= pd.Timestamp(end)
+    return ledger[keep].copy()
+
+def booking_amount(ledger: pd.DataFrame, column: str) -> pd.Series:
+    """A share column scaled back to the full booking amount."""
+    return ledger[column] * ledger["nights"] * ledger["rooms"]
+
+def night_totals(ledger: pd.DataFrame) -> pd.DataFrame:
+    """Per (property, night): rooms sold (distinct inventory rooms), pax and the money shares."""
+    grouped = ledger.groupby(["property", "night"])
+    totals = grouped[["pax"] + MONEY_COLUMNS].sum()
+    totals.insert(0, "rooms_sold", ledger[ledger["in_inventory"]].groupby(["property", "night"])["room"].nunique())
+    totals["rooms_sold"] = totals["rooms_sold"].fillna(0).astype("int64")
+    return totals
+
+def check_in_totals(ledger: pd.DataFrame) -> pd.DataFrame:
+    """Per (property, check-in date): full booking amounts attributed to the check-in night."""
+    first = ledger[ledger["night"] == ledger["check_in"]]
+    amounts = pd.DataFrame({col: first[col] * first["nights"] for col in MONEY_COLUMNS})
+    amounts["property"], amounts["night"] = first["property"], first["night"]
+    return amounts.groupby(["property", "night"])[MONEY_COLUMNS].sum()
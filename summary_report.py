@@ -8,6 +8,9 @@ import pandas as pd
 from supabase import create_client, Client
 from typing import List, Dict
 import os
+from revenue_ledger import night_totals, check_in_totals, booking_amount
+from night_aggregates import AggregateStore, register_store, assigned_rows
+from property_scope import scope_properties, user_scope
 
 # -------------------------- Supabase --------------------------
 try:
@@ -115,178 +118,49 @@ def load_properties(report_year: int = None, report_month: int = None) -> List[s
         return [p for p in all_props if p not in CLOSED_PROPERTIES]
     return all_props
 
-@st.cache_data(ttl=1800)
-def load_combined_bookings(prop: str, start: date, end: date) -> List[Dict]:
-    normalized_prop = normalize_property_name(prop)
-    query_props = [normalized_prop] + reverse_mapping.get(normalized_prop, [])
-    try:
-        direct = (supabase.table("reservations").select("*")
-                  .in_("property_name", query_props)
-                  .lte("check_in", str(end))
-                  .gte("check_out", str(start))
-                  .in_("plan_status", ["Confirmed", "Completed"])
-                  .in_("payment_status", ["Partially Paid", "Fully Paid"])
-                  .execute().data or [])
-
-        online = (supabase.table("online_reservations").select("*")
-                  .in_("property", query_props)
-                  .lte("check_in", str(end))
-                  .gte("check_out", str(start))
-                  .in_("booking_status", ["Confirmed", "Completed"])
-                  .in_("payment_status", ["Partially Paid", "Fully Paid"])
-                  .execute().data or [])
-
-        all_bookings = []
-        for b in direct:
-            if normalize_property_name(b.get("property_name")) == prop:
-                b["property_name"] = prop
-                b["type"] = "direct"
-                all_bookings.append(b)
-        for b in online:
-            if normalize_property_name(b.get("property")) == prop:
-                b["property"] = prop
-                b["type"] = "online"
-                all_bookings.append(b)
-        return all_bookings
-    except Exception as e:
-        st.error(f"Error loading bookings for {prop}: {e}")
-        return []
-
-def filter_bookings_for_day(bookings: List[Dict], target: date) -> List[Dict]:
-    return [
-        b for b in bookings
-        if date.fromisoformat(b["check_in"]) <= target < date.fromisoformat(b["check_out"])
-    ]
-
-def assign_inventory_numbers(daily: List[Dict], prop: str):
-    PROPERTY_INVENTORY = {
-        "Le Poshe Beach view": {"all": ["101","102","201","202","203","204","301","302","303","304","Day Use 1","Day Use 2","No Show"]},
-        "La Millionaire Resort": {"all": ["101","102","103","105","201","202","203","204","205","206","207","208","301","302","303","304","305","306","307","308","401","402","Day Use 1","Day Use 2","Day Use 3","Day Use 4","Day Use 5","No Show"]},
-        "Le Poshe Luxury": {"all": ["101","102","201","202","203","204","205","301","302","303","304","305","401","402","403","404","405","501","Day Use 1","Day Use 2","No Show"]},
-        "Le Poshe Suite": {"all": ["601","602","603","604","701","702","703","704","801","Day Use 1","Day Use 2","No Show"]},
-        "La Paradise Residency": {"all": ["101","102","103","201","202","203","301","302","303","304","Day Use 1","Day Use 2","No Show"]},
-        "La Paradise Luxury": {"all": ["101","102","103","201","202","203","Day Use 1","Day Use 2","No Show"]},
-        "La Villa Heritage": {"all": ["101","102","103","201","202","203","301","Day Use 1","Day Use 2","No Show"]},
-        "Le Pondy Beachside": {"all": ["101","102","201","202","Day Use 1","Day Use 2","No Show"]},
-        "Le Royce Villa": {"all": ["101","102","201","202","Day Use 1","Day Use 2","No Show"]},
-        "La Tamara Luxury": {"all": ["101","102","103","104","105","106","201","202","203","204","205","206","301","302","303","304","305","306","401","402","403","404","Day Use 1","Day Use 2","No Show"]},
-        "La Antilia Luxury": {"all": ["101","201","202","203","204","301","302","303","304","401","Day Use 1","Day Use 2","No Show"]},
-        "La Tamara Suite": {"all": ["101","102","103","104","201","202","203","204","205","206","Day Use 1","Day Use 2","No Show"]},
-        "Le Park Resort": {"all": ["111","222","333","444","555","666","Day Use 1","Day Use 2","No Show"]},
-        "Villa Shakti": {"all": ["101","102","201","201A","202","203","301","301A","302","303","401","Day Use 1","Day Use 2","No Show"]},
-        "Eden Beach Resort": {"all": ["101","102","103","201","202","Day Use 1","Day Use 2","No Show"]},
-        "Le Terra": {"all": ["101","102","103","104","105","106","107","Day Use 1","Day Use 2","No Show"]},
-        "La Coromandel Luxury": {"all": ["101","102","103","201","202","203","204","205","206","301","Day Use 1","Day Use 2","No Show"]},
-        "Happymates Forest Retreat": {"all": ["101","102","Day Use 1","Day Use 2","No Show"]}
-    }
-    
-    inv = PROPERTY_INVENTORY.get(prop, {"all": []})["all"]
-    inv_lookup = {i.strip().lower(): i for i in inv}
-    assigned = []
-    over = []
-    already_assigned = set()
-    
-    for b in daily:
-        raw_room = str(b.get("room_no") or "").strip()
-        if not raw_room:
-            over.append(b)
-            continue
-        requested = [r.strip() for r in raw_room.split(",") if r.strip()]
-        assigned_rooms = []
-        is_over = False
-        for r in requested:
-            key = r.lower()
-            if key not in inv_lookup:
-                is_over = True
-                break
-            room = inv_lookup[key]
-            if room in already_assigned:
-                is_over = True
-                break
-            assigned_rooms.append(room)
-        if is_over or not assigned_rooms:
-            over.append(b)
-            continue
-        for room in assigned_rooms:
-            already_assigned.add(room)
-        for idx, room in enumerate(assigned_rooms):
-            new_b = b.copy()
-            new_b["assigned_room"] = room
-            new_b["room_no"] = room
-            new_b["is_primary"] = (idx == 0)
-            assigned.append(new_b)
-    return assigned, over
-
-def safe_float(value, default=0.0):
-    try:
-        return float(value) if value not in [None, "", " "] else default
-    except:
-        return default
-
-def compute_daily_metrics(bookings: List[Dict], prop: str, day: date) -> Dict:
-    daily = filter_bookings_for_day(bookings, day)
-    assigned, _ = assign_inventory_numbers(daily, prop)
-    
-    # ✅ FIX: Count ALL occupied rooms on this day, not just check-ins
-    rooms_sold = len(set(b.get("assigned_room") for b in assigned if b.get("assigned_room")))
-    
-    # Only calculate financial metrics for check-in day primaries
-    check_in_primaries = [b for b in assigned if b.get("is_primary", True) and date.fromisoformat(b["check_in"]) == day]
-
-    room_charges = gst = commission = 0.0
-    for b in check_in_primaries:
-        if b.get("type") == "online":
-            total_amount = safe_float(b.get("booking_amount"))
-            gst += safe_float(b.get("ota_tax"))
-            commission += safe_float(b.get("ota_commission"))
-            room_charges += total_amount - safe_float(b.get("ota_tax"))
-        else:
-            room_charges += safe_float(b.get("total_tariff"))
-
-    total = room_charges + gst
-    receivable = total - commission
-    tax_deduction = receivable * 0.003
-
-    # Calculate per-night receivable for ALL occupied rooms on this day
-    daily_per_night_sum = 0.0
-    for b in assigned:
-        if b.get("is_primary", True):
-            is_online = b.get("type") == "online"
-            if is_online:
-                booking_total = safe_float(b.get("booking_amount"))
-                booking_gst = safe_float(b.get("ota_tax"))
-                booking_commission = safe_float(b.get("ota_commission"))
-            else:
-                booking_total = safe_float(b.get("total_tariff"))
-                booking_gst = booking_commission = 0.0
-            booking_receivable = booking_total - booking_gst - booking_commission
-            days = max(b.get("days", 1), 1)
-            raw_room = str(b.get("room_no") or "").strip()
-            num_rooms = len([r.strip() for r in raw_room.split(",") if r.strip()]) if raw_room else 1
-            total_nights = days * num_rooms
-            per_night = booking_receivable / total_nights if total_nights > 0 else 0.0
-            daily_per_night_sum += per_night
-
-    return {
-        "rooms_sold": rooms_sold,
-        "room_charges": room_charges,
-        "gst": gst,
-        "total": total,
-        "commission": commission,
-        "tax_deduction": tax_deduction,
-        "receivable": receivable,
-        "receivable_per_night": daily_per_night_sum,
-    }
-
-def build_report(props: List[str], dates: List[date], bookings: Dict[str, List[Dict]], metric: str) -> pd.DataFrame:
+def summary_cell_metrics(rows: pd.DataFrame) -> pd.DataFrame:
+    """Daily metrics per (property, night) as group-bys over revenue ledger rows."""
+    assigned = assigned_rows(rows)
+    nights = night_totals(assigned)
+    check_ins = check_in_totals(assigned)
+
+    metrics = pd.DataFrame(index=nights.index.union(check_ins.index))
+    metrics["rooms_sold"] = nights["rooms_sold"]
+    # Summary "GST" is the OTA tax; direct bookings carry no tax or commission
+    metrics["room_charges"] = check_ins["total_amount"] - check_ins["tax"]
+    metrics["gst"] = check_ins["tax"]
+    metrics["commission"] = check_ins["commission"]
+    metrics = metrics.fillna(0.0)
+    metrics["total"] = metrics["room_charges"] + metrics["gst"]
+    metrics["receivable"] = metrics["total"] - metrics["commission"]
+    metrics["tax_deduction"] = metrics["receivable"] * 0.003
+
+    # Receivable of every primary room occupied on the night. This has never been
+    # divided by nights or rooms, so the full booking amount is used.
+    primary = assigned[assigned["is_primary"]]
+    per_night = (booking_amount(primary, "total_amount") - booking_amount(primary, "tax")
+                 - booking_amount(primary, "commission"))
+    metrics["receivable_per_night"] = per_night.groupby([primary["property"], primary["night"]]).sum()
+    return metrics.fillna(0.0)
+
+SUMMARY_METRICS = ["rooms_sold", "room_charges", "gst", "total", "commission", "tax_deduction", "receivable", "receivable_per_night"]
+summary_store = register_store(AggregateStore("summary", summary_cell_metrics, SUMMARY_METRICS))
+
+def compute_month_metrics(props: List[str], start: date, end: date) -> pd.DataFrame:
+    """Daily metrics per (property, night); only cells changed since the last call are recomputed."""
+    return summary_store.get(props, start, end)
+
+def build_report(props: List[str], dates: List[date], metrics: pd.DataFrame, metric: str) -> pd.DataFrame:
+    values = metrics[metric].to_dict() if not metrics.empty else {}
     rows = []
     prop_totals = {p: 0.0 for p in props}
     grand_total = 0.0
     for d in dates:
         row = {"Date": d.strftime("%Y-%m-%d")}
         day_sum = 0.0
+        night = pd.Timestamp(d)
         for p in props:
-            val = compute_daily_metrics(bookings.get(p, []), p, d).get(metric, 0.0)
+            val = values.get((p, night), 0.0)
             short_name = get_short_name(p)
             row[short_name] = val
             day_sum += val
@@ -371,7 +245,7 @@ def show_summary_report():
     year = st.selectbox("Year", options=list(range(today.year-5, today.year+6)), index=5)
     month = st.selectbox("Month", options=list(range(1,13)), index=today.month-1)
 
-    properties = load_properties(year, month)
+    properties = scope_properties(load_properties(year, month), user_scope())
     if not properties:
         st.info("No properties found in database.")
         return
@@ -380,7 +254,7 @@ def show_summary_report():
     month_dates = [date(year, month, d) for d in range(1, days_in_month + 1)]
 
     with st.spinner("Loading all booking data..."):
-        bookings = {p: load_combined_bookings(p, month_dates[0], month_dates[-1]) for p in properties}
+        metrics = compute_month_metrics(properties, month_dates[0], month_dates[-1])
 
     reports = [
         ("rooms_sold", "Rooms Report"),
@@ -395,7 +269,7 @@ def show_summary_report():
 
     for metric, title in reports:
         st.subheader(f"TIE Hotels & Resort {title}")
-        df = build_report(properties, month_dates, bookings, metric)
+        df = build_report(properties, month_dates, metrics, metric)
         html = style_dataframe_with_highlights(df)
         st.markdown(html, unsafe_allow_html=True)
         st.markdown("---")
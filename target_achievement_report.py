@@ -1,12 +1,17 @@
 # target_achievement_report.py - Multi-Month Support (Dec 2025 & Jan 2026)
 
 import streamlit as st
-from datetime import date, datetime
+from datetime import date, timedelta
 import calendar
+import numpy as np
 import pandas as pd
 from supabase import create_client, Client
 from typing import List, Dict
 import os
+from revenue_ledger import booking_amount
+from night_aggregates import AggregateStore, register_store
+from pace_forecast import forecast_month_end
+from property_scope import scope_properties, user_scope
 
 # -------------------------- Supabase --------------------------
 try:
@@ -231,155 +236,77 @@ def load_properties(report_year: int = None, report_month: int = None) -> List[s
         return [p for p in all_props if p not in CLOSED_PROPERTIES]
     return all_props
 
-# -------------------------- Booking Functions --------------------------
-@st.cache_data(ttl=1800)
-def load_combined_bookings(prop: str, start: date, end: date) -> List[Dict]:
-    """Load bookings with caching and optimized date filtering."""
-    normalized = normalize_property_name(prop)
-    query_props = [normalized] + reverse_mapping.get(normalized, [])
-    try:
-        direct = supabase.table("reservations").select("*")\
-            .in_("property_name", query_props)\
-            .gte("check_in", str(start))\
-            .lte("check_in", str(end))\
-            .in_("plan_status", ["Confirmed", "Completed"])\
-            .in_("payment_status", ["Partially Paid", "Fully Paid"])\
-            .execute().data or []
-
-        online = supabase.table("online_reservations").select("*")\
-            .in_("property", query_props)\
-            .gte("check_in", str(start))\
-            .lte("check_in", str(end))\
-            .in_("booking_status", ["Confirmed", "Completed"])\
-            .in_("payment_status", ["Partially Paid", "Fully Paid"])\
-            .execute().data or []
-
-        all_bookings = []
-        
-        for b in direct:
-            name = b.get("property_name")
-            if normalize_property_name(name) == prop:
-                b["property_name"] = prop
-                b["type"] = "direct"
-                all_bookings.append(b)
-        
-        for b in online:
-            name = b.get("property")
-            if normalize_property_name(name) == prop:
-                b["property_name"] = prop
-                b["type"] = "online"
-                all_bookings.append(b)
-                
-        return all_bookings
-    except Exception as e:
-        st.warning(f"Failed to load bookings for {prop}: {e}")
-        return []
-
-def filter_bookings_for_day(bookings: List[Dict], day: date):
-    return [b for b in bookings if date.fromisoformat(b["check_in"]) <= day < date.fromisoformat(b["check_out"])]
-
-def assign_inventory_numbers(daily: List[Dict], prop: str):
-    inv = PROPERTY_INVENTORY.get(prop, {"all": []})["all"]
-    lookup = {r.strip().lower(): r for r in inv}
-    assigned = []; used = set()
-    for b in daily:
-        rooms = [r.strip() for r in str(b.get("room_no") or "").split(",") if r.strip()]
-        assigned_rooms = []
-        for r in rooms:
-            key = r.lower()
-            if key in lookup and lookup[key] not in used:
-                assigned_rooms.append(lookup[key])
-                used.add(lookup[key])
-        for i, room in enumerate(assigned_rooms):
-            new_b = b.copy()
-            new_b["assigned_room"] = room
-            new_b["room_no"] = room
-            new_b["is_primary"] = (i == 0)
-            assigned.append(new_b)
-    return assigned, []
-
-def safe_float(v, default=0.0):
-    try: return float(v) if v not in [None, "", " "] else default
-    except: return default
-
-def compute_daily_metrics(bookings: List[Dict], prop: str, day: date) -> Dict:
-    daily = filter_bookings_for_day(bookings, day)
-    assigned, _ = assign_inventory_numbers(daily, prop)
-    rooms_sold = len({b.get("assigned_room") for b in assigned if b.get("assigned_room")})
-    
-    check_in_primaries = [b for b in assigned if b.get("is_primary", True) and date.fromisoformat(b["check_in"]) == day]
-    
-    room_charges = gst = commission = 0.0
-    for b in check_in_primaries:
-        booking_type = b.get("type", "")
-        if booking_type == "online":
-            total_amount = safe_float(b.get("booking_amount"))
-            gst += safe_float(b.get("ota_tax"))
-            commission += safe_float(b.get("ota_commission"))
-            room_charges += total_amount - safe_float(b.get("ota_tax"))
-        else:
-            room_charges += safe_float(b.get("total_tariff"))
-    
-    total = room_charges + gst
-    receivable = total - commission
-    
-    return {
-        "rooms_sold": rooms_sold, 
-        "total": total,
-        "receivable": receivable,
-        "commission": commission,
-        "gst": gst
-    }
+# -------------------------- Daily Metrics --------------------------
+def target_cell_metrics(rows: pd.DataFrame) -> pd.DataFrame:
+    """Per (property, night) from revenue ledger rows, counting only bookings that check in
+    within the night's month (the report has always loaded the month by check-in date)."""
+    rows = rows[rows["check_in"].dt.to_period("M") == rows["night"].dt.to_period("M")]
+    rows = rows[rows["in_inventory"]]
+    keys = [rows["property"], rows["night"]]
+    metrics = pd.DataFrame({"rooms_sold": rows.groupby(keys)["room"].nunique()})
+    # Full amounts once per booking on its check-in night; "GST" here is the OTA tax
+    first = rows[rows["night"] == rows["check_in"]].drop_duplicates(["tbl", "source_key"])
+    amounts = pd.DataFrame({
+        "total": booking_amount(first, "total_amount"),
+        "commission": booking_amount(first, "commission"),
+        "gst": booking_amount(first, "tax"),
+    })
+    metrics = metrics.join(amounts.groupby([first["property"], first["night"]]).sum(), how="outer").fillna(0.0)
+    metrics["receivable"] = metrics["total"] - metrics["commission"]
+    return metrics
+
+TARGET_METRICS = ["rooms_sold", "total", "receivable", "commission", "gst"]
+target_store = register_store(AggregateStore("target", target_cell_metrics, TARGET_METRICS))
+
+def build_daily_prefix_sums(props: List[str], dates: List[date]) -> Dict[str, np.ndarray]:
+    """Cumulative daily metrics per property: prefix[metric][i, k] is the sum over the first k dates.
+
+    Any "to date" or "from date" figure is then a difference of two entries.
+    """
+    cells = target_store.get(props, dates[0], dates[-1])
+    prefix = {}
+    for metric in TARGET_METRICS:
+        daily = cells[metric].to_numpy(dtype="float64").reshape(len(props), len(dates))
+        prefix[metric] = np.concatenate([np.zeros((len(props), 1)), np.cumsum(daily, axis=1)], axis=1)
+    return prefix
 
 # -------------------------- MAIN REPORT --------------------------
-def build_target_achievement_report(props: List[str], dates: List[date], bookings_dict: Dict[str, List[Dict]], current_date: date, targets: Dict) -> pd.DataFrame:
+def build_target_achievement_report(props: List[str], dates: List[date], prefix: Dict[str, np.ndarray], cutoff: int, targets: Dict) -> pd.DataFrame:
+    """Whole-month figures; rooms booked after the first `cutoff` dates count as future."""
     rows = []
-    balance_days = len([d for d in dates if d > current_date])
-
-    for prop in props:
-        try:
-            target = targets.get(prop, 0)
-            total_rooms = get_total_rooms(prop)
-            total_room_nights = total_rooms * len(dates)
-
-            achieved = rooms_sold = future_booked = 0.0
-            commission_total = receivable_total = gst_total = 0.0
-            
-            for d in dates:
-                m = compute_daily_metrics(bookings_dict.get(prop, []), prop, d)
-                achieved += m["total"]
-                commission_total += m["commission"]
-                gst_total += m["gst"]
-                receivable_total += m["receivable"]
-                rooms_sold += m["rooms_sold"]
-                
-                if d > current_date:
-                    future_booked += m["rooms_sold"]
-
-            balance_rooms = max((total_rooms * balance_days) - future_booked, 0)
-            balance = target - achieved
-            achieved_pct = (achieved / target * 100) if target > 0 else 0
-            occupancy = (rooms_sold / total_room_nights * 100) if total_room_nights > 0 else 0
-            per_day_needed = max(balance, 0) / balance_days if balance_days > 0 else 0
-
-            rows.append({
-                "Property Name": prop, 
-                "Target": int(target), 
-                "Achieved": int(achieved),
-                "Balance": int(balance),
-                "Achieved %": round(achieved_pct, 1), 
-                "Total Rooms": int(total_room_nights),
-                "Rooms Sold": int(rooms_sold), 
-                "Occupancy %": round(occupancy, 1),
-                "Balance Rooms": int(balance_rooms),
-                "Per Day Needed": int(per_day_needed),
-                "GST": int(gst_total),
-                "Commission": int(commission_total),
-                "Receivable": int(receivable_total)
-            })
-        except Exception as e:
-            st.warning(f"Error processing {prop}: {e}")
-            continue
+    n = len(dates)
+    balance_days = n - cutoff
+
+    for i, prop in enumerate(props):
+        target = targets.get(prop, 0)
+        total_rooms = get_total_rooms(prop)
+        total_room_nights = total_rooms * n
+
+        achieved = prefix["total"][i, n]
+        rooms_sold = prefix["rooms_sold"][i, n]
+        future_booked = rooms_sold - prefix["rooms_sold"][i, cutoff]
+
+        balance_rooms = max((total_rooms * balance_days) - future_booked, 0)
+        balance = target - achieved
+        achieved_pct = (achieved / target * 100) if target > 0 else 0
+        occupancy = (rooms_sold / total_room_nights * 100) if total_room_nights > 0 else 0
+        per_day_needed = max(balance, 0) / balance_days if balance_days > 0 else 0
+
+        rows.append({
+            "Property Name": prop, 
+            "Target": int(target), 
+            "Achieved": int(achieved),
+            "Balance": int(balance),
+            "Achieved %": round(achieved_pct, 1), 
+            "Total Rooms": int(total_room_nights),
+            "Rooms Sold": int(rooms_sold), 
+            "Occupancy %": round(occupancy, 1),
+            "Balance Rooms": int(balance_rooms),
+            "Per Day Needed": int(per_day_needed),
+            "GST": int(prefix["gst"][i, n]),
+            "Commission": int(prefix["commission"][i, n]),
+            "Receivable": int(prefix["receivable"][i, n])
+        })
 
     if rows:
         totals = {k: sum(r[k] for r in rows if k != "Property Name") for k in rows[0].keys() if k != "Property Name"}
@@ -393,53 +320,42 @@ def build_target_achievement_report(props: List[str], dates: List[date], booking
     return df
 
 # -------------------------- TILL TODAY REPORT --------------------------
-def build_till_today_report(props: List[str], dates: List[date], bookings_dict: Dict[str, List[Dict]], current_date: date, targets: Dict) -> pd.DataFrame:
-    """Calculate metrics only till current system date - ARR based on total room inventory"""
+def build_till_today_report(props: List[str], dates: List[date], prefix: Dict[str, np.ndarray], cutoff: int, targets: Dict) -> pd.DataFrame:
+    """Calculate metrics for the first `cutoff` dates only - ARR based on total room inventory"""
     rows = []
-    dates_till_today = [d for d in dates if d <= current_date]
-    
-    if not dates_till_today:
+    if cutoff <= 0:
         return pd.DataFrame([{"Property Name": "No Data"}])
 
-    for prop in props:
-        try:
-            target = targets.get(prop, 0)
-            total_rooms = get_total_rooms(prop)
-            total_room_nights_till_today = total_rooms * len(dates_till_today)
-
-            achieved_till_today = 0.0
-            rooms_sold_till_today = 0.0
-            
-            for d in dates_till_today:
-                m = compute_daily_metrics(bookings_dict.get(prop, []), prop, d)
-                achieved_till_today += m["total"]
-                rooms_sold_till_today += m["rooms_sold"]
-
-            unsold_rooms = total_room_nights_till_today - rooms_sold_till_today
-            achieved_pct = (achieved_till_today / target * 100) if target > 0 else 0
-            occupancy_pct = (rooms_sold_till_today / total_room_nights_till_today * 100) if total_room_nights_till_today > 0 else 0
-            current_arr = (achieved_till_today / total_room_nights_till_today) if total_room_nights_till_today > 0 else 0
-
-            rows.append({
-                "Property Name": prop,
-                "Target": int(target),
-                "Achieved": int(achieved_till_today),
-                "Percent": round(achieved_pct, 1),
-                "Occupancy %": round(occupancy_pct, 1),
-                "Sold Rooms": int(rooms_sold_till_today),
-                "Unsold Rooms": int(unsold_rooms),
-                "Current ARR": int(current_arr)
-            })
-        except Exception as e:
-            st.warning(f"Error processing {prop} (Till Today): {e}")
-            continue
+    for i, prop in enumerate(props):
+        target = targets.get(prop, 0)
+        total_rooms = get_total_rooms(prop)
+        total_room_nights_till_today = total_rooms * cutoff
+
+        achieved_till_today = prefix["total"][i, cutoff]
+        rooms_sold_till_today = prefix["rooms_sold"][i, cutoff]
+
+        unsold_rooms = total_room_nights_till_today - rooms_sold_till_today
+        achieved_pct = (achieved_till_today / target * 100) if target > 0 else 0
+        occupancy_pct = (rooms_sold_till_today / total_room_nights_till_today * 100) if total_room_nights_till_today > 0 else 0
+        current_arr = (achieved_till_today / total_room_nights_till_today) if total_room_nights_till_today > 0 else 0
+
+        rows.append({
+            "Property Name": prop,
+            "Target": int(target),
+            "Achieved": int(achieved_till_today),
+            "Percent": round(achieved_pct, 1),
+            "Occupancy %": round(occupancy_pct, 1),
+            "Sold Rooms": int(rooms_sold_till_today),
+            "Unsold Rooms": int(unsold_rooms),
+            "Current ARR": int(current_arr)
+        })
 
     if rows:
         totals = {k: sum(r[k] for r in rows if k != "Property Name") for k in rows[0].keys() if k != "Property Name"}
         totals["Property Name"] = "TOTAL"
         totals["Percent"] = round((totals["Achieved"] / totals["Target"] * 100) if totals["Target"] else 0, 1)
         
-        total_room_nights = sum(get_total_rooms(p) * len(dates_till_today) for p in props)
+        total_room_nights = sum(get_total_rooms(p) * cutoff for p in props)
         total_sold = sum(r["Sold Rooms"] for r in rows)
         totals["Occupancy %"] = round((total_sold / total_room_nights * 100) if total_room_nights else 0, 1)
         totals["Current ARR"] = int(totals["Achieved"] / total_room_nights) if total_room_nights else 0
@@ -449,6 +365,39 @@ def build_till_today_report(props: List[str], dates: List[date], bookings_dict:
     df.insert(0, "S.No", range(1, len(df) + 1))
     return df
 
+# -------------------------- FORECAST REPORT --------------------------
+def build_forecast_report(props: List[str], dates: List[date], prefix: Dict[str, np.ndarray], targets: Dict, today: date) -> pd.DataFrame:
+    """Month-end revenue forecast from the revenue on the books and historical pickup pace"""
+    n = len(dates)
+    on_the_books = {prop: prefix["total"][i, n] for i, prop in enumerate(props)}
+    forecast = forecast_month_end(props, dates[0].year, dates[0].month, on_the_books, today)
+
+    rows = []
+    for f in forecast.itertuples(index=False):
+        target = targets.get(f.property, 0)
+        has_range = not np.isnan(f.low)
+        rows.append({
+            "Property Name": f.property,
+            "Target": int(target),
+            "On The Books": int(f.on_the_books),
+            "Forecast": int(f.forecast),
+            "Low": int(f.low) if has_range else int(f.on_the_books),
+            "High": int(f.high) if has_range else int(f.on_the_books),
+            "Forecast %": round((f.forecast / target * 100) if target > 0 else 0, 1),
+            "History Months": int(f.months_used),
+        })
+
+    if rows:
+        totals = {k: sum(r[k] for r in rows) for k in ["Target", "On The Books", "Forecast", "Low", "High"]}
+        totals["Property Name"] = "TOTAL"
+        totals["Forecast %"] = round((totals["Forecast"] / totals["Target"] * 100) if totals["Target"] else 0, 1)
+        totals["History Months"] = max(r["History Months"] for r in rows)
+        rows.append(totals)
+
+    df = pd.DataFrame(rows or [{"Property Name": "No Data"}])
+    df.insert(0, "S.No", range(1, len(df) + 1))
+    return df
+
 # -------------------------- Styling --------------------------
 def style_dataframe(df):
     if df is None or df.empty:
@@ -476,7 +425,8 @@ def style_dataframe(df):
         if pct_cols:
             styled = styled.applymap(color_pct, subset=pct_cols)
         
-        currency_cols = ["Target", "Achieved", "Balance", "GST", "Commission", "Receivable", "Current ARR", "Per Day Needed"]
+        currency_cols = ["Target", "Achieved", "Balance", "GST", "Commission", "Receivable", "Current ARR", "Per Day Needed",
+                         "On The Books", "Forecast", "Low", "High"]
         for col in currency_cols:
             if col in df.columns:
                 styled = styled.format({col: "₹{:,.0f}"})
@@ -526,41 +476,33 @@ def show_target_achievement_report():
     else:  # July 2026
         report_year, report_month = 2026, 7
     
-    # Calculate balance days
-    if current_date.year == report_year and current_date.month == report_month:
-        _, days_in_month = calendar.monthrange(report_year, report_month)
-        balance_days = days_in_month - current_date.day
-    else:
-        _, days_in_month = calendar.monthrange(report_year, report_month)
-        if date(report_year, report_month, 1) > current_date:
-            balance_days = days_in_month  # Future month
-        else:
-            balance_days = 0  # Past month
-    
     _, days_in_month = calendar.monthrange(report_year, report_month)
     dates = [date(report_year, report_month, d) for d in range(1, days_in_month + 1)]
     
     targets = MONTHLY_TARGETS[selected_month]
-    
-    st.info(f"📅 Current Date: {current_date.strftime('%B %d, %Y')} | ⏳ Balance Days in {selected_month}: {balance_days}")
 
-    properties = load_properties(report_year, report_month)
+    properties = scope_properties(load_properties(report_year, report_month), user_scope())
 
     with st.spinner("Generating report..."):
-        bookings = {}
-        total_bookings_count = 0
-        for p in properties:
-            try:
-                bookings[p] = load_combined_bookings(p, dates[0], dates[-1])
-                total_bookings_count += len(bookings[p])
-            except:
-                bookings[p] = []
-        
-        st.info(f"📊 Loaded {total_bookings_count} total bookings across all properties for {selected_month}")
+        prefix = build_daily_prefix_sums(properties, dates)
+
+    # Cut-off: nights up to and including it are "to date", later nights are future.
+    # The first option (the day before the month) means nothing is to date yet.
+    cutoff_options = [dates[0] - timedelta(days=1)] + dates
+    cutoff_date = st.select_slider(
+        "Cut-off date",
+        options=cutoff_options,
+        value=min(max(current_date, cutoff_options[0]), dates[-1]),
+        format_func=lambda d: d.strftime("%d %b %Y") if d >= dates[0] else "Before month",
+    )
+    cutoff = cutoff_options.index(cutoff_date)
+    balance_days = len(dates) - cutoff
+
+    st.info(f"📅 Current Date: {current_date.strftime('%B %d, %Y')} | ⏳ Balance Days in {selected_month}: {balance_days}")
 
-        # Main Report
-        df = build_target_achievement_report(properties, dates, bookings, current_date, targets)
-        styled = style_dataframe(df)
+    # Main Report
+    df = build_target_achievement_report(properties, dates, prefix, cutoff, targets)
+    styled = style_dataframe(df)
 
     st.dataframe(styled, use_container_width=True, hide_index=True)
 
@@ -574,14 +516,22 @@ def show_target_achievement_report():
         with c5: st.metric("Commission", f"₹{total['Commission']:,.0f}")
         with c6: st.metric("Receivable", f"₹{total['Receivable']:,.0f}")
 
+    # Forecast
+    if st.checkbox("📈 Forecast mode", help="Project month-end revenue from on-the-books bookings and past months' pickup pace"):
+        st.markdown("---")
+        st.subheader(f"📈 Month-End Forecast - {selected_month}")
+        st.caption("Forecast = on the books ÷ share of month revenue booked by this day in past months (median); Low/High = 10th-90th percentile")
+        df_forecast = build_forecast_report(properties, dates, prefix, targets, current_date)
+        st.dataframe(style_dataframe(df_forecast), use_container_width=True, hide_index=True)
+
     # Till Today Report
     st.markdown("---")
     st.subheader(f"📊 Values Till Today - {selected_month}")
     
-    if current_date >= dates[0]:
-        st.caption(f"Performance metrics calculated from {dates[0].strftime('%B %d, %Y')} to {min(current_date, dates[-1]).strftime('%B %d, %Y')} | ARR = Revenue ÷ Total Room Inventory")
+    if cutoff > 0:
+        st.caption(f"Performance metrics calculated from {dates[0].strftime('%B %d, %Y')} to {cutoff_date.strftime('%B %d, %Y')} | ARR = Revenue ÷ Total Room Inventory")
         
-        df_today = build_till_today_report(properties, dates, bookings, current_date, targets)
+        df_today = build_till_today_report(properties, dates, prefix, cutoff, targets)
         styled_today = style_dataframe(df_today)
         
         st.dataframe(styled_today, use_container_width=True, hide_index=True)
@@ -596,7 +546,7 @@ def show_target_achievement_report():
             with c5: st.metric("Unsold Rooms", f"{total_today['Unsold Rooms']:,.0f}")
             with c6: st.metric("Current ARR", f"₹{total_today['Current ARR']:,.0f}")
     else:
-        st.info(f"📅 {selected_month} has not started yet. 'Till Today' report will be available from {dates[0].strftime('%B %d, %Y')} onwards.")
+        st.info(f"📅 The cut-off is before {selected_month}. 'Till Today' values start from {dates[0].strftime('%B %d, %Y')}.")
 
     # Download buttons
     st.markdown("---")
@@ -609,7 +559,7 @@ def show_target_achievement_report():
             "text/csv"
         )
     with col2:
-        if current_date >= dates[0]:
+        if cutoff > 0:
             st.download_button(
                 "📥 Download Till Today Report (CSV)", 
                 df_today.to_csv(index=False), 
@@ -0,0 +1,101 @@
+# Accounts stand-in: same totals and detail rows as the pandas pipeline it replaced, kept in
+# step with the booking snapshots
+import random
+from datetime import date
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")      # booking_store -> bulk_read
+
+import accounts_aggregate
+import booking_store
+from booking_frame import combine_bookings_frames
+from bulk_read import coerce_frame
+
+MAPPING = {"Le Teera": "Le Terra", "Millionaire": "La Millionaire Resort"}
+FIRST, LAST = date(2026, 10, 1), date(2026, 10, 31)
+DETAIL_KEY = ["property_name", "booking_id", "check_in"]
+
+
+def rows(seed):
+    rng = random.Random(seed)
+    pick = rng.choice
+    props = ["Le Terra", " Le Teera ", "Millionaire", "Villa Shakti", None]
+    statuses = ["Confirmed", "Completed", "Pending", "Cancelled", None]
+    day = lambda: f"2026-{rng.randint(9, 11):02d}-{rng.randint(1, 28):02d}"
+    direct = [dict(
+        booking_id=f"D{i}", property_name=pick(props), guest_name=pick(["Al", " Bo ", None]), check_in=day(),
+        check_out=day(), total_tariff=pick([100.5, None, 3000]), advance_amount=pick([None, 50]),
+        balance_amount=pick([None, 10.25]), plan_status=pick(statuses), payment_status=pick(["Fully Paid", None]),
+    ) for i in range(600)]
+    online = [dict(
+        id=i, booking_id=pick([f"O{i}", None, ""]), property=pick(props), guest_name=pick(["Cy", None]),
+        check_in=day(), check_out=day(), booking_amount=pick([999.0, None]), total_payment_made=pick([None, 100.0]),
+        balance_due=pick([None, 5.5]), booking_status=pick(statuses), payment_status=pick(["Partially Paid", None]),
+    ) for i in range(600)]
+    return direct, online
+
+
+def pandas_report(direct, online):
+    """The report as the old loader built it: status/overlap filter in the query, then pandas."""
+    def query(rows, status):
+        return [r for r in rows if r[status] in ("Confirmed", "Completed")
+                and r["check_in"] <= str(LAST) and r["check_out"] >= str(FIRST)]
+    frame = combine_bookings_frames(query(direct, "plan_status"), query(online, "booking_status"),
+                                    mapping=MAPPING, paid_only=False, positive_stays_only=False)
+    frame = frame[(frame["check_out"].dt.date > FIRST) & (frame["check_in"].dt.date <= LAST)]
+    detail = pd.DataFrame({
+        "property_name": frame["property"], "guest_name": frame["guest_name"], "booking_id": frame["booking_id"],
+        "check_in": frame["check_in"].dt.strftime("%Y-%m-%d"), "check_out": frame["check_out"].dt.strftime("%Y-%m-%d"),
+        "total_amount": frame["total_amount"], "advance": frame["advance"], "balance": frame["balance"],
+        "pending": frame["total_amount"] - frame["advance"] - frame["balance"],
+    })
+    totals = detail.groupby("property_name").agg(
+        bookings=("booking_id", "count"), total_amount=("total_amount", "sum"), advance=("advance", "sum"),
+        balance=("balance", "sum"), pending=("pending", "sum"),
+    ).reset_index()
+    return totals, detail
+
+
+def assert_matches(standin, direct, online):
+    totals, detail = pandas_report(direct, online)
+    pd.testing.assert_frame_equal(standin.totals(FIRST, LAST), totals, check_dtype=False)
+    got = standin.detail(FIRST, LAST, None, 0, len(direct) + len(online))[list(detail.columns)]
+    pd.testing.assert_frame_equal(got.sort_values(DETAIL_KEY).reset_index(drop=True),
+                                  detail.sort_values(DETAIL_KEY).reset_index(drop=True), check_dtype=False)
+
+
+@pytest.fixture
+def snapshots(monkeypatch, tmp_path):
+    """booking_store over in-memory tables without updated_at (every sync is a full reload)."""
+    tables = dict(zip(("reservations", "online_reservations"), rows(7)))
+    monkeypatch.setattr(booking_store, "STORE_PATH", str(tmp_path / "store.sqlite"))
+    monkeypatch.setattr(booking_store, "_snapshots", {})
+    monkeypatch.setattr(booking_store, "_versions", {})
+    monkeypatch.setattr(booking_store, "load_table_frame",
+                        lambda table, **kwargs: coerce_frame(pd.DataFrame(tables[table]), table))
+    monkeypatch.setattr(accounts_aggregate, "_standin", None)
+    return tables
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_standin_matches_pandas_pipeline(seed):
+    direct, online = rows(seed)
+    standin = accounts_aggregate.AccountsStandIn(
+        coerce_frame(pd.DataFrame(direct), "reservations"),
+        coerce_frame(pd.DataFrame(online), "online_reservations"), MAPPING,
+    )
+    assert_matches(standin, direct, online)
+
+
+def test_standin_follows_edits_that_keep_the_row_count(snapshots):
+    direct, online = snapshots["reservations"], snapshots["online_reservations"]
+    assert_matches(accounts_aggregate.local_accounts(MAPPING), direct, online)
+
+    edited = next(r for r in direct if r["plan_status"] == "Confirmed" and r["check_in"].startswith("2026-10"))
+    edited.update(total_tariff=12345.0, property_name="Villa Shakti")
+    online[0]["booking_status"] = "Cancelled" if online[0]["booking_status"] == "Confirmed" else "Confirmed"
+    booking_store.expire_snapshot("reservations")
+    booking_store.expire_snapshot("online_reservations")
+    assert_matches(accounts_aggregate.local_accounts(MAPPING), direct, online)
@@ -0,0 +1,30 @@
+# The save-time overbooking check
+from datetime import date
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("supabase")
+
+import availability
+
+
+def test_conflict_check_blocks_the_save_when_the_index_fails(monkeypatch):
+    def broken():
+        raise RuntimeError("snapshot unavailable")
+    monkeypatch.setattr(availability, "get_index", broken)
+
+    has_conflict, message = availability.check_room_conflicts("Le Terra", "101", "2026-03-10", "2026-03-12", "Confirmed")
+
+    assert has_conflict
+    assert message
+
+
+def test_conflicts_come_from_the_index(monkeypatch):
+    index = availability.AvailabilityIndex(date(2026, 3, 1))
+    index.add(("reservations", "D1"), "Le Terra", "101", date(2026, 3, 10), date(2026, 3, 12))
+    monkeypatch.setattr(availability, "get_index", lambda: index)
+
+    assert availability.find_conflicts("Le Terra", "101&102", "2026-03-11", "2026-03-13") == {"101": ["D1"]}
+    assert availability.find_conflicts("Le Terra", "101", "2026-03-11", "2026-03-13", exclude_booking_id="D1") == {}
+    assert index.free_rooms("Le Terra", date(2026, 3, 10), date(2026, 3, 11), ["101", "102"]) == ["102"]
@@ -0,0 +1,72 @@
+# booking_cache: tagged loaders shared by every session
+import threading
+import time
+
+import pytest
+
+from booking_cache import tagged_cache
+
+
+def test_forget_drops_only_that_scope():
+    calls = []
+
+    @tagged_cache(ttl=300, tags=lambda scope=None: {"property": list(scope)} if scope else {})
+    def load(scope=None):
+        calls.append(scope)
+        return len(calls)
+
+    mine, theirs = ("Le Terra",), ("Villa Shakti",)
+    load(mine), load(theirs), load(None)
+    load.forget(mine)
+    assert (load(mine), load(theirs), load(None)) == (4, 2, 3)
+    assert calls == [mine, theirs, None, mine]
+
+
+class Rerun(BaseException):
+    """Like Streamlit's RerunException: not an Exception."""
+
+
+def test_a_rerun_of_the_leading_session_is_not_raised_in_waiters():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    @tagged_cache(ttl=300, tags=lambda: {})
+    def load():
+        calls.append(None)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+            raise Rerun()
+        return "loaded"
+
+    def leader():
+        with pytest.raises(Rerun):
+            load()
+
+    results = []
+    first = threading.Thread(target=leader)
+    first.start()
+    started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(load()))
+    waiter.start()
+    time.sleep(0.1)          # the waiter joins the leader's flight
+    release.set()
+    first.join(5)
+    waiter.join(5)
+    assert results == ["loaded"]
+    assert load() == "loaded" and len(calls) == 2
+
+
+def test_a_failed_load_is_not_cached():
+    calls = []
+
+    @tagged_cache(ttl=300, tags=lambda: {})
+    def load():
+        calls.append(None)
+        if len(calls) == 1:
+            raise ConnectionError("blip")
+        return "loaded"
+
+    with pytest.raises(ConnectionError):
+        load()
+    assert load() == "loaded"
@@ -0,0 +1,59 @@
+# DMS day tables: formatted, escaped cells for the bookings staying each day
+from datetime import date
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("supabase")
+try:
+    import dms
+except Exception as e:      # the module reads the Supabase secrets on import
+    pytest.skip(f"dms not importable here: {e}", allow_module_level=True)
+
+from dms import TABLE_COLUMNS, DmsBookings, day_table_html
+
+
+def online_booking(i, **values):
+    row = dict(
+        id=i, booking_id=f"O{i}", property="Le Terra", check_in="2026-10-02", check_out="2026-10-04",
+        guest_name="Ann", guest_phone="999", room_no="101", booking_amount=5000, total_payment_made=None,
+        balance_due=20.5, booking_status="Pending", payment_status="Not Paid", remarks="",
+    )
+    row.update(values)
+    return row
+
+
+def cells(table_html):
+    rows = table_html.split("<tbody>")[1].split("<tr>")[1:]
+    return [[c.split("</td>")[0] for c in row.split("<td>")[1:]] for row in rows]
+
+
+def test_cells_are_formatted_and_escaped():
+    loaded = DmsBookings([
+        online_booking(1, guest_name="a<b", remarks='say "hi"', booking_amount="7000"),
+        online_booking(2, booking_amount=1234.5, guest_phone=None, room_no=None, balance_due="n/a"),
+    ], [])
+    rows = loaded.property_rows("Le Terra") & loaded.staying_on(date(2026, 10, 3))
+    table = day_table_html(loaded.frame, rows)
+    first, second = (dict(zip(TABLE_COLUMNS, row)) for row in cells(table))
+
+    assert table.count("<th>") == len(TABLE_COLUMNS)
+    assert first["Booking ID"] == '<a href="?page=Edit Online Reservations&booking_id=O1" target="_self">O1</a>'
+    assert first["Guest Name"] == '<span title="a&lt;b">a&lt;b</span>'
+    assert first["Remarks"] == '<span title="say &quot;hi&quot;">say &quot;hi&quot;</span>'
+    assert (first["Total Tariff"], first["Advance Amount"], first["Balance Due"]) == ("7000.00", "0.00", "20.50")
+    assert (second["Total Tariff"], second["Balance Due"]) == ("1234.50", "n/a")
+    assert (second["Mobile No"], second["Room No"]) == ("", "")
+
+
+def test_day_rows_are_the_bookings_staying_that_day():
+    loaded = DmsBookings([
+        online_booking(1),
+        online_booking(2, check_in="2026-10-03", check_out="2026-10-05"),
+        online_booking(3, property="Villa Shakti"),
+    ], [])
+    in_prop = loaded.property_rows("Le Terra")
+    ids = lambda day: [row[1] for row in cells(day_table_html(loaded.frame, in_prop & loaded.staying_on(day)))]
+    assert ids(date(2026, 10, 2)) == ['<a href="?page=Edit Online Reservations&booking_id=O1" target="_self">O1</a>']
+    assert len(ids(date(2026, 10, 3))) == 2
+    assert not (in_prop & loaded.staying_on(date(2026, 10, 5))).any()
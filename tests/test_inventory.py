@@ -0,0 +1,30 @@
+# Daily Status and the revenue ledger split a booking's money over the same nights and rooms
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("supabase")
+
+import availability
+import inventory
+from booking_frame import frame_to_records, normalize_bookings_frame
+from revenue_ledger import explode_bookings
+
+PROPERTY = "Le Terra"
+
+
+@pytest.mark.parametrize("no_of_days", [2, 5, 0])
+def test_per_night_matches_the_ledger(monkeypatch, no_of_days):
+    rooms = inventory.PROPERTY_INVENTORY[PROPERTY]["all"][:2]
+    monkeypatch.setattr(availability, "property_rooms", lambda prop: list(rooms))
+    frame = normalize_bookings_frame([{
+        "booking_id": "D1", "property_name": PROPERTY, "room_no": ",".join(rooms),
+        "check_in": "2026-03-10", "check_out": "2026-03-12", "no_of_days": no_of_days, "total_pax": 3,
+        "mob": "Direct", "total_tariff": 9000.0, "plan_status": "Confirmed", "payment_status": "Fully Paid",
+    }], is_online=False)
+    assigned, over = inventory.assign_inventory_numbers(frame_to_records(frame), PROPERTY)
+    ledger = explode_bookings(frame, "reservations")
+
+    assert not over
+    assert [a.per_night for a in assigned] == pytest.approx([2250.0, 2250.0])
+    assert ledger["receivable"].tolist() == pytest.approx([2250.0] * 4)
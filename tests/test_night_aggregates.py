@@ -0,0 +1,137 @@
+# Dirty-cell tracking: a booking edit recomputes only the (property, night) cells it touches
+import threading
+from datetime import date
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")      # booking_store -> bulk_read
+
+import availability
+import night_aggregates
+import revenue_ledger
+from night_aggregates import AggregateStore, nightly_revenue_metrics
+
+PROPERTY = "Le Terra"
+ROOMS = ["101", "102", "201", "202"]
+YEAR = date.today().year + 1          # open nights only: nothing is read from the night audit
+START, END = date(YEAR, 3, 1), date(YEAR, 3, 31)
+NRD_COLUMNS = ["rooms_sold", "receivable", "gst", "commission"]
+
+
+def direct_booking(booking_id, room_no, check_in, check_out, total, updated_at):
+    return {
+        "booking_id": booking_id, "property_name": PROPERTY, "room_no": room_no,
+        "check_in": check_in, "check_out": check_out, "no_of_days": 2, "total_pax": 2, "mob": "Direct",
+        "total_tariff": total, "plan_status": "Confirmed", "payment_status": "Fully Paid", "updated_at": updated_at,
+    }
+
+
+@pytest.fixture
+def ledger(monkeypatch, tmp_path):
+    """The revenue ledger over in-memory snapshots, with one NRD store listening for changes."""
+    store_path = str(tmp_path / "store.sqlite")
+    monkeypatch.setattr(revenue_ledger, "STORE_PATH", store_path)
+    monkeypatch.setattr(night_aggregates, "STORE_PATH", store_path)
+    monkeypatch.setattr(revenue_ledger, "_ledger", None)
+    monkeypatch.setattr(revenue_ledger, "_watermarks", {})
+    monkeypatch.setattr(revenue_ledger, "_versions", {})
+    monkeypatch.setattr(revenue_ledger, "_hashes", {})
+    monkeypatch.setattr(revenue_ledger, "_synced_at", float("-inf"))
+    monkeypatch.setattr(availability, "property_rooms", lambda prop: list(ROOMS))
+
+    snapshots = {
+        "reservations": pd.DataFrame([
+            direct_booking("D1", "101", f"{YEAR}-03-10", f"{YEAR}-03-12", 4000.0, "2026-01-01T00:00:00+00:00"),
+            direct_booking("D2", "102,201", f"{YEAR}-03-01", f"{YEAR}-03-31", 60000.0, "2026-01-01T00:00:00+00:00"),
+        ]),
+        "online_reservations": pd.DataFrame(columns=["id", "booking_id", "property", "check_in", "check_out", "updated_at"]),
+    }
+    watermarks = dict.fromkeys(snapshots, "2026-01-01T00:00:00+00:00")
+    monkeypatch.setattr(revenue_ledger, "load_snapshot", lambda table: snapshots[table].copy())
+    monkeypatch.setattr(revenue_ledger, "snapshot_watermark", lambda table: watermarks[table])
+
+    store = AggregateStore("nrd_test", nightly_revenue_metrics, NRD_COLUMNS)
+    monkeypatch.setattr(night_aggregates, "_stores", [store])
+    return snapshots, watermarks, store
+
+
+def test_editing_a_two_night_stay_dirties_two_cells(ledger):
+    snapshots, watermarks, store = ledger
+    properties = [PROPERTY, "La Villa Heritage"]
+    store.get(properties, START, END)
+    assert store.recomputed == 2 * 31
+
+    # Change the amount of D1 (10th and 11th March) and sync the ledger again
+    edited = snapshots["reservations"]
+    edited.loc[edited["booking_id"] == "D1", ["total_tariff", "updated_at"]] = [5000.0, "2026-01-02T00:00:00+00:00"]
+    watermarks["reservations"] = "2026-01-02T00:00:00+00:00"
+    revenue_ledger.expire_ledger()
+    revenue_ledger.load_ledger()
+
+    assert store._dirty == {(PROPERTY, pd.Timestamp(YEAR, 3, 10)), (PROPERTY, pd.Timestamp(YEAR, 3, 11))}
+    metrics = store.get(properties, START, END)
+    assert store.recomputed == 2
+    assert metrics.loc[(PROPERTY, pd.Timestamp(YEAR, 3, 10)), "receivable"] == pytest.approx(2500.0 + 2000.0)
+
+
+def test_a_double_booked_room_is_sold_once(ledger):
+    snapshots, watermarks, store = ledger
+    snapshots["reservations"] = pd.concat([
+        snapshots["reservations"],
+        pd.DataFrame([direct_booking("D3", "101", f"{YEAR}-03-11", f"{YEAR}-03-12", 1000.0, "2026-01-01T00:00:00+00:00")]),
+    ], ignore_index=True)
+    metrics = store.get([PROPERTY], START, END)
+    # Room 101 is held by D1 and D3 on the 11th; 102 and 201 by D2
+    assert metrics.loc[(PROPERTY, pd.Timestamp(YEAR, 3, 11)), "rooms_sold"] == 3
+    assert (metrics["rooms_sold"] <= len(ROOMS)).all()
+
+
+def test_a_sync_during_get_does_not_block_on_the_store_lock(ledger, monkeypatch):
+    snapshots, watermarks, store = ledger
+    real_load = night_aggregates.load_ledger
+
+    def load_then_edit(**kwargs):
+        # Another session saves a booking right after get() synced the ledger
+        ledger_frame = real_load(**kwargs)
+        edited = snapshots["reservations"]
+        edited.loc[edited["booking_id"] == "D1", ["total_tariff", "updated_at"]] = [5000.0, "2026-01-02T00:00:00+00:00"]
+        watermarks["reservations"] = "2026-01-02T00:00:00+00:00"
+        revenue_ledger.expire_ledger()
+        return ledger_frame
+
+    monkeypatch.setattr(night_aggregates, "load_ledger", load_then_edit)
+    worker = threading.Thread(target=store.get, args=([PROPERTY], START, END), daemon=True)
+    worker.start()
+    worker.join(timeout=10)
+    assert not worker.is_alive()
+
+    monkeypatch.setattr(night_aggregates, "load_ledger", real_load)
+    metrics = store.get([PROPERTY], START, END)
+    assert metrics.loc[(PROPERTY, pd.Timestamp(YEAR, 3, 10)), "receivable"] == pytest.approx(2500.0 + 2000.0)
+
+
+def test_without_a_watermark_only_changed_bookings_dirty_cells(ledger, monkeypatch):
+    snapshots, watermarks, store = ledger
+    watermarks.update(dict.fromkeys(watermarks))     # updated_at not deployed
+    versions = dict.fromkeys(snapshots, 1)
+    monkeypatch.setattr(revenue_ledger, "snapshot_version", lambda table: versions[table])
+    properties = [PROPERTY]
+    store.get(properties, START, END)
+    assert store.recomputed == 31
+
+    # A sync with nothing changed keeps every cell
+    revenue_ledger.expire_ledger()
+    store.get(properties, START, END)
+    assert store.recomputed == 0
+
+    # The snapshot reloads with D1's amount edited: its two nights only
+    edited = snapshots["reservations"]
+    edited.loc[edited["booking_id"] == "D1", "total_tariff"] = 5000.0
+    versions["reservations"] += 1
+    revenue_ledger.expire_ledger()
+    revenue_ledger.load_ledger()
+    assert store._dirty == {(PROPERTY, pd.Timestamp(YEAR, 3, 10)), (PROPERTY, pd.Timestamp(YEAR, 3, 11))}
+    metrics = store.get(properties, START, END)
+    assert store.recomputed == 2
+    assert metrics.loc[(PROPERTY, pd.Timestamp(YEAR, 3, 10)), "receivable"] == pytest.approx(2500.0 + 2000.0)
@@ -0,0 +1,130 @@
+# Night audit: oversold nights are not closed, and wrongly audited nights are re-closed
+import sqlite3
+from datetime import date
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")      # booking_store -> bulk_read
+pytest.importorskip("supabase")       # inventory
+
+import availability
+import night_aggregates
+import night_audit
+import revenue_ledger
+from night_aggregates import AggregateStore, nightly_revenue_metrics
+
+PROPERTY = "Le Terra"
+YEAR = date.today().year - 1          # closed nights
+STAMP = "2026-01-01T00:00:00+00:00"
+
+
+def direct_booking(booking_id, room_no, check_in, check_out, total):
+    return {
+        "booking_id": booking_id, "property_name": PROPERTY, "room_no": room_no,
+        "check_in": check_in, "check_out": check_out, "no_of_days": 2, "total_pax": 2, "mob": "Direct",
+        "total_tariff": total, "plan_status": "Confirmed", "payment_status": "Fully Paid", "updated_at": STAMP,
+    }
+
+
+@pytest.fixture
+def audit(monkeypatch, tmp_path):
+    """Night audit over in-memory snapshots: 2 rooms available, 3 in the inventory."""
+    store_path = str(tmp_path / "store.sqlite")
+    for module in (revenue_ledger, night_aggregates, night_audit):
+        monkeypatch.setattr(module, "STORE_PATH", store_path)
+    monkeypatch.setattr(revenue_ledger, "_ledger", None)
+    monkeypatch.setattr(revenue_ledger, "_watermarks", {})
+    monkeypatch.setattr(revenue_ledger, "_versions", {})
+    monkeypatch.setattr(revenue_ledger, "_hashes", {})
+    monkeypatch.setattr(revenue_ledger, "_synced_at", float("-inf"))
+    monkeypatch.setattr(availability, "property_rooms", lambda prop: ["101", "102", "201"])
+    monkeypatch.setattr(night_audit, "_rooms_available", lambda: {PROPERTY: 2})
+    monkeypatch.setattr(night_audit, "_register_stores", lambda: None)
+
+    snapshots = {
+        "reservations": pd.DataFrame([
+            direct_booking("D1", "101", f"{YEAR}-03-10", f"{YEAR}-03-12", 4000.0),
+            direct_booking("D2", "102,201", f"{YEAR}-03-11", f"{YEAR}-03-13", 8000.0),
+        ]),
+        "online_reservations": pd.DataFrame(columns=["id", "booking_id", "property", "check_in", "check_out", "updated_at"]),
+    }
+    monkeypatch.setattr(revenue_ledger, "load_snapshot", lambda table: snapshots[table].copy())
+    watermarks = dict.fromkeys(snapshots, STAMP)
+    monkeypatch.setattr(revenue_ledger, "snapshot_watermark", lambda table: watermarks[table])
+
+    store = AggregateStore("nrd_test", nightly_revenue_metrics, ["rooms_sold", "receivable", "gst", "commission"])
+    monkeypatch.setattr(night_aggregates, "_stores", [store])
+
+    def edit(booking_id, **values):
+        """Save an edit to a direct booking, as the next delta sync sees it."""
+        stamp = f"2026-01-0{len(edits) + 2}T00:00:00+00:00"
+        edits.append(stamp)
+        frame = snapshots["reservations"]
+        frame.loc[frame["booking_id"] == booking_id, [*values, "updated_at"]] = [*values.values(), stamp]
+        watermarks["reservations"] = stamp
+        revenue_ledger.expire_ledger()
+
+    edits = []
+    return store_path, store, edit
+
+
+def audited(store_path, column="rooms_sold"):
+    with sqlite3.connect(store_path) as conn:
+        rows = conn.execute(f"SELECT night, {column} FROM night_audit WHERE property = ?", (PROPERTY,)).fetchall()
+    return dict(rows)
+
+
+def pending(store_path):
+    with sqlite3.connect(store_path) as conn:
+        return conn.execute("SELECT property, night FROM night_audit_pending").fetchall()
+
+
+def test_oversold_night_is_not_closed(audit):
+    store_path, store, edit = audit
+    night_audit._close_range([PROPERTY], date(YEAR, 3, 10), date(YEAR, 3, 12))
+    # 11th: 101, 102 and 201 sold against 2 available
+    assert audited(store_path) == {f"{YEAR}-03-10": 1, f"{YEAR}-03-12": 2}
+    assert (PROPERTY, pd.Timestamp(YEAR, 3, 11)) not in store._frozen
+    assert (PROPERTY, pd.Timestamp(YEAR, 3, 12)) in store._frozen
+    assert pending(store_path) == [(PROPERTY, f"{YEAR}-03-11")]
+
+
+def test_pending_night_is_closed_once_clean(audit):
+    store_path, store, edit = audit
+    night_audit.close_nights(through=date(YEAR, 3, 12))
+    assert f"{YEAR}-03-11" not in audited(store_path)
+
+    edit("D2", room_no="102")
+    night_audit.close_nights(through=date(YEAR, 3, 12))
+    assert audited(store_path)[f"{YEAR}-03-11"] == 2
+    assert pending(store_path) == []
+    assert (PROPERTY, pd.Timestamp(YEAR, 3, 11)) in store._frozen
+
+
+def test_close_nights_recloses_oversold_rows(audit):
+    store_path, store, edit = audit
+    night_audit.close_nights(through=date(YEAR, 3, 10))
+    with sqlite3.connect(store_path) as conn:      # as written by the old per-booking room count
+        conn.execute("UPDATE night_audit SET rooms_sold = 5, occupancy = 250 WHERE property = ?", (PROPERTY,))
+        conn.execute("UPDATE night_audit_cells SET metrics = '{\"rooms_sold\": 5.0}' WHERE property = ?", (PROPERTY,))
+
+    night_audit.close_nights(through=date(YEAR, 3, 10))
+    assert audited(store_path)[f"{YEAR}-03-10"] == 1
+    assert store.get([PROPERTY], date(YEAR, 3, 10), date(YEAR, 3, 10))["rooms_sold"].tolist() == [1.0]
+
+
+def test_only_oversold_cells_are_reclosed(audit):
+    store_path, store, edit = audit
+    edit("D2", room_no="102")
+    night_audit.close_nights(through=date(YEAR, 3, 12))
+    closed_at = audited(store_path, "closed_at")
+    with sqlite3.connect(store_path) as conn:
+        conn.execute("UPDATE night_audit SET rooms_sold = 5 WHERE property = ? AND night IN (?, ?)",
+                     (PROPERTY, f"{YEAR}-03-10", f"{YEAR}-03-12"))
+
+    night_audit.close_nights(through=date(YEAR, 3, 12))
+    assert audited(store_path) == {f"{YEAR}-03-10": 1, f"{YEAR}-03-11": 2, f"{YEAR}-03-12": 1}
+    reclosed = audited(store_path, "closed_at")
+    assert reclosed[f"{YEAR}-03-11"] == closed_at[f"{YEAR}-03-11"]
+    assert reclosed[f"{YEAR}-03-10"] > closed_at[f"{YEAR}-03-10"]